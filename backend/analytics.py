@@ -0,0 +1,278 @@
+"""Time-range analytics over per-day attendance aggregates with prefix sums.
+
+A scope is either the whole organization or a single worker. Each scope is
+held in memory as a ``DailySeries``: one row per calendar day from its
+first attendance date to today, holding hours, wages, present days and
+recorded days, plus the running (prefix) totals of those rows. A sum over
+any date range is then the difference of two prefix rows. A bucketed query
+(day, week or month) does one vectorized subtraction per bucket, so a year
+costs about the same as a day.
+
+The organization series is read from the ``daily_stats`` rollups, one
+small document per day; the first build in a process seeds any day that
+has none (see ``rollups.seed_all_rollups``). A worker series is built from
+that worker's rows. Write endpoints then patch series with the same
+``(old, new)`` transitions they apply to the dashboard rollups: adding a
+delta to one day shifts the prefix totals after it, which is one
+vectorized add. Other processes do not see those patches, so a series is
+refreshed after ``ttl`` seconds. That bounds how stale a multi-process
+deployment can get. The organization series re-reads the rollups and
+patches only the days that differ.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from archive import archived_rows
+from rollups import WORKERS_KEY, attendance_contribution, seed_all_rollups
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("hours", "wages", "present_days", "recorded_days")
+
+
+def contribution(att: Optional[dict]) -> np.ndarray:
+    return rollup_vector(attendance_contribution(att))
+
+
+def rollup_vector(c: dict) -> np.ndarray:
+    return np.array([c.get('total_hours') or 0.0, c.get('total_wages') or 0.0,
+                     c.get('present_count') or 0, c.get('recorded_count') or 0])
+
+
+class DailySeries:
+    def __init__(self, origin: date, daily: np.ndarray):
+        self.origin = origin
+        self.daily = daily
+        self.prefix = np.vstack([np.zeros((1, len(METRICS))), np.cumsum(daily, axis=0)])
+
+    @classmethod
+    def from_days(cls, days: dict, today: date) -> "DailySeries":
+        """Build from ``{iso_date: metric vector}``, covering first date .. today."""
+        origin = min((date.fromisoformat(d) for d in days), default=today)
+        origin = min(origin, today)
+        daily = np.zeros(((today - origin).days + 1, len(METRICS)))
+        for d, values in days.items():
+            daily[(date.fromisoformat(d) - origin).days] = values
+        return cls(origin, daily)
+
+    @property
+    def end(self) -> date:
+        return self.origin + timedelta(days=len(self.daily) - 1)
+
+    def extend_to(self, day: date):
+        missing = (day - self.end).days
+        if missing <= 0:
+            return
+        self.daily = np.vstack([self.daily, np.zeros((missing, len(METRICS)))])
+        self.prefix = np.vstack([self.prefix, np.repeat(self.prefix[-1:], missing, axis=0)])
+
+    def apply(self, day: date, delta: np.ndarray) -> bool:
+        """Add ``delta`` to ``day``; False if the day precedes the series and it needs a rebuild."""
+        if day < self.origin:
+            return False
+        self.extend_to(day)
+        i = (day - self.origin).days
+        self.daily[i] += delta
+        self.prefix[i + 1:] += delta
+        return True
+
+    def replace(self, days: dict, today: date) -> Optional[int]:
+        """Overwrite the days that differ from ``{iso_date: metric vector}``.
+
+        Returns how many days changed, or None if ``days`` starts before
+        the series and it needs a rebuild.
+        """
+        if days and date.fromisoformat(min(days)) < self.origin:
+            return None
+        self.extend_to(today)
+        fresh = np.zeros_like(self.daily)
+        for d, values in days.items():
+            i = (date.fromisoformat(d) - self.origin).days
+            if i < len(fresh):
+                fresh[i] = values
+        diff = fresh - self.daily
+        changed = int(np.count_nonzero(np.any(np.abs(diff) > 1e-9, axis=1)))
+        if changed:
+            self.daily = fresh
+            self.prefix[1:] += np.cumsum(diff, axis=0)
+        return changed
+
+    def sums(self, starts: List[date], ends: List[date]) -> np.ndarray:
+        """Metric totals for each inclusive [start, end] range."""
+        n = len(self.daily)
+        lo = np.clip([(s - self.origin).days for s in starts], 0, n)
+        hi = np.clip([(e - self.origin).days + 1 for e in ends], 0, n)
+        return self.prefix[np.maximum(hi, lo)] - self.prefix[lo]
+
+
+def bucket_ranges(start: date, end: date, bucket: str) -> List[Tuple[date, date]]:
+    ranges = []
+    cursor = start
+    while cursor <= end:
+        if bucket == "day":
+            last = cursor
+        elif bucket == "week":
+            last = cursor + timedelta(days=6 - cursor.weekday())
+        else:
+            next_month = (cursor.replace(day=1) + timedelta(days=32)).replace(day=1)
+            last = next_month - timedelta(days=1)
+        last = min(last, end)
+        ranges.append((cursor, last))
+        cursor = last + timedelta(days=1)
+    return ranges
+
+
+def bucket_count(start: date, end: date, bucket: str) -> int:
+    """``len(bucket_ranges(start, end, bucket))`` without building the ranges."""
+    if bucket == "day":
+        return (end - start).days + 1
+    if bucket == "week":
+        return ((end - start).days + start.weekday()) // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def _row(values) -> dict:
+    hours, wages, present, recorded = (float(v) for v in values)
+    return {
+        "hours": round(hours, 2),
+        "wages": round(wages, 2),
+        "present_days": int(round(present)),
+        "recorded_days": int(round(recorded)),
+        "attendance_rate": round(present / recorded, 4) if recorded else 0.0,
+    }
+
+
+async def load_daily_totals(db) -> dict:
+    """Per-day organization totals as ``{date: vector}``, from the ``daily_stats`` rollups."""
+    return {
+        doc['_id']: rollup_vector(doc)
+        async for doc in db.daily_stats.find({"_id": {"$ne": WORKERS_KEY}})
+    }
+
+
+async def load_worker_days(db, worker_id: str) -> dict:
+    days = {
+        att['date']: contribution(att)
+        async for att in db.attendance.find(
+            {"worker_id": worker_id}, {"_id": 0, "date": 1, "status": 1, "hours_worked": 1, "wage_earned": 1}
+        )
+    }
+    async for att in archived_rows(db, worker_id=worker_id):
+        days.setdefault(att['date'], contribution(att))
+    return days
+
+
+class TimeSeriesStore:
+    """Cached ``DailySeries`` for the organization and recently queried workers."""
+
+    def __init__(self, ttl: float = 300.0, max_workers: int = 1000):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._series: "OrderedDict[Optional[str], tuple]" = OrderedDict()
+        self._building: Dict[Optional[str], asyncio.Task] = {}
+        self._seeded = False
+        self.builds = 0
+        self.refreshes = 0
+        self.patched_days = 0
+        self.hits = 0
+
+    async def series(self, db, today: date, worker_id: Optional[str] = None) -> DailySeries:
+        entry = self._series.get(worker_id)
+        if entry and entry[0] > time.monotonic():
+            self._series.move_to_end(worker_id)
+            self.hits += 1
+            entry[1].extend_to(today)
+            return entry[1]
+
+        # Concurrent misses for the same scope share one build.
+        task = self._building.get(worker_id)
+        if task is None:
+            task = asyncio.ensure_future(self._build(db, today, worker_id))
+            self._building[worker_id] = task
+            task.add_done_callback(lambda _: self._building.pop(worker_id, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, db, today: date, worker_id: Optional[str]) -> DailySeries:
+        started = time.perf_counter()
+        if worker_id:
+            days = await load_worker_days(db, worker_id)
+        else:
+            if not self._seeded:
+                await seed_all_rollups(db)
+                self._seeded = True
+            days = await load_daily_totals(db)
+        entry = self._series.get(worker_id)
+        changed = entry[1].replace(days, today) if entry and worker_id is None else None
+        if changed is None:
+            series = DailySeries.from_days(days, today)
+            self.builds += 1
+            logger.info("Built %s series (%d days) in %.3fs", worker_id or "organization", len(series.daily), time.perf_counter() - started)
+        else:
+            series = entry[1]
+            self.refreshes += 1
+            self.patched_days += changed
+
+        # A write that lands while the build runs patches only the previous
+        # entry, so the new one may miss it until its next rebuild; the TTL
+        # bounds that the same way it bounds other processes' writes.
+        self._series[worker_id] = (time.monotonic() + self.ttl, series)
+        self._series.move_to_end(worker_id)
+        # The organization series (key None) is never evicted by worker churn.
+        while len(self._series) > self.max_workers + 1:
+            oldest = next(k for k in self._series if k is not None)
+            del self._series[oldest]
+        return series
+
+    def apply_changes(self, date_str: str, changes: Iterable[tuple]):
+        """Patch cached series with ``(old, new)`` attendance transitions on ``date_str``."""
+        day = date.fromisoformat(date_str)
+        total = np.zeros(len(METRICS))
+        for old, new in changes:
+            delta = contribution(new) - contribution(old)
+            total += delta
+            worker_id = (new or old).get('worker_id')
+            if worker_id:
+                self._patch(worker_id, day, delta)
+        self._patch(None, day, total)
+
+    def _patch(self, key: Optional[str], day: date, delta: np.ndarray):
+        entry = self._series.get(key)
+        if entry and not entry[1].apply(day, delta):
+            del self._series[key]
+
+    def clear(self):
+        self._series.clear()
+        self._seeded = False
+
+    def stats(self) -> dict:
+        return {
+            "series": len(self._series),
+            "builds": self.builds,
+            "refreshes": self.refreshes,
+            "patched_days": self.patched_days,
+            "hits": self.hits,
+        }
+
+    async def timeseries(self, db, start: date, end: date, bucket: str, today: date,
+                         worker_id: Optional[str] = None) -> dict:
+        series = await self.series(db, today, worker_id)
+        ranges = bucket_ranges(start, end, bucket)
+        sums = series.sums([s for s, _ in ranges], [e for _, e in ranges])
+        total = series.sums([start], [end])[0]
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "bucket": bucket,
+            "worker_id": worker_id,
+            "series": [
+                {"start": s.isoformat(), "end": e.isoformat(), **_row(values)}
+                for (s, e), values in zip(ranges, sums)
+            ],
+            "totals": _row(total),
+        }
@@ -0,0 +1,511 @@
+"""Monthly archive tier for closed attendance months.
+
+``attendance`` holds one document per worker per day, and each one repeats
+the worker's name, the date string, timestamps and sync stamps. Years of
+history mean millions of small documents, and an entry per row in each of
+the collection's four indexes. Reading a worker's history or a past month
+then fetches all of them.
+
+Once a month has been closed for ``ARCHIVE_AFTER_MONTHS`` months, the
+compactor moves its rows into ``attendance_archive``: one bucket per worker
+per month, ``_id`` ``<worker id>|<YYYY-MM>``. A bucket holds the day of the
+month and each row field as parallel arrays in day order, plus the month's
+totals in the shape the monthly report uses. A worker-month is then one
+document and one entry in each of three indexes.
+
+Readers merge the tiers. Rows of the open month are never archived, so
+today's endpoints, the dashboard and every write path for the current day
+only ever touch ``attendance``. Reads that can reach a closed month also
+read the buckets. Rows still ``clocked_in`` stay hot until they are
+closed, and reads treat a row found in both tiers as the hot copy.
+
+Compaction writes each bucket conditional on the version it read, then
+deletes the moved daily rows conditional on their sync sequence numbers. A row
+that changed in between is dropped from its bucket again and left for the
+next pass. A back-dated rate change calls ``thaw`` first, which moves the
+worker's buckets in the re-priced range back to daily rows. The re-pricing
+and the delta sync then see ordinary rows. Compaction itself is not a
+change for sync clients, so rows archived before a client's first sync
+reach it through the history endpoints, not ``/api/sync``.
+
+Only one process compacts a given month at a time: it holds a lease on
+the month's document in ``archive_months``, which also records the counts
+moved. ``python archive.py compact`` runs one pass from the command line.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from sync import SEQUENCE_FIELD, stamps
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE = "attendance_archive"
+ARCHIVE_MONTHS = "archive_months"
+OPEN_STATUS = "clocked_in"
+# A day counts as present once the shift is closed; reports and rollups share this.
+PRESENT_STATUS = "present"
+COMPACT_BATCH_SIZE = 500
+LEASE_SECONDS = 600
+
+# Bucket array -> the attendance field it holds.
+COLUMNS = {
+    "ids": "id",
+    "status": "status",
+    "hours": "hours_worked",
+    "wages": "wage_earned",
+    "clock_in": "clock_in",
+    "clock_out": "clock_out",
+    "created_at": "created_at",
+}
+ROW_FIELDS = ["worker_id", "worker_name", "date", *COLUMNS.values()]
+
+
+def current_month() -> str:
+    return datetime.now(timezone.utc).date().isoformat()[:7]
+
+
+def shift_month(month: str, delta: int) -> str:
+    index = int(month[:4]) * 12 + int(month[5:7]) - 1 + delta
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def month_range(month: str):
+    """The [start, end) dates of ``month``."""
+    return f"{month}-01", f"{shift_month(month, 1)}-01"
+
+
+def may_hold(date_str: str) -> bool:
+    """Whether rows for ``date_str`` can be archived; only closed months are."""
+    try:
+        date.fromisoformat(date_str)
+    except ValueError:
+        return False
+    return date_str[:7] < current_month()
+
+
+def bucket_id(worker_id: str, month: str) -> str:
+    return f"{worker_id}|{month}"
+
+
+def bucket_totals(rows: List[dict]) -> dict:
+    return {
+        "total_days": len(rows),
+        "present_days": sum(1 for r in rows if r.get('status') == PRESENT_STATUS),
+        "total_hours": sum(r.get('hours_worked') or 0.0 for r in rows),
+        "total_wages": sum(r.get('wage_earned') or 0.0 for r in rows),
+    }
+
+
+def build_bucket(worker_id: str, month: str, rows: Iterable[dict], version: int) -> dict:
+    rows = sorted(rows, key=lambda r: r['date'])
+    bucket = {
+        "_id": bucket_id(worker_id, month),
+        "worker_id": worker_id,
+        "month": month,
+        "worker_name": rows[-1]['worker_name'],
+        "days": [int(r['date'][8:10]) for r in rows],
+        **{column: [r.get(field) for r in rows] for column, field in COLUMNS.items()},
+        "totals": bucket_totals(rows),
+        "version": version,
+    }
+    # Names are stored per row only when the worker was renamed mid-month.
+    names = [r['worker_name'] for r in rows]
+    if len(set(names)) > 1:
+        bucket["worker_names"] = names
+    return bucket
+
+
+def expand(bucket: dict) -> List[dict]:
+    """A bucket's rows in the shape of ``attendance`` documents, in day order."""
+    names = bucket.get('worker_names')
+    return [
+        {
+            "worker_id": bucket['worker_id'],
+            "worker_name": names[i] if names else bucket['worker_name'],
+            "date": f"{bucket['month']}-{day:02d}",
+            **{field: bucket[column][i] for column, field in COLUMNS.items()},
+        }
+        for i, day in enumerate(bucket['days'])
+    ]
+
+
+def bucket_query(start: Optional[str] = None, end: Optional[str] = None, worker_id: Optional[str] = None) -> dict:
+    """Buckets that can hold rows dated in [start, end)."""
+    query = {}
+    if worker_id:
+        query["worker_id"] = worker_id
+    months = {}
+    if start:
+        months["$gte"] = start[:7]
+    if end:
+        months["$lte"] = (date.fromisoformat(end) - timedelta(days=1)).isoformat()[:7]
+    if months:
+        query["month"] = months
+    return query
+
+
+async def archived_rows(db, start: Optional[str] = None, end: Optional[str] = None,
+                        worker_id: Optional[str] = None) -> AsyncIterator[dict]:
+    """Archived rows dated in [start, end), bucket by bucket in month order."""
+    async for bucket in db[ARCHIVE].find(bucket_query(start, end, worker_id)).sort("month", 1):
+        for row in expand(bucket):
+            if (not start or row['date'] >= start) and (not end or row['date'] < end):
+                yield row
+
+
+def day_pipeline(date_str: str):
+    day = int(date_str[8:10])
+    return [
+        {"$match": {"month": date_str[:7], "days": day}},
+        {"$project": {"_id": 0, "worker_id": 1, "worker_name": 1, "worker_names": 1, "month": 1,
+                      "i": {"$indexOfArray": ["$days", day]}, **{column: 1 for column in COLUMNS}}},
+        {"$project": {
+            "worker_id": 1, "month": 1, "days": [day],
+            "worker_name": {"$ifNull": [{"$arrayElemAt": ["$worker_names", "$i"]}, "$worker_name"]},
+            **{column: [{"$arrayElemAt": [f"${column}", "$i"]}] for column in COLUMNS},
+        }},
+    ]
+
+
+async def archived_day(db, date_str: str) -> List[dict]:
+    """Archived rows for one date, in ``id`` order.
+
+    The pipeline picks that day's slot out of each bucket on the server, so
+    only one row per worker comes back. Stand-ins without the array
+    operators fall back to fetching the month's buckets whole.
+    """
+    if not may_hold(date_str):
+        return []
+    try:
+        rows = [row async for bucket in db[ARCHIVE].aggregate(day_pipeline(date_str)) for row in expand(bucket)]
+    except (OperationFailure, NotImplementedError) as exc:
+        logger.debug("Archive day projection unavailable (%s), reading whole buckets", exc)
+        end = (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+        rows = [row async for row in archived_rows(db, date_str, end)]
+    return sorted(rows, key=lambda row: row['id'])
+
+
+async def worker_history(db, worker_id: str, through: Optional[str] = None,
+                         limit: Optional[int] = None) -> AsyncIterator[dict]:
+    """``worker_id``'s archived rows dated on or before ``through``, newest first, up to ``limit``.
+
+    Buckets are read as the rows are consumed, so a caller that stops early
+    never loads the rest of the history.
+    """
+    query = {"worker_id": worker_id}
+    if through:
+        query["month"] = {"$lte": through[:7]}
+    count = 0
+    async for bucket in db[ARCHIVE].find(query).sort("month", -1):
+        for row in reversed(expand(bucket)):
+            if through and row['date'] > through:
+                continue
+            yield row
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+async def archived_totals(db, month: str) -> Dict[str, dict]:
+    """Per-worker totals for an archived month, keyed by worker id."""
+    return {
+        bucket['worker_id']: bucket['totals']
+        async for bucket in db[ARCHIVE].find({"month": month}, {"_id": 0, "worker_id": 1, "totals": 1})
+    }
+
+
+async def count_archived(db, start: str, end: str) -> int:
+    """Archived rows dated in [start, end)."""
+    total = 0
+    async for bucket in db[ARCHIVE].find(bucket_query(start, end), {"_id": 0, "month": 1, "days": 1}):
+        total += sum(1 for day in bucket['days'] if start <= f"{bucket['month']}-{day:02d}" < end)
+    return total
+
+
+async def archived_dates(db) -> set:
+    dates = set()
+    async for bucket in db[ARCHIVE].find({}, {"_id": 0, "month": 1, "days": 1}):
+        dates.update(f"{bucket['month']}-{day:02d}" for day in bucket['days'])
+    return dates
+
+
+async def merged_rows(db, start: str, end: str, fields: List[str], batch_size: int = 0) -> AsyncIterator[dict]:
+    """Rows of both tiers dated in [start, end), in (date, id) order, projected to ``fields``.
+
+    A month with nothing archived streams straight off the ``attendance``
+    cursor. For an archived month, the buckets and the few daily rows left
+    in that month are read first and interleaved day by day, so memory is
+    bounded by one month's buckets.
+    """
+    month = start[:7]
+    while f"{month}-01" < end:
+        month_start, month_end = month_range(month)
+        lo, hi = max(start, month_start), min(end, month_end)
+        month = shift_month(month, 1)
+        hot = db.attendance.find(
+            {"date": {"$gte": lo, "$lt": hi}}, {"_id": 0, "id": 1, "date": 1, **{f: 1 for f in fields}},
+            batch_size=batch_size,
+        ).sort([("date", 1), ("id", 1)])
+        rows = [row async for row in archived_rows(db, lo, hi)] if may_hold(lo) else []
+        if not rows:
+            async for row in hot:
+                yield {f: row.get(f) for f in fields}
+            continue
+
+        by_key = {(row['date'], row['id']): row for row in rows}
+        async for row in hot:
+            by_key[(row['date'], row['id'])] = row
+        for key in sorted(by_key):
+            yield {f: by_key[key].get(f) for f in fields}
+
+
+async def _write_buckets(db, buckets: Dict[str, tuple]) -> set:
+    """Write new bucket versions; returns the ids whose write landed.
+
+    Each write is conditional on the version it replaces, so a bucket that
+    ``thaw`` removed or replaced in the meantime is left alone.
+    """
+    operations = []
+    for old, new in buckets.values():
+        if old:
+            operations.append(ReplaceOne({"_id": new['_id'], "version": old['version']}, new))
+        else:
+            operations.append(InsertOne(new))
+    try:
+        await db[ARCHIVE].bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        logger.warning("%d archive bucket write(s) lost a race", len(exc.details.get('writeErrors', [])))
+    versions = {
+        doc['_id']: doc['version']
+        async for doc in db[ARCHIVE].find({"_id": {"$in": list(buckets)}}, {"version": 1})
+    }
+    return {_id for _id, (_, new) in buckets.items() if versions.get(_id) == new['version']}
+
+
+async def _drop_changed(db, buckets: Dict[str, tuple], moved: Dict[str, List[dict]], closed: dict):
+    """Take rows that changed during compaction back out of their buckets; they stay hot."""
+    still_hot = {row['id'] async for row in db.attendance.find(
+        {**closed, "worker_id": {"$in": [rows[0]['worker_id'] for rows in moved.values()]}}, {"_id": 0, "id": 1}
+    )}
+    for _id, rows in moved.items():
+        changed = {row['id'] for row in rows} & still_hot
+        if not changed:
+            continue
+        _, written = buckets[_id]
+        kept = [row for row in expand(written) if row['id'] not in changed]
+        if kept:
+            rebuilt = build_bucket(written['worker_id'], written['month'], kept, written['version'] + 1)
+            await db[ARCHIVE].replace_one({"_id": _id, "version": written['version']}, rebuilt)
+        else:
+            await db[ARCHIVE].delete_one({"_id": _id, "version": written['version']})
+
+
+async def compact_month(db, month: str, batch_size: int = COMPACT_BATCH_SIZE) -> dict:
+    """Move ``month``'s closed daily rows into buckets, ``batch_size`` workers at a time."""
+    start, end = month_range(month)
+    closed = {"date": {"$gte": start, "$lt": end}, "status": {"$ne": OPEN_STATUS}}
+    worker_ids = sorted(await db.attendance.distinct("worker_id", closed))
+    moved_rows = written_buckets = 0
+    for i in range(0, len(worker_ids), batch_size):
+        rows: Dict[str, List[dict]] = {}
+        async for row in db.attendance.find(
+            {**closed, "worker_id": {"$in": worker_ids[i:i + batch_size]}},
+            {"_id": 0, **{f: 1 for f in ROW_FIELDS}, SEQUENCE_FIELD: 1}
+        ):
+            rows.setdefault(bucket_id(row['worker_id'], month), []).append(row)
+        existing = {b['_id']: b async for b in db[ARCHIVE].find({"_id": {"$in": list(rows)}})}
+
+        buckets = {}
+        for _id, hot in rows.items():
+            old = existing.get(_id)
+            by_date = {row['date']: row for row in expand(old)} if old else {}
+            by_date.update((row['date'], row) for row in hot)
+            buckets[_id] = (old, build_bucket(hot[0]['worker_id'], month, by_date.values(), old['version'] + 1 if old else 1))
+        written = await _write_buckets(db, buckets)
+
+        # Every write stamps a fresh sequence number, so matching the numbers
+        # read deletes only rows that are unchanged since.
+        moved = {_id: hot for _id, hot in rows.items() if _id in written}
+        expected = sum(map(len, moved.values()))
+        if expected:
+            result = await db.attendance.delete_many({
+                **closed,
+                "worker_id": {"$in": [hot[0]['worker_id'] for hot in moved.values()]},
+                SEQUENCE_FIELD: {"$in": list({row.get(SEQUENCE_FIELD) for hot in moved.values() for row in hot})},
+            })
+            if result.deleted_count < expected:
+                await _drop_changed(db, buckets, moved, closed)
+            moved_rows += result.deleted_count
+        written_buckets += len(written)
+    return {"month": month, "rows": moved_rows, "buckets": written_buckets}
+
+
+async def thaw(db, worker_id: str, start: Optional[str] = None, end: Optional[str] = None,
+               attempts: int = 3) -> List[str]:
+    """Move ``worker_id``'s buckets covering [start, end) back to daily rows; returns their months.
+
+    Restored rows do not overwrite a daily row for the same date. A bucket
+    is deleted only if it is the version that was restored; one rewritten
+    by a concurrent compaction is restored again.
+    """
+    months = []
+    for attempt in range(attempts + 1):
+        buckets = [b async for b in db[ARCHIVE].find(bucket_query(start, end, worker_id))]
+        if not buckets:
+            break
+        if attempt == attempts:
+            logger.warning("Archive buckets for worker %s kept changing while being restored", worker_id)
+            break
+        for bucket in buckets:
+            rows = expand(bucket)
+            # Stamped like any other write, so delta sync picks the rows up.
+            await db.attendance.bulk_write([
+                UpdateOne({"worker_id": worker_id, "date": row['date']}, {"$setOnInsert": {**row, **s}}, upsert=True)
+                for row, s in zip(rows, stamps(len(rows)))
+            ], ordered=False)
+            await db[ARCHIVE].delete_one({"_id": bucket['_id'], "version": bucket['version']})
+            months.append(bucket['month'])
+    if months:
+        logger.info("Restored %d archived month(s) for worker %s", len(set(months)), worker_id)
+    return sorted(set(months))
+
+
+async def claim(db, month: str, owner: str) -> bool:
+    """Take the compaction lease on ``month``; False if another process holds it."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db[ARCHIVE_MONTHS].update_one(
+            {"_id": month, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"lease_until": now + timedelta(seconds=LEASE_SECONDS), "owner": owner}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def release(db, month: str, owner: str, result: Optional[dict]):
+    update = {"$set": {"lease_until": None, "owner": None}}
+    if result:
+        update["$set"]["compacted_at"] = datetime.now(timezone.utc)
+        update["$inc"] = {"rows": result['rows']}
+    await db[ARCHIVE_MONTHS].update_one({"_id": month, "owner": owner}, update)
+
+
+class Compactor:
+    """Archives closed months older than ``keep_months``, every ``interval`` seconds.
+
+    ``on_compacted(month)`` runs after each month moves, so callers can
+    drop anything built from both tiers while the move was half done.
+    """
+
+    def __init__(self, keep_months: int = 3, interval: float = 3600.0, batch_size: int = COMPACT_BATCH_SIZE):
+        self.keep_months = keep_months
+        self.interval = interval
+        self.batch_size = batch_size
+        self.owner = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.months = 0
+        self.rows = 0
+
+    async def start(self, db, on_compacted: Optional[Callable[[str], Awaitable[None]]] = None):
+        if self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._run(db, on_compacted))
+
+    async def _run(self, db, on_compacted):
+        while True:
+            try:
+                await self.run_once(db, on_compacted)
+            except Exception:
+                logger.exception("Archive compaction failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, db, on_compacted=None) -> List[dict]:
+        """Compact every eligible month with closed daily rows left, oldest first."""
+        cutoff = f"{shift_month(current_month(), -self.keep_months)}-01"
+        results = []
+        after = ""
+        while True:
+            row = await db.attendance.find_one(
+                {"date": {"$gte": after, "$lt": cutoff}, "status": {"$ne": OPEN_STATUS}},
+                {"_id": 0, "date": 1}, sort=[("date", 1)]
+            )
+            if not row:
+                break
+            month = row['date'][:7]
+            after = month_range(month)[1]
+            if not await claim(db, month, self.owner):
+                continue
+            result = None
+            try:
+                result = await compact_month(db, month, self.batch_size)
+            finally:
+                await release(db, month, self.owner, result)
+            if on_compacted:
+                await on_compacted(month)
+            logger.info("Archived %d row(s) of %s into %d bucket(s)", result['rows'], month, result['buckets'])
+            results.append(result)
+            self.months += 1
+            self.rows += result['rows']
+        self.runs += 1
+        return results
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "months": self.months, "rows": self.rows}
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from reports import mark_months_dirty
+
+    cli = typer.Typer(help="Attendance archive maintenance.")
+
+    @cli.callback()
+    def main():
+        pass
+
+    @cli.command()
+    def compact(
+        keep_months: int = typer.Option(int(os.environ.get('ARCHIVE_AFTER_MONTHS', '3')), help="Closed months to keep as daily rows."),
+        batch_size: int = typer.Option(COMPACT_BATCH_SIZE, help="Workers per bulk write."),
+    ):
+        """Archive closed months older than --keep-months into monthly buckets."""
+        load_dotenv(Path(__file__).parent / '.env')
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+        db = client[os.environ['DB_NAME']]
+
+        async def run():
+            results = await Compactor(keep_months, batch_size=batch_size).run_once(
+                db, lambda month: mark_months_dirty(db, [month])
+            )
+            typer.echo(f"Archived {sum(r['rows'] for r in results)} row(s) from {len(results)} month(s)")
+
+        try:
+            asyncio.run(run())
+        finally:
+            client.close()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cli()
@@ -0,0 +1,93 @@
+"""Latency of /api/analytics/timeseries over growing ranges, against a range scan.
+
+    python backend/benchmarks/bench_analytics.py --workers 50 --years 3
+
+It seeds ``years`` of attendance and queries 1 day, 30 days, 1 year and the
+whole history, for the organization and for one worker. ``cold`` includes
+building the series and ``warm`` is the median of repeated queries. As a
+baseline, ``scan_ms`` sums the same range with a ``$group`` over raw
+attendance, which is what a client stitching monthly reports together pays
+for per call.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import api_client, seed_attendance, seed_workers, start_app, stop_app, use_standin_db
+
+import server
+
+
+async def timed_get(client, params, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get("/api/analytics/timeseries", params=params)
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return samples
+
+
+async def scan_ms(db, params) -> float:
+    query = {"date": {"$gte": params["from"], "$lte": params["to"]}}
+    if "worker_id" in params:
+        query["worker_id"] = params["worker_id"]
+    started = time.perf_counter()
+    await db.attendance.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None, "hours": {"$sum": "$hours_worked"}, "wages": {"$sum": "$wage_earned"}}},
+    ]).to_list(None)
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+async def run(args):
+    db = use_standin_db()
+    worker_ids = await seed_workers(db, args.workers)
+    await seed_attendance(db, worker_ids, args.years * 365)
+    await start_app()
+
+    today = datetime.now(timezone.utc).date()
+    ranges = {
+        "1_day": today,
+        "30_days": today - timedelta(days=29),
+        "1_year": today - timedelta(days=364),
+        "all": today - timedelta(days=args.years * 365 - 1),
+    }
+    results = []
+    async with api_client() as client:
+        for scope in ("organization", "worker"):
+            server.timeseries_store.clear()
+            for name, start in ranges.items():
+                for bucket in ("day", "month"):
+                    params = {"from": start.isoformat(), "to": today.isoformat(), "bucket": bucket}
+                    if scope == "worker":
+                        params["worker_id"] = worker_ids[0]
+                    cold = await timed_get(client, params, 1)
+                    warm = await timed_get(client, params, args.repeat)
+                    results.append({
+                        "scope": scope,
+                        "range": name,
+                        "bucket": bucket,
+                        "cold_ms": round(cold[0], 3),
+                        "warm_p50_ms": round(statistics.median(warm), 3),
+                        "warm_max_ms": round(max(warm), 3),
+                        "scan_ms": await scan_ms(db, params),
+                    })
+                    row = results[-1]
+                    print(f"{scope:12s} {name:8s} {bucket:5s} cold {row['cold_ms']:9.2f}ms  warm {row['warm_p50_ms']:7.2f}ms  "
+                          f"scan {row['scan_ms']:9.2f}ms", file=sys.stderr)
+    await stop_app()
+    rows = await db.attendance.count_documents({})
+    return {"workers": args.workers, "years": args.years, "attendance_rows": rows, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
@@ -0,0 +1,154 @@
+"""Storage and read cost of attendance history before and after archiving.
+
+    python backend/benchmarks/bench_archive.py --workers 200 --months 24
+    python backend/benchmarks/bench_archive.py --mongo-url mongodb://localhost:27017
+
+Seeds ``months`` of daily attendance and measures the history reads: a
+worker's full history and its first page, one archived date, a closed
+month's report rebuilt from raw rows, a year's payroll export and the
+organization analytics series. Then it compacts every closed month into
+monthly buckets (see archive.py) and measures the same reads again.
+
+Storage is reported per tier as documents, BSON bytes and index entries.
+Against MongoDB, ``collStats`` sizes are added. The stand-in scans whole
+collections on every query, so its read times track the document count
+and overstate what indexed reads on MongoDB gain.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import bson
+
+from common import api_client, seed_attendance, seed_workers, start_app, stop_app, use_database, use_standin_db
+
+import server
+from archive import ARCHIVE, Compactor, shift_month
+from indexes import INDEXES
+
+TIERS = ("attendance", ARCHIVE)
+
+
+async def footprint(db, raw_db, name: str) -> dict:
+    documents, size, entries = 0, 0, 0
+    indexes = len(INDEXES.get(name, []))
+    async for doc in db[name].find({}):
+        documents += 1
+        size += len(bson.encode(doc))
+        # One entry per index, plus the _id index.
+        entries += 1 + indexes
+    result = {"documents": documents, "bson_bytes": size, "index_entries": entries}
+    if raw_db is not None:
+        stats = await raw_db.command("collStats", name)
+        result.update({k: stats.get(k) for k in ("size", "storageSize", "totalIndexSize")})
+    return result
+
+
+def reads(worker_ids, today):
+    archived_date = (today - timedelta(days=180)).isoformat()
+    month = shift_month(today.isoformat()[:7], -6)
+    return [
+        ("worker_history", "/api/attendance/worker/" + worker_ids[0], {}),
+        ("worker_history_page", "/api/attendance/worker/" + worker_ids[1], {"limit": 100}),
+        ("archived_date", f"/api/attendance/date/{archived_date}", {}),
+        ("closed_month_report", f"/api/attendance/monthly/{int(month[:4])}/{int(month[5:])}", {}),
+        ("export_year", "/api/exports/payroll", {"from": (today - timedelta(days=365)).isoformat(), "to": today.isoformat()}),
+        ("analytics_build", "/api/analytics/timeseries", {
+            "from": (today - timedelta(days=365)).isoformat(), "to": today.isoformat(), "bucket": "month"
+        }),
+    ]
+
+
+async def measure(client, db, worker_ids, today, repeat: int) -> dict:
+    results = {}
+    for name, url, params in reads(worker_ids, today):
+        samples, trips = [], 0
+        for _ in range(repeat):
+            # Both of these would otherwise be served from memory after the first call.
+            await db.monthly_reports.delete_many({})
+            server.timeseries_store.clear()
+            before = db.round_trips
+            started = time.perf_counter()
+            response = await client.get(url, params=params)
+            samples.append((time.perf_counter() - started) * 1000)
+            trips = db.round_trips - before
+            response.raise_for_status()
+        results[name] = {
+            "ms": round(statistics.median(samples), 3),
+            "db_round_trips": trips,
+            "response_bytes": len(response.content),
+        }
+        print(f"  {name:20s} {results[name]['ms']:9.2f}ms  {trips:3d} trips", file=sys.stderr)
+    return results
+
+
+async def run(args):
+    client = raw_db = None
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+        raw_db = client[f"wageflow_bench_{uuid.uuid4().hex[:8]}"]
+        db = use_database(raw_db)
+    else:
+        db = use_standin_db()
+
+    try:
+        today = datetime.now(timezone.utc).date()
+        worker_ids = await seed_workers(db, args.workers)
+        await seed_attendance(db, worker_ids, args.months * 30)
+        await start_app()
+
+        report = {"workers": args.workers, "months": args.months}
+        async with api_client() as http:
+            print("hot only", file=sys.stderr)
+            report["before"] = {
+                "storage": {name: await footprint(db, raw_db, name) for name in TIERS},
+                "reads": await measure(http, db, worker_ids, today, args.repeat),
+            }
+            started = time.perf_counter()
+            compacted = await Compactor(keep_months=args.keep_months).run_once(db, server.archive_compacted)
+            report["compaction"] = {
+                "seconds": round(time.perf_counter() - started, 3),
+                "months": len(compacted),
+                "rows": sum(r['rows'] for r in compacted),
+                "buckets": sum(r['buckets'] for r in compacted),
+            }
+            print(f"compacted {report['compaction']}", file=sys.stderr)
+            report["after"] = {
+                "storage": {name: await footprint(db, raw_db, name) for name in TIERS},
+                "reads": await measure(http, db, worker_ids, today, args.repeat),
+            }
+        await stop_app()
+    finally:
+        if client is not None:
+            await client.drop_database(raw_db.name)
+            client.close()
+
+    def total(side, key):
+        return sum(report[side]["storage"][name][key] for name in TIERS)
+
+    report["savings"] = {
+        "documents": round(1 - total("after", "documents") / total("before", "documents"), 4),
+        "bson_bytes": round(1 - total("after", "bson_bytes") / total("before", "bson_bytes"), 4),
+        "index_entries": round(1 - total("after", "index_entries") / total("before", "index_entries"), 4),
+        "read_speedup": {
+            name: round(report["before"]["reads"][name]["ms"] / report["after"]["reads"][name]["ms"], 2)
+            for name in report["before"]["reads"]
+        },
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=200)
+    parser.add_argument("--months", type=int, default=24, help="Months of daily history to seed")
+    parser.add_argument("--keep-months", type=int, default=1, help="Closed months left as daily rows")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mongo-url", help="Benchmark against a real MongoDB instead of the stand-in")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
@@ -0,0 +1,60 @@
+"""Compare per-request POST /api/attendance with one POST /api/attendance/bulk.
+
+    python backend/benchmarks/bench_bulk_attendance.py --workers 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from common import api_client, seed_workers, use_standin_db
+
+
+def clock_events(worker_ids):
+    now = datetime.now(timezone.utc)
+    clock_in = now.replace(hour=8, minute=0, second=0, microsecond=0).isoformat()
+    clock_out = now.replace(hour=17, minute=0, second=0, microsecond=0).isoformat()
+    return [{"worker_id": w, "clock_in": clock_in, "clock_out": clock_out} for w in worker_ids]
+
+
+async def run(worker_count: int, concurrency: int):
+    results = {}
+
+    db = use_standin_db()
+    events = clock_events(await seed_workers(db, worker_count))
+    semaphore = asyncio.Semaphore(concurrency)
+    async with api_client() as client:
+        async def post(event):
+            async with semaphore:
+                response = await client.post("/api/attendance", json=event)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(e) for e in events))
+        elapsed = time.perf_counter() - started
+    results['per_request'] = {"seconds": round(elapsed, 4), "events_per_second": round(len(events) / elapsed, 1)}
+
+    db = use_standin_db()
+    events = clock_events(await seed_workers(db, worker_count))
+    body = "\n".join(json.dumps(e) for e in events)
+    async with api_client() as client:
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/attendance/bulk", content=body, headers={"content-type": "application/x-ndjson"}
+        )
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        assert response.json()['succeeded'] == len(events)
+    results['bulk_ndjson'] = {"seconds": round(elapsed, 4), "events_per_second": round(len(events) / elapsed, 1)}
+
+    results['speedup'] = round(results['per_request']['seconds'] / results['bulk_ndjson']['seconds'], 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.workers, args.concurrency)), indent=2))
@@ -0,0 +1,94 @@
+"""Compare POST /api/attendance with the atomic clock-in/clock-out endpoints.
+
+Reports database round trips per event for each path. It then fires
+concurrent duplicate clock-ins (some retried with the same idempotency key)
+and checks that every worker ends up with exactly one attendance row.
+
+    python backend/benchmarks/bench_clock_events.py --workers 1000 --duplicates 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import api_client, seed_workers, start_app, stop_app, use_standin_db
+
+
+async def timed_posts(client, db, url, bodies, concurrency, headers=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = []
+
+    async def post(i, body):
+        async with semaphore:
+            response = await client.post(url, json=body, headers=headers(i) if headers else None)
+            statuses.append(response.status_code)
+
+    trips_before = db.round_trips
+    started = time.perf_counter()
+    await asyncio.gather(*(post(i, b) for i, b in enumerate(bodies)))
+    elapsed = time.perf_counter() - started
+    return {
+        "events": len(bodies),
+        "seconds": round(elapsed, 4),
+        "events_per_second": round(len(bodies) / elapsed, 1),
+        "db_round_trips_per_event": round((db.round_trips - trips_before) / len(bodies), 2),
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+async def run(worker_count: int, concurrency: int, duplicates: int):
+    results = {}
+    clock_in = datetime.now(timezone.utc) - timedelta(hours=8)
+    clock_out = clock_in + timedelta(hours=8)
+
+    db = use_standin_db()
+    worker_ids = await seed_workers(db, worker_count)
+    await start_app()
+    async with api_client() as client:
+        results['mark_attendance_in'] = await timed_posts(client, db, "/api/attendance", [
+            {"worker_id": w, "clock_in": clock_in.isoformat()} for w in worker_ids
+        ], concurrency)
+        results['mark_attendance_out'] = await timed_posts(client, db, "/api/attendance", [
+            {"worker_id": w, "clock_in": clock_in.isoformat(), "clock_out": clock_out.isoformat()} for w in worker_ids
+        ], concurrency)
+    await stop_app()
+
+    db = use_standin_db()
+    worker_ids = await seed_workers(db, worker_count)
+    await start_app()
+    async with api_client() as client:
+        results['clock_in'] = await timed_posts(client, db, "/api/attendance/clock-in", [
+            {"worker_id": w, "at": clock_in.isoformat()} for w in worker_ids
+        ], concurrency)
+        results['clock_out'] = await timed_posts(client, db, "/api/attendance/clock-out", [
+            {"worker_id": w, "at": clock_out.isoformat()} for w in worker_ids
+        ], concurrency)
+    await stop_app()
+
+    # Every worker clocks in `duplicates` times at once; even-numbered attempts
+    # share one idempotency key, as a client retrying a lost response would.
+    db = use_standin_db()
+    worker_ids = await seed_workers(db, worker_count)
+    await start_app()
+    bodies = [{"worker_id": w, "at": clock_in.isoformat()} for w in worker_ids for _ in range(duplicates)]
+    async with api_client() as client:
+        results['concurrent_clock_in'] = await timed_posts(
+            client, db, "/api/attendance/clock-in", bodies, concurrency,
+            headers=lambda i: {"Idempotency-Key": f"{bodies[i]['worker_id']}-retry" if i % 2 == 0 else f"attempt-{i}"},
+        )
+    rows = await db.attendance.count_documents({})
+    workers_with_rows = len(await db.attendance.distinct("worker_id"))
+    results['concurrent_clock_in']['rows'] = rows
+    results['concurrent_clock_in']['one_row_per_worker'] = rows == workers_with_rows == worker_count
+    await stop_app()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duplicates", type=int, default=4, help="Concurrent clock-ins per worker in the race check")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.workers, args.concurrency, args.duplicates)), indent=2))
@@ -0,0 +1,136 @@
+"""Cost of polling the read endpoints with and without versioned HTTP caching.
+
+    python backend/benchmarks/bench_conditional_get.py --workers 2000 --days 30
+    python backend/benchmarks/bench_conditional_get.py --mongo-url mongodb://localhost:27017
+
+Polls the worker list, today's attendance, a past date and the dashboard
+stats three ways:
+
+* ``render`` empties the response cache before every request, so each
+  one queries the database and serializes the body, as every poll did
+  before versioning.
+* ``cached`` repeats the same request, which is answered from the
+  serialized-response cache.
+* ``revalidate`` sends the last ``ETag`` back in ``If-None-Match`` and
+  gets a 304.
+
+Each reports the median latency, database round trips and response bytes.
+It then marks attendance and renames a worker and checks that each
+endpoint's tag moved as expected (see httpcache.py).
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from common import api_client, seed_attendance, seed_workers, start_app, stop_app, use_database, use_standin_db
+
+import server
+
+
+def endpoints(today):
+    return [
+        ("list_workers", "/api/workers"),
+        ("today_attendance", "/api/attendance/today"),
+        ("past_date", f"/api/attendance/date/{(today - timedelta(days=1)).isoformat()}"),
+        ("dashboard_stats", "/api/dashboard/stats"),
+    ]
+
+
+async def measure(client, db, url: str, mode: str, repeat: int) -> dict:
+    first = await client.get(url)
+    first.raise_for_status()
+    headers = {"If-None-Match": first.headers["etag"]} if mode == "revalidate" else {}
+    samples, trips = [], 0
+    for _ in range(repeat):
+        if mode == "render":
+            server.response_cache.clear()
+        before = db.round_trips
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+        trips = db.round_trips - before
+    assert response.status_code == (304 if mode == "revalidate" else 200), response.status_code
+    return {
+        "ms": round(statistics.median(samples), 3),
+        "db_round_trips": trips,
+        "response_bytes": len(response.content),
+    }
+
+
+async def tags_after_writes(client, worker_ids, today) -> dict:
+    urls = dict(endpoints(today))
+    before = {name: (await client.get(url)).headers["etag"] for name, url in urls.items()}
+    await client.post("/api/attendance", json={
+        "worker_id": worker_ids[0],
+        "clock_in": datetime.now(timezone.utc).replace(hour=0, minute=0).isoformat(),
+    })
+    after_attendance = {name: (await client.get(url)).headers["etag"] for name, url in urls.items()}
+    await client.put(f"/api/workers/{worker_ids[0]}", json={"name": "Renamed worker"})
+    after_rename = {name: (await client.get(url)).headers["etag"] for name, url in urls.items()}
+    return {
+        name: {
+            "changed_by_attendance": before[name] != after_attendance[name],
+            "changed_by_rename": after_attendance[name] != after_rename[name],
+        }
+        for name in urls
+    }
+
+
+async def run(args):
+    client = raw_db = None
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+        raw_db = client[f"wageflow_bench_{uuid.uuid4().hex[:8]}"]
+        db = use_database(raw_db)
+    else:
+        db = use_standin_db()
+
+    try:
+        today = datetime.now(timezone.utc).date()
+        worker_ids = await seed_workers(db, args.workers)
+        await seed_attendance(db, worker_ids, args.days)
+        await start_app()
+
+        results = {}
+        async with api_client() as http:
+            for name, url in endpoints(today):
+                results[name] = {}
+                for mode in ("render", "cached", "revalidate"):
+                    result = await measure(http, db, url, mode, args.repeat)
+                    results[name][mode] = result
+                    print(f"  {name:18s} {mode:10s} {result['ms']:9.3f}ms  {result['db_round_trips']:3d} trips  "
+                          f"{result['response_bytes']:8d} bytes", file=sys.stderr)
+                results[name]["speedup"] = {
+                    mode: round(results[name]["render"]["ms"] / max(results[name][mode]["ms"], 1e-3), 1)
+                    for mode in ("cached", "revalidate")
+                }
+            invalidation = await tags_after_writes(http, worker_ids, today)
+            stats = (await http.get("/api/cache/stats")).json()
+        await stop_app()
+    finally:
+        if client is not None:
+            await client.drop_database(raw_db.name)
+            client.close()
+
+    return {
+        "config": {"workers": args.workers, "days": args.days, "repeat": args.repeat},
+        "results": results,
+        "invalidation": invalidation,
+        "versions": stats["versions"],
+        "responses": stats["responses"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo-url", help="Benchmark against a real MongoDB instead of the stand-in")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
@@ -0,0 +1,173 @@
+"""Burst throughput of POST /api/attendance with group commit off and on.
+
+    python backend/benchmarks/bench_group_commit.py --requests 2000 --concurrency 200 --latency-ms 2
+
+A shift change is modelled as ``requests`` clock events, ``concurrency`` in
+flight at a time, over ``workers`` workers. ``direct`` is the default
+write path. ``group_commit`` acknowledges after the journal fsync and
+commits in batches (see writebehind.py). The stand-in database answers
+instantly, so ``--latency-ms`` adds that much to every database round trip
+to stand in for a network hop to MongoDB. The stand-in's own query work
+runs on the event loop and grows with the collections, so keep
+``--workers`` small.
+
+Each mode reports throughput, latency percentiles, round trips per
+request, and, for group commit, batches and journal fsyncs. The run also
+checks that every worker's row landed.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from common import DB_METHODS, api_client, seed_workers, start_app, stop_app, use_database
+
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from writebehind import WriteBehindQueue
+
+
+def percentile_ms(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))], 3)
+
+
+class LatencyCursor:
+    def __init__(self, cursor, delay: float):
+        self._cursor = cursor
+        self._delay = delay
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ("sort", "limit", "skip", "batch_size"):
+            return lambda *args, **kwargs: LatencyCursor(attr(*args, **kwargs), self._delay)
+        return attr
+
+    async def to_list(self, *args, **kwargs):
+        await asyncio.sleep(self._delay)
+        return await self._cursor.to_list(*args, **kwargs)
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._delay)
+        async for doc in self._cursor:
+            yield doc
+
+
+class LatencyCollection:
+    """Adds a fixed delay to each round trip made through a collection."""
+
+    def __init__(self, collection, delay: float):
+        self._collection = collection
+        self._delay = delay
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in DB_METHODS:
+            return attr
+        if name in ("find", "aggregate"):
+            return lambda *args, **kwargs: LatencyCursor(attr(*args, **kwargs), self._delay)
+
+        async def delayed(*args, **kwargs):
+            await asyncio.sleep(self._delay)
+            return await attr(*args, **kwargs)
+        return delayed
+
+
+class LatencyDatabase:
+    def __init__(self, db, delay: float):
+        self._db = db
+        self._delay = delay
+
+    def __getitem__(self, name):
+        return LatencyCollection(self._db[name], self._delay)
+
+    async def command(self, *args, **kwargs):
+        await asyncio.sleep(self._delay)
+        return await self._db.command(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if name.startswith('_') or hasattr(type(self._db), name):
+            return attr
+        return LatencyCollection(attr, self._delay)
+
+
+async def run_mode(mode: str, args):
+    server.client = AsyncMongoMockClient()
+    db = use_database(LatencyDatabase(server.client["bench"], args.latency_ms / 1000))
+    worker_ids = await seed_workers(db, args.workers)
+    journal_dir = Path(tempfile.mkdtemp(prefix="wageflow-journal-"))
+    server.attendance_writer = (
+        WriteBehindQueue(journal_dir, max_batch=args.max_batch, window=args.window_ms / 1000, fsync=not args.no_fsync)
+        if mode == "group_commit" else None
+    )
+    await start_app()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i):
+        body = {
+            "worker_id": worker_ids[i % len(worker_ids)],
+            "clock_in": now.replace(hour=8).isoformat(),
+            "clock_out": now.replace(hour=16).isoformat(),
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/attendance", json=body)
+            latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+
+    async with api_client() as client:
+        trips_before = db.round_trips
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        trips = db.round_trips - trips_before
+        writer_stats = server.attendance_writer.stats() if server.attendance_writer else None
+    await stop_app()
+
+    rows = await db.attendance.count_documents({"date": now.date().isoformat()})
+    server.attendance_writer = None
+    result = {
+        "mode": mode,
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "max_ms": round(max(latencies), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "db_round_trips_per_request": round(trips / args.requests, 2),
+        "rows_written": rows,
+        "rows_expected": min(args.requests, args.workers),
+    }
+    if writer_stats:
+        result.update({k: writer_stats[k] for k in ("batches", "mean_batch", "journal_syncs")})
+    print(f"{mode:13s} {result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:8.2f}ms  "
+          f"p99 {result['p99_ms']:8.2f}ms  {result['db_round_trips_per_request']:5.2f} trips/req", file=sys.stderr)
+    return result
+
+
+async def run(args):
+    return {
+        "config": vars(args),
+        "results": [await run_mode(mode, args) for mode in ("direct", "group_commit")],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Added to every database round trip")
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--no-fsync", action="store_true", help="Skip the journal fsync (measures the queue alone)")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
@@ -0,0 +1,104 @@
+"""Response encoding cost of the list endpoints: response_model path vs rows path.
+
+    python backend/benchmarks/bench_list_encoding.py --workers 5000 --days 365
+
+For each list endpoint this fetches the page the endpoint returns and times
+two encoders on the same rows. ``validated`` is what FastAPI does with
+``response_model``: validate every row, then ``jsonable_encoder`` and
+``json.dumps``. ``rows`` is the orjson path the endpoints now take. It then
+times the whole request, and the gzip and brotli cost and size of the body.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from common import api_client, seed_attendance, seed_workers, start_app, stop_app, use_standin_db
+
+import server
+from compression import brotli, compress
+from pagination import dump_json
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+async def timed_async(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def route_field(path: str):
+    return next(
+        route.response_field for route in server.app.routes
+        if getattr(route, "path", None) == path and "GET" in route.methods
+    )
+
+
+async def run(args):
+    db = use_standin_db()
+    worker_ids = await seed_workers(db, args.workers)
+    # Full history for one worker, one day for everyone.
+    await seed_attendance(db, worker_ids[:1], args.days, presence=1.0)
+    await seed_attendance(db, worker_ids[1:], 1, presence=1.0)
+    await start_app()
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    endpoints = [
+        ("get_workers", "/api/workers", "/api/workers"),
+        ("get_today_attendance", "/api/attendance/today", "/api/attendance/today"),
+        ("get_attendance_by_date", "/api/attendance/date/{date_str}", f"/api/attendance/date/{today}"),
+        ("get_worker_attendance", "/api/attendance/worker/{worker_id}", f"/api/attendance/worker/{worker_ids[0]}"),
+    ]
+    results = []
+    async with api_client() as client:
+        for name, path, url in endpoints:
+            rows = (await client.get(url, headers={"accept-encoding": "identity"})).json()
+            field = route_field(path)
+
+            async def validated():
+                content = await serialize_response(field=field, response_content=rows)
+                return JSONResponse(content).body
+
+            body = dump_json(rows)
+            result = {
+                "endpoint": name,
+                "rows": len(rows),
+                "validated_encode_ms": await timed_async(validated, args.repeat),
+                "rows_encode_ms": timed(lambda: dump_json(rows), args.repeat),
+                "request_identity_ms": await timed_async(lambda: client.get(url, headers={"accept-encoding": "identity"}), args.repeat),
+                "request_gzip_ms": await timed_async(lambda: client.get(url, headers={"accept-encoding": "gzip"}), args.repeat),
+                "identity_bytes": len(body),
+                "gzip_bytes": len(compress(body, "gzip")),
+                "gzip_ms": timed(lambda: compress(body, "gzip"), args.repeat),
+            }
+            result["encode_speedup"] = round(result["validated_encode_ms"] / max(result["rows_encode_ms"], 1e-6), 1)
+            if brotli:
+                result["br_bytes"] = len(compress(body, "br"))
+                result["br_ms"] = timed(lambda: compress(body, "br"), args.repeat)
+            results.append(result)
+    await stop_app()
+    return {"workers": args.workers, "days": args.days, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365, help="History days for the get_worker_attendance worker")
+    parser.add_argument("--repeat", type=int, default=7)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
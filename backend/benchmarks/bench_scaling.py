@@ -0,0 +1,200 @@
+"""Requests per second versus uvicorn worker count, via ``manage.py serve``.
+
+For each worker count it starts the real server as a subprocess against a
+scratch database and waits for ``/api/ready``. It then drives the clock-in
+and dashboard endpoints from several load-generator processes for a fixed
+time. Load generators own disjoint workers and alternate clock-in and
+clock-out, each round on an earlier date, so every clock event is a real
+write rather than a 409.
+
+    python backend/benchmarks/bench_scaling.py --mongo-url mongodb://localhost:27017 --workers 1 2 4 8
+
+Processes cannot share the in-memory stand-in, so this benchmark needs a
+real MongoDB. Run the load generators on another machine, or leave spare
+cores for them, or they become the bottleneck.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from common import BACKEND_DIR, seed_workers
+from run_suite import percentile
+
+ENDPOINTS = ("clock_events", "dashboard_stats")
+
+
+def load_process(base_url, endpoint, worker_ids, concurrency, duration, results):
+    async def drive():
+        latencies = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+        base = datetime.now(timezone.utc).replace(hour=8, minute=0, second=0, microsecond=0)
+
+        async def clock_loop(client, owned):
+            nonlocal errors
+            day = 0
+            while time.perf_counter() < deadline:
+                clock_in = base - timedelta(days=day)
+                for worker_id in owned:
+                    for path, at in (("clock-in", clock_in), ("clock-out", clock_in + timedelta(hours=8))):
+                        if time.perf_counter() >= deadline:
+                            return
+                        started = time.perf_counter()
+                        response = await client.post(f"/api/attendance/{path}", json={"worker_id": worker_id, "at": at.isoformat()})
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        errors += response.status_code >= 400
+                day += 1
+
+        async def dashboard_loop(client):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get("/api/dashboard/stats")
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            if endpoint == "clock_events":
+                loops = [clock_loop(client, worker_ids[i::concurrency]) for i in range(concurrency)]
+            else:
+                loops = [dashboard_loop(client) for _ in range(concurrency)]
+            await asyncio.gather(*loops)
+        return latencies, errors
+
+    results.put(asyncio.run(drive()))
+
+
+def run_load(base_url, endpoint, worker_ids, clients, concurrency, duration):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=load_process,
+            args=(base_url, endpoint, worker_ids[i::clients], concurrency, duration, results),
+        )
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        batch, batch_errors = results.get()
+        latencies.extend(batch)
+        errors += batch_errors
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def start_server(args, workers: int, db_name: str):
+    env = dict(os.environ, MONGO_URL=args.mongo_url, DB_NAME=db_name)
+    process = subprocess.Popen(
+        [sys.executable, "manage.py", "serve", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(workers), "--loop", args.loop, "--http", args.http, "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            # Every worker must be ready, so require several ready answers in a row.
+            if all(httpx.get(f"http://127.0.0.1:{args.port}/api/ready").status_code == 200 for _ in range(workers * 4)):
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("server did not become ready")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def prepare(mongo_url, db_name, worker_count, reset_only=False):
+    client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+    db = client[db_name]
+    try:
+        for collection in ("attendance", "daily_stats", "monthly_reports"):
+            await db[collection].drop()
+        if not reset_only:
+            return await seed_workers(db, worker_count)
+    finally:
+        client.close()
+
+
+async def drop(mongo_url, db_name):
+    client = AsyncIOMotorClient(mongo_url)
+    await client.drop_database(db_name)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", required=True)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seed-workers", type=int, default=2000, help="Workers seeded for clock events")
+    parser.add_argument("--clients", type=int, default=max(1, multiprocessing.cpu_count() // 2), help="Load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests per load generator")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per endpoint and worker count")
+    parser.add_argument("--loop", default="auto")
+    parser.add_argument("--http", default="auto")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    db_name = f"wageflow_bench_{uuid.uuid4().hex[:8]}"
+    worker_ids = asyncio.run(prepare(args.mongo_url, db_name, args.seed_workers))
+    report = {"config": {k: v for k, v in vars(args).items() if k != "mongo_url"}, "cpus": multiprocessing.cpu_count(), "results": []}
+    try:
+        for workers in args.workers:
+            asyncio.run(prepare(args.mongo_url, db_name, 0, reset_only=True))
+            process = start_server(args, workers, db_name)
+            try:
+                row = {"workers": workers}
+                for endpoint in ENDPOINTS:
+                    row[endpoint] = run_load(
+                        f"http://127.0.0.1:{args.port}", endpoint, worker_ids, args.clients, args.concurrency, args.duration
+                    )
+                    print(f"{workers:3d} worker(s) {endpoint:16s} {row[endpoint]['requests_per_second']:9.1f} req/s  "
+                          f"p99 {row[endpoint]['p99_ms']:8.2f}ms", file=sys.stderr)
+                report["results"].append(row)
+            finally:
+                stop_server(process)
+    finally:
+        asyncio.run(drop(args.mongo_url, db_name))
+
+    baseline = report["results"][0] if report["results"] else None
+    for row in report["results"]:
+        for endpoint in ENDPOINTS:
+            row[endpoint]["speedup"] = round(
+                row[endpoint]["requests_per_second"] / baseline[endpoint]["requests_per_second"], 2
+            ) if baseline[endpoint]["requests_per_second"] else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
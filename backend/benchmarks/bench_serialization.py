@@ -0,0 +1,85 @@
+"""Serialization cost of large attendance lists, before and after native timestamps.
+
+    python backend/benchmarks/bench_serialization.py --rows 5000
+
+Compares three ways of turning stored rows into a JSON response body:
+``legacy_fixup`` (ISO-string created_at, the old fromisoformat loop, then
+response_model validation), ``legacy_strings`` (ISO strings validated
+directly, i.e. unmigrated rows on the new code) and ``native`` (BSON
+datetimes as returned by a tz-aware Motor client).
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from server import Attendance
+
+ATTENDANCE_LIST = TypeAdapter(List[Attendance])
+
+
+def make_rows(count: int, native: bool):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        created_at = now - timedelta(minutes=i)
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "worker_id": str(uuid.uuid4()),
+            "worker_name": f"Worker {i}",
+            "date": created_at.date().isoformat(),
+            "clock_in": created_at.isoformat(),
+            "clock_out": (created_at + timedelta(hours=8)).isoformat(),
+            "hours_worked": 8.0,
+            "wage_earned": 800.0,
+            "status": "present",
+            "created_at": created_at if native else created_at.isoformat(),
+        })
+    return rows
+
+
+def legacy_fixup(rows):
+    for att in rows:
+        if isinstance(att.get('created_at'), str):
+            att['created_at'] = datetime.fromisoformat(att['created_at'])
+    return json.dumps(jsonable_encoder(ATTENDANCE_LIST.validate_python(rows)))
+
+
+def validate_only(rows):
+    return json.dumps(jsonable_encoder(ATTENDANCE_LIST.validate_python(rows)))
+
+
+def timed(fn, make, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        rows = make()
+        started = time.perf_counter()
+        fn(rows)
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {
+        "rows": args.rows,
+        "legacy_fixup_ms": timed(legacy_fixup, lambda: make_rows(args.rows, native=False), args.repeat),
+        "legacy_strings_ms": timed(validate_only, lambda: make_rows(args.rows, native=False), args.repeat),
+        "native_ms": timed(validate_only, lambda: make_rows(args.rows, native=True), args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure startup time to ready and first-request latency after startup.
+
+Runs the app's lifespan startup in this fresh process, so every import-time
+and first-use cost is real. It reports the duration of each startup phase
+and, for a set of endpoints, compares the latency of the first request
+against the median of the following requests.
+
+    python backend/benchmarks/bench_startup.py --mongo-url mongodb://localhost:27017
+    MONGO_WARMUP_CONNECTIONS=0 python backend/benchmarks/bench_startup.py --mongo-url ...
+
+The second form skips connection warm-up, for comparison. Against the
+stand-in database only the application-side costs show up.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from common import api_client, seed_attendance, seed_workers, start_app, stop_app, use_database, use_standin_db
+
+import server
+
+ENDPOINTS = ["/api/", "/api/dashboard/stats", "/api/workers", "/api/attendance/today"]
+
+
+async def run(args):
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+        raw_db = client[f"wageflow_bench_{uuid.uuid4().hex[:8]}"]
+        db = use_database(raw_db)
+        # Seed through a separate client, then give the app a fresh, cold one.
+        await seed_workers(db, args.workers)
+        await seed_attendance(db, [w['id'] async for w in raw_db.workers.find({}, {"id": 1})], 1)
+        server.client = server.create_client(args.mongo_url)
+        use_database(server.client[raw_db.name])
+    else:
+        client = None
+        db = use_standin_db()
+        await seed_attendance(db, await seed_workers(db, args.workers), 1)
+
+    try:
+        started = time.perf_counter()
+        await start_app()
+        startup_seconds = time.perf_counter() - started
+        results = {
+            "startup_seconds": round(startup_seconds, 4),
+            "phases": dict(server.lifecycle.phases),
+            "warmup_connections": server.warmup_connections(),
+            "endpoints": {},
+        }
+
+        async with api_client() as http:
+            for url in ENDPOINTS:
+                latencies = []
+                for _ in range(args.requests):
+                    t0 = time.perf_counter()
+                    response = await http.get(url)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    response.raise_for_status()
+                results["endpoints"][url] = {
+                    "first_ms": round(latencies[0], 3),
+                    "steady_median_ms": round(statistics.median(latencies[1:]), 3),
+                }
+        await stop_app()
+    finally:
+        if client is not None:
+            await client.drop_database(raw_db.name)
+            client.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint, the first one cold")
+    parser.add_argument("--mongo-url", help="Benchmark against a real MongoDB instead of the stand-in")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
@@ -0,0 +1,102 @@
+"""Bytes and time per refresh: full refetch against /api/sync deltas.
+
+    python backend/benchmarks/bench_sync.py --workers 2000 --changes 0 10 100
+
+A screen that refreshes by refetching ``/api/workers`` and
+``/api/attendance/today`` pays for the whole list every time. A client
+keeping a replica sends its token to ``/api/sync`` and receives only what
+changed. For each number of changes between refreshes this reports the
+body size (identity and gzip) and the latency of both. It also reports
+the initial sync, which pages through everything once.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from common import api_client, seed_attendance, seed_workers, start_app, stop_app, use_standin_db
+
+import server
+
+FULL_REFRESH = ("/api/workers", "/api/attendance/today")
+
+
+async def fetch(client, url, params=None, encoding="identity"):
+    started = time.perf_counter()
+    response = await client.get(url, params=params, headers={"accept-encoding": encoding})
+    response.raise_for_status()
+    # httpx decodes the body; the header says what went over the wire.
+    size = int(response.headers.get("content-length") or len(response.content))
+    return response, size, (time.perf_counter() - started) * 1000
+
+
+async def initial_sync(client, limit: int):
+    token, pages, size, started = "0", 0, 0, time.perf_counter()
+    while True:
+        response, bytes_, _ = await fetch(client, "/api/sync", {"since": token, "limit": limit})
+        body = response.json()
+        pages, size, token = pages + 1, size + bytes_, body["token"]
+        if not body["more"]:
+            return token, {"pages": pages, "bytes": size, "ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+async def make_changes(client, worker_ids, count: int, rng: random.Random):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    for _ in range(count):
+        await client.post("/api/attendance", json={
+            "worker_id": rng.choice(worker_ids),
+            "clock_in": now.replace(hour=8).isoformat(),
+            "clock_out": now.replace(hour=8 + rng.randrange(6, 10)).isoformat(),
+        })
+
+
+async def run(args):
+    db = use_standin_db()
+    worker_ids = await seed_workers(db, args.workers)
+    await seed_attendance(db, worker_ids, 1, presence=0.9)
+    await start_app()
+    # Rows count as settled at once; there are no overlapping writers here.
+    server.SYNC_SETTLE_SECONDS = 0
+    rng = random.Random(0)
+
+    results = []
+    async with api_client() as client:
+        token, initial = await initial_sync(client, args.page_size)
+        for changes in args.changes:
+            samples = {"full": [], "sync": []}
+            sizes = {}
+            for _ in range(args.repeat):
+                await make_changes(client, worker_ids, changes, rng)
+                for encoding in ("identity", "gzip"):
+                    full = [await fetch(client, url, encoding=encoding) for url in FULL_REFRESH]
+                    sizes[f"full_{encoding}_bytes"] = sum(size for _, size, _ in full)
+                    response, size, ms = await fetch(client, "/api/sync", {"since": token}, encoding)
+                    sizes[f"sync_{encoding}_bytes"] = size
+                    if encoding == "identity":
+                        samples["full"].append(sum(ms for _, _, ms in full))
+                        samples["sync"].append(ms)
+                token = response.json()["token"]
+            results.append({
+                "changes": changes,
+                **sizes,
+                "full_ms": round(statistics.median(samples["full"]), 3),
+                "sync_ms": round(statistics.median(samples["sync"]), 3),
+            })
+            row = results[-1]
+            print(f"{changes:5d} changes  full {row['full_identity_bytes']:9d}B {row['full_ms']:8.2f}ms  "
+                  f"sync {row['sync_identity_bytes']:9d}B {row['sync_ms']:8.2f}ms", file=sys.stderr)
+    await stop_app()
+    return {"workers": args.workers, "initial_sync": initial, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[0, 1, 10, 100])
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
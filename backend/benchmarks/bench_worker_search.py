@@ -0,0 +1,157 @@
+"""Worker search: the in-process index against regex queries on MongoDB.
+
+    python backend/benchmarks/bench_worker_search.py --workers 100000
+    python backend/benchmarks/bench_worker_search.py --workers 100000 --mongo-url mongodb://localhost:27017
+
+It seeds workers with generated names and reports the time to build the
+index. Then, for a mix of queries, it reports:
+
+* ``index_us``: ``WorkerIndex.search`` on its own
+* ``request_ms``: the whole ``GET /api/workers/search``, which also
+  hydrates the hits from the worker cache
+* ``regex_ms``: the case-insensitive substring ``$regex`` on ``name`` or
+  ``worker_id``, which is what matching the browser's filter on the server
+  costs without an index
+* ``prefix_regex_ms``: the same, anchored to the start of the field
+
+Without ``--mongo-url`` the regex side runs on the mongomock stand-in,
+which only shows the shape of the comparison.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from common import api_client, start_app, stop_app, use_database, use_standin_db
+
+import server
+
+FIRST = ["Ravi", "Anita", "Suresh", "Lakshmi", "Arjun", "Meena", "Karthik", "Divya", "Mohan", "Priya",
+         "Ramesh", "Kavya", "Vijay", "Sangeetha", "Ganesh", "Deepa", "Prakash", "Revathi", "Senthil", "Nisha"]
+LAST = ["Kumar", "Raman", "Iyer", "Nair", "Reddy", "Pillai", "Das", "Sharma", "Menon", "Rao",
+        "Swamy", "Naidu", "Krishnan", "Shetty", "Varma", "Bose", "Gupta", "Joshi", "Patel", "Singh"]
+QUERIES = {
+    "badge_exact": "W012345",
+    "badge_prefix": "W0123",
+    "name_prefix": "lak",
+    "full_name": "ravi kumar",
+    "later_word": "pillai",
+    "substring": "esh",
+    "single_char": "s",
+    "no_match": "zzz",
+}
+
+
+async def seed(db, count: int, rng: random.Random):
+    batch = []
+    for i in range(count):
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+            "worker_id": f"W{i:06d}",
+            "daily_wage_rate": 100.0 + i % 50,
+            "created_at": datetime.now(timezone.utc),
+        })
+        if len(batch) >= 5000:
+            await db.workers.insert_many(batch)
+            batch = []
+    if batch:
+        await db.workers.insert_many(batch)
+
+
+def median_and_p99(samples):
+    ordered = sorted(samples)
+    return round(statistics.median(ordered), 3), round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3)
+
+
+async def regex_ms(db, pattern: str, limit: int, repeat: int) -> float:
+    query = {"$or": [
+        {"name": {"$regex": pattern, "$options": "i"}},
+        {"worker_id": {"$regex": pattern, "$options": "i"}},
+    ]}
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await db.workers.find(query, {"_id": 0}).limit(limit).to_list(limit)
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+async def run(args):
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+        await client.drop_database("wageflow_bench_search")
+        db = use_database(client["wageflow_bench_search"])
+    else:
+        db = use_standin_db()
+    await seed(db, args.workers, random.Random(0))
+
+    started = time.perf_counter()
+    await start_app()
+    startup_s = time.perf_counter() - started
+    index = server.worker_index
+    started = time.perf_counter()
+    await index.load(db)
+    build_s = time.perf_counter() - started
+
+    results = []
+    async with api_client() as http:
+        for name, query in QUERIES.items():
+            samples = []
+            for _ in range(args.repeat):
+                began = time.perf_counter()
+                hits = index.search(query, args.limit)
+                samples.append((time.perf_counter() - began) * 1e6)
+            index_p50, index_p99 = median_and_p99(samples)
+
+            samples = []
+            for _ in range(args.repeat):
+                began = time.perf_counter()
+                response = await http.get("/api/workers/search", params={"q": query, "limit": args.limit})
+                samples.append((time.perf_counter() - began) * 1000)
+                response.raise_for_status()
+            request_p50, request_p99 = median_and_p99(samples)
+
+            escaped = re.escape(query)
+            results.append({
+                "query": name,
+                "q": query,
+                "hits": len(hits),
+                "index_p50_us": index_p50,
+                "index_p99_us": index_p99,
+                "request_p50_ms": request_p50,
+                "request_p99_ms": request_p99,
+                "regex_ms": await regex_ms(db, escaped, args.limit, args.regex_repeat),
+                "prefix_regex_ms": await regex_ms(db, "^" + escaped, args.limit, args.regex_repeat),
+            })
+            row = results[-1]
+            print(f"{name:12s} index {row['index_p50_us']:8.1f}us  request {row['request_p50_ms']:6.2f}ms  "
+                  f"regex {row['regex_ms']:8.2f}ms  prefix regex {row['prefix_regex_ms']:8.2f}ms", file=sys.stderr)
+    await stop_app()
+    if args.mongo_url:
+        await client.drop_database("wageflow_bench_search")
+    return {
+        "workers": args.workers,
+        "database": "mongodb" if args.mongo_url else "mongomock",
+        "startup_s": round(startup_s, 3),
+        "index_build_s": round(build_s, 3),
+        "index": index.stats(),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--regex-repeat", type=int, default=5)
+    parser.add_argument("--mongo-url", help="Run the regex queries against a real MongoDB instead of the stand-in")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
@@ -0,0 +1,157 @@
+"""Shared helpers for running the API against an in-process stand-in database."""
+import logging
+import os
+import random
+import sys
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+# Benchmarks compact the archive explicitly where they measure it, never in the background.
+os.environ.setdefault('ARCHIVE_INTERVAL_SECONDS', '0')
+
+import httpx  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+from sync import stamps  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+DB_METHODS = {
+    "find", "find_one", "aggregate", "count_documents", "distinct", "insert_one", "insert_many",
+    "update_one", "update_many", "delete_one", "delete_many", "bulk_write", "find_one_and_update",
+    "create_indexes", "index_information", "drop_index",
+}
+
+
+class CountingCollection:
+    """Proxy that counts each database call made through a collection."""
+
+    def __init__(self, collection, counter: Counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in DB_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counter[name] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+        self.calls = Counter()
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self.calls)
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if name.startswith('_') or hasattr(type(self._db), name):
+            return attr
+        return CountingCollection(attr, self.calls)
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.calls.values())
+
+
+def use_database(db):
+    """Point server.py at ``db`` (wrapped to count round trips) and return the wrapper."""
+    server.db = CountingDatabase(db)
+    server.worker_cache.clear()
+    server.timeseries_store.clear()
+    return server.db
+
+
+def use_standin_db():
+    """Point server.py at a fresh in-memory database and return it."""
+    server.client = AsyncMongoMockClient()
+    return use_database(server.client[os.environ['DB_NAME']])
+
+
+_lifespan = None
+
+
+async def start_app():
+    """Run the app's lifespan startup, as uvicorn would before serving."""
+    global _lifespan
+    _lifespan = server.app.router.lifespan_context(server.app)
+    await _lifespan.__aenter__()
+
+
+async def stop_app():
+    global _lifespan
+    await _lifespan.__aexit__(None, None, None)
+    _lifespan = None
+
+
+def api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench")
+
+
+async def seed_workers(db, count: int):
+    now = datetime.now(timezone.utc)
+    docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Worker {i}",
+            "worker_id": f"W{i:06d}",
+            "daily_wage_rate": 100.0 + i % 50,
+            "rate_history": [{"effective_from": now.date().isoformat(), "daily_wage_rate": 100.0 + i % 50}],
+            "created_at": now,
+        }
+        for i in range(count)
+    ]
+    if docs:
+        # Stamped as the API would, so startup has nothing to backfill.
+        await db.workers.insert_many([{**d, **s} for d, s in zip(docs, stamps(len(docs)))])
+    return [d['id'] for d in docs]
+
+
+async def seed_attendance(db, worker_ids, days: int, presence: float = 0.85, seed: int = 0):
+    """Insert ``days`` days of history, ending today, for every worker."""
+    rng = random.Random(seed)
+    today = datetime.now(timezone.utc).date()
+    workers = {w['id']: w async for w in db.workers.find({"id": {"$in": list(worker_ids)}}, {"_id": 0})}
+    batch = []
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        for worker_id in worker_ids:
+            if rng.random() > presence:
+                continue
+            clock_in = datetime(day.year, day.month, day.day, 8, rng.randrange(60), tzinfo=timezone.utc)
+            hours = round(rng.uniform(6, 10), 2)
+            batch.append({
+                "id": str(uuid.uuid4()),
+                "worker_id": worker_id,
+                "worker_name": workers[worker_id]['name'],
+                "date": day.isoformat(),
+                "clock_in": clock_in.isoformat(),
+                "clock_out": (clock_in + timedelta(hours=hours)).isoformat(),
+                "hours_worked": hours,
+                "wage_earned": round(hours * workers[worker_id]['daily_wage_rate'], 2),
+                "status": "present",
+                "created_at": clock_in,
+            })
+            if len(batch) >= 5000:
+                await insert_stamped(db, batch)
+                batch = []
+    if batch:
+        await insert_stamped(db, batch)
+
+
+async def insert_stamped(db, rows):
+    await db.attendance.insert_many([{**row, **s} for row, s in zip(rows, stamps(len(rows)))])
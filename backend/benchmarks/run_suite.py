@@ -0,0 +1,250 @@
+"""Latency and throughput benchmark for every WageFlow API endpoint.
+
+Seeds N workers x M days of attendance, then drives each endpoint at a fixed
+concurrency and reports p50/p95/p99 latency, throughput and database round
+trips per request. Results are written as JSON so runs can be diffed across
+commits:
+
+    python backend/benchmarks/run_suite.py --workers 2000 --days 60 --output bench.json
+    python backend/benchmarks/run_suite.py --mongo-url mongodb://localhost:27017
+
+Without ``--mongo-url`` the in-memory mongomock stand-in is used, which
+measures application overhead and round-trip counts rather than real
+database latency.
+
+Read endpoints answer repeated requests from the versioned response cache
+(see httpcache.py), so each GET scenario runs twice. The ``uncached`` run
+gives every request its own query string and reads the versions from the
+database each time, so every request renders from the database. The
+``cached`` run repeats requests as clients do. Writes run once, uncached.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from common import (
+    api_client, seed_attendance, seed_workers, start_app, stop_app, use_database, use_standin_db,
+)
+
+import server
+
+# Sent with every uncached read so that no two share a response cache key.
+CACHE_BUSTER = "_bench"
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def scenarios(worker_ids, rng: random.Random):
+    """(name, request factory) pairs; each factory returns (method, url, kwargs)."""
+    today = datetime.now(timezone.utc)
+    closed = (today.replace(day=1) - timedelta(days=1))
+    clock_in = today.replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def any_worker():
+        return rng.choice(worker_ids)
+
+    def clock_event(worker_id):
+        hours = rng.uniform(6, 10)
+        return {
+            "worker_id": worker_id,
+            "clock_in": clock_in.isoformat(),
+            "clock_out": (clock_in + timedelta(hours=hours)).isoformat(),
+        }
+
+    def create_worker():
+        number = uuid.uuid4().hex[:10]
+        return "POST", "/api/workers", {"json": {"name": f"Bench {number}", "worker_id": number, "daily_wage_rate": 120}}
+
+    return [
+        ("root", lambda: ("GET", "/api/", {})),
+        ("health", lambda: ("GET", "/api/health", {})),
+        ("ready", lambda: ("GET", "/api/ready", {})),
+        ("dashboard_stats", lambda: ("GET", "/api/dashboard/stats", {})),
+        ("list_workers", lambda: ("GET", "/api/workers", {})),
+        ("list_workers_page", lambda: ("GET", "/api/workers", {"params": {"limit": 100}})),
+        ("search_workers", lambda: ("GET", "/api/workers/search", {"params": {"q": f"worker {rng.randrange(100)}"}})),
+        ("get_worker", lambda: ("GET", f"/api/workers/{any_worker()}", {})),
+        ("update_worker", lambda: ("PUT", f"/api/workers/{any_worker()}", {"json": {"name": f"Renamed {rng.random():.6f}"}})),
+        ("create_worker", create_worker),
+        ("mark_attendance", lambda: ("POST", "/api/attendance", {"json": clock_event(any_worker())})),
+        ("mark_attendance_bulk", lambda: ("POST", "/api/attendance/bulk", {"json": [clock_event(any_worker()) for _ in range(100)]})),
+        ("today_attendance", lambda: ("GET", "/api/attendance/today", {})),
+        ("attendance_by_date", lambda: ("GET", f"/api/attendance/date/{(today - timedelta(days=1)).date().isoformat()}", {})),
+        ("worker_attendance", lambda: ("GET", f"/api/attendance/worker/{any_worker()}", {})),
+        ("monthly_report_open", lambda: ("GET", f"/api/attendance/monthly/{today.year}/{today.month}", {})),
+        ("monthly_report_closed", lambda: ("GET", f"/api/attendance/monthly/{closed.year}/{closed.month}", {})),
+        ("export_payroll_csv", lambda: ("GET", "/api/exports/payroll", {"params": {
+            "from": (today - timedelta(days=30)).date().isoformat(), "to": today.date().isoformat()
+        }})),
+        ("analytics_year_monthly", lambda: ("GET", "/api/analytics/timeseries", {"params": {
+            "from": (today - timedelta(days=364)).date().isoformat(), "to": today.date().isoformat(), "bucket": "month"
+        }})),
+        ("sync_page", lambda: ("GET", "/api/sync", {"params": {"limit": 100}})),
+        ("cache_stats", lambda: ("GET", "/api/cache/stats", {})),
+    ]
+
+
+def uncached(factory, counter=itertools.count()):
+    """``factory`` with a unique query string on every GET."""
+    def make():
+        method, url, kwargs = factory()
+        if method == "GET":
+            kwargs = {**kwargs, "params": {**kwargs.get("params", {}), CACHE_BUSTER: next(counter)}}
+        return method, url, kwargs
+    return make
+
+
+async def run_scenario(client, db, name, factory, requests: int, concurrency: int, cached: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    if not cached:
+        factory = uncached(factory)
+
+    async def one():
+        nonlocal errors
+        method, url, kwargs = factory()
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+
+    # With no TTL every request reads the versions, even with others in flight.
+    ttl = server.version_clock.ttl
+    if not cached:
+        server.version_clock.ttl = 0
+        server.version_clock.clear()
+    trips_before = db.round_trips
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        server.version_clock.ttl = ttl
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "cached": cached,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "db_round_trips_per_request": round((db.round_trips - trips_before) / requests, 2),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args):
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+        raw_db = client[f"wageflow_bench_{uuid.uuid4().hex[:8]}"]
+        db = use_database(raw_db)
+    else:
+        client = None
+        db = use_standin_db()
+
+    try:
+        seed_started = time.perf_counter()
+        worker_ids = await seed_workers(db, args.workers)
+        await seed_attendance(db, worker_ids, args.days, seed=args.seed)
+        await start_app()
+        seed_seconds = time.perf_counter() - seed_started
+
+        rng = random.Random(args.seed)
+        selected = set(args.only or [])
+        results = []
+        async with api_client() as http:
+            for name, factory in scenarios(worker_ids, rng):
+                if selected and name not in selected:
+                    continue
+                modes = (False, True) if factory()[0] == "GET" else (False,)
+                for cached in modes:
+                    for _ in range(args.warmup):
+                        method, url, kwargs = factory()
+                        await http.request(method, url, **kwargs)
+                    result = await run_scenario(http, db, name, factory, args.requests, args.concurrency, cached)
+                    results.append(result)
+                    print(
+                        f"{name:24s} {'cached' if cached else 'uncached':8s} p50 {result['p50_ms']:8.2f}ms  "
+                        f"p99 {result['p99_ms']:8.2f}ms  {result['requests_per_second']:8.1f} req/s  "
+                        f"{result['db_round_trips_per_request']:6.2f} trips/req",
+                        file=sys.stderr
+                    )
+        await stop_app()
+    finally:
+        if client is not None:
+            await client.drop_database(raw_db.name)
+            client.close()
+
+    return {
+        "revision": git_revision(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": "mongodb" if args.mongo_url else "mongomock",
+        "config": {
+            "workers": args.workers,
+            "days": args.days,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "seed_seconds": round(seed_seconds, 3),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=500, help="Workers to seed")
+    parser.add_argument("--days", type=int, default=30, help="Days of attendance history per worker")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="In-flight requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests before each scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--mongo-url", help="Benchmark against a real MongoDB instead of the stand-in")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(body + "\n")
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""In-process worker cache with TTL, LRU eviction and pluggable invalidation.
+
+Entries are keyed by the worker's ``id`` and can also be found by its
+``worker_id`` badge number. Writes invalidate locally and publish on an
+``InvalidationBus`` so that other uvicorn processes drop their copies too:
+``InMemoryInvalidationBus`` connects caches inside one process (and tests),
+``MongoInvalidationBus`` fans them out through a capped collection. Either
+way a subscriber only hears its peers, never its own messages.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from feeds import CappedFeed
+
+
+class InvalidationBus:
+    """Carries invalidated worker keys between cache instances."""
+
+    async def start(self, callback: Callable[[List[str]], None]):
+        raise NotImplementedError
+
+    async def publish(self, keys: List[str]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryInvalidationBus(InvalidationBus):
+    """One subscriber's end of an in-process bus; buses sharing a ``hub`` hear each other."""
+
+    def __init__(self, hub: Optional[list] = None):
+        self._hub = [] if hub is None else hub
+        self._callback = None
+
+    async def start(self, callback):
+        self._callback = callback
+        self._hub.append(self)
+
+    async def publish(self, keys):
+        for peer in list(self._hub):
+            if peer is not self:
+                peer._callback(keys)
+
+    async def close(self):
+        if self in self._hub:
+            self._hub.remove(self)
+
+
+class MongoInvalidationBus(InvalidationBus):
+    """Shares invalidations across processes through a capped collection."""
+
+    def __init__(self, db, collection: str = "cache_invalidations"):
+        self._feed = CappedFeed(db, collection)
+
+    async def start(self, callback):
+        await self._feed.start(lambda payload: callback(payload['keys']))
+
+    async def publish(self, keys):
+        await self._feed.publish({"keys": list(keys)})
+
+    async def close(self):
+        await self._feed.close()
+
+
+class WorkerCache:
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0, bus: Optional[InvalidationBus] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.bus = bus or InMemoryInvalidationBus()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a read-through load that raced with a
+        # write can tell its result is stale before caching it.
+        self.generation = 0
+        # Called with the keys of every invalidation received from a peer on
+        # the bus, for other per-process state derived from worker documents.
+        self.listeners: List[Callable[[List[str]], None]] = []
+
+    async def start(self):
+        await self.bus.start(self._on_bus)
+
+    async def close(self):
+        await self.bus.close()
+
+    def get(self, worker_id: str) -> Optional[dict]:
+        """Return a copy of the cached worker with this ``id``, or None."""
+        entry = self._entries.get(worker_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, doc = entry
+        if expires < time.monotonic():
+            self._remove(worker_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(worker_id)
+        self.hits += 1
+        return dict(doc)
+
+    def get_by_worker_id(self, number: str) -> Optional[dict]:
+        worker_id = self._aliases.get(number)
+        if worker_id is None:
+            self.misses += 1
+            return None
+        return self.get(worker_id)
+
+    def put(self, doc: dict, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return
+        worker_id = doc['id']
+        self._remove(worker_id)
+        self._entries[worker_id] = (time.monotonic() + self.ttl, dict(doc))
+        self._aliases[doc['worker_id']] = worker_id
+        while len(self._entries) > self.max_size:
+            oldest, (_, evicted) = self._entries.popitem(last=False)
+            self._drop_alias(oldest, evicted)
+            self.evictions += 1
+
+    async def invalidate(self, keys: Iterable[str]):
+        """Drop ``keys`` (ids or badge numbers) here and in every peer cache."""
+        keys = [k for k in keys if k]
+        self._drop(keys)
+        await self.bus.publish(keys)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._aliases.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _on_bus(self, keys: List[str]):
+        self._drop(keys)
+        for listener in self.listeners:
+            listener(keys)
+
+    def _drop(self, keys: List[str]):
+        self.generation += 1
+        for key in keys:
+            worker_id = key if key in self._entries else self._aliases.get(key)
+            if worker_id and self._remove(worker_id):
+                self.invalidations += 1
+
+    def _remove(self, worker_id: str) -> bool:
+        entry = self._entries.pop(worker_id, None)
+        if entry is None:
+            return False
+        self._drop_alias(worker_id, entry[1])
+        return True
+
+    def _drop_alias(self, worker_id: str, doc: dict):
+        if self._aliases.get(doc['worker_id']) == worker_id:
+            del self._aliases[doc['worker_id']]
@@ -0,0 +1,136 @@
+"""Atomic clock-in/clock-out transitions for attendance rows.
+
+Each transition is one conditional ``find_one_and_update``, so concurrent or
+retried clock events for a worker cannot race into duplicate rows:
+
+* clock-in upserts the row for the clock-in date, matching only a row that
+  has not been clocked in yet. A second clock-in hits the unique
+  ``worker_id_date`` index and fails instead of inserting a twin.
+* clock-out matches the worker's open ``clocked_in`` row, which may be
+  yesterday's for a night shift. It computes hours and wages on the server
+  from the stored ``clock_in_at`` in an update pipeline, at the rate in
+  effect on the row's date.
+
+Clients may send an ``Idempotency-Key``. The key is stored on the row with
+the transition it caused, and a retry with the same key replays the stored
+row instead of conflicting. Stand-ins without pipeline-update operators fall
+back to reading the open row and writing it back, conditional on it still
+being open.
+"""
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from archive import ARCHIVE, bucket_id, may_hold
+from codec import to_datetime
+from rates import RateSchedule
+from sync import next_stamp
+
+logger = logging.getLogger(__name__)
+
+OPEN_SORT = [("date", DESCENDING)]
+
+
+def hours_between(clock_in: datetime, clock_out: datetime) -> float:
+    return max(0.0, (clock_out - clock_in).total_seconds() / 3600)
+
+
+def clock_out_pipeline(at: datetime, schedule: RateSchedule, key: Optional[str], stamp: dict):
+    clock_in_at = {"$ifNull": ["$clock_in_at", {"$dateFromString": {"dateString": "$clock_in"}}]}
+    return [
+        {"$set": {"hours_worked": {"$max": [0, {"$divide": [{"$subtract": [at, clock_in_at]}, 3600000]}]}}},
+        {"$set": {
+            "wage_earned": {"$round": [{"$multiply": ["$hours_worked", schedule.switch_expression("$date")]}, 2]},
+            "hours_worked": {"$round": ["$hours_worked", 2]},
+            "clock_out": at.isoformat(),
+            "clock_out_key": key,
+            "status": "present",
+            **{field: {"$literal": value} for field, value in stamp.items()},
+        }},
+    ]
+
+
+async def clock_in(db, worker: dict, at: datetime, key: Optional[str], new_id: str) -> Tuple[dict, Optional[dict], bool]:
+    """Open the attendance row for ``at``'s date; returns (row, previous row, replayed).
+
+    The row matched may already exist without a clock-in, e.g. one marked
+    absent, so the previous row is returned for the rollup transition.
+    """
+    day = at.date().isoformat()
+    # A back-dated clock-in may land on a day that has been archived.
+    if may_hold(day) and await db[ARCHIVE].count_documents(
+        {"_id": bucket_id(worker['id'], day[:7]), "days": int(day[8:])}, limit=1
+    ):
+        raise HTTPException(status_code=409, detail="Already clocked in")
+    changes = {
+        "worker_name": worker['name'],
+        "clock_in": at.isoformat(),
+        "clock_in_at": at,
+        "clock_in_key": key,
+        "status": "clocked_in",
+        **next_stamp(),
+    }
+    inserted = {"id": new_id, "clock_out": None, "hours_worked": 0.0, "wage_earned": 0.0, "created_at": at}
+    try:
+        previous = await db.attendance.find_one_and_update(
+            {"worker_id": worker['id'], "date": day, "clock_in": None},
+            {"$set": changes, "$setOnInsert": inserted},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        base = previous or {"worker_id": worker['id'], "date": day, **inserted}
+        return {**base, **changes}, previous, False
+    except DuplicateKeyError:
+        existing = await db.attendance.find_one({"worker_id": worker['id'], "date": day}, {"_id": 0})
+    if existing and key and existing.get('clock_in_key') == key:
+        return existing, None, True
+    raise HTTPException(status_code=409, detail="Already clocked in")
+
+
+async def _close_row(db, worker: dict, at: datetime, key: Optional[str]) -> Optional[dict]:
+    """Read-then-conditional-write clock-out for stand-ins without pipeline updates."""
+    row = await db.attendance.find_one(
+        {"worker_id": worker['id'], "status": "clocked_in"}, {"_id": 0}, sort=OPEN_SORT
+    )
+    if not row:
+        return None
+    hours = hours_between(to_datetime(row.get('clock_in_at') or row['clock_in']), at)
+    changes = {
+        "hours_worked": round(hours, 2),
+        "wage_earned": round(hours * RateSchedule.for_worker(worker).rate_on(row['date']), 2),
+        "clock_out": at.isoformat(),
+        "clock_out_key": key,
+        "status": "present",
+        **next_stamp(),
+    }
+    result = await db.attendance.update_one({"id": row['id'], "status": "clocked_in"}, {"$set": changes})
+    if result.modified_count == 0:
+        return None
+    return {**row, **changes}
+
+
+async def clock_out(db, worker: dict, at: datetime, key: Optional[str]) -> Tuple[dict, bool]:
+    """Close the worker's open attendance row; returns (row, replayed)."""
+    try:
+        row = await db.attendance.find_one_and_update(
+            {"worker_id": worker['id'], "status": "clocked_in"},
+            clock_out_pipeline(at, RateSchedule.for_worker(worker), key, next_stamp()),
+            projection={"_id": 0},
+            sort=OPEN_SORT,
+            return_document=ReturnDocument.AFTER,
+        )
+    except (OperationFailure, NotImplementedError) as exc:
+        logger.debug("Pipeline clock-out unavailable (%s), using conditional write", exc)
+        row = await _close_row(db, worker, at, key)
+    if row:
+        return row, False
+
+    latest = await db.attendance.find_one({"worker_id": worker['id']}, {"_id": 0}, sort=OPEN_SORT)
+    if latest and key and latest.get('clock_out_key') == key:
+        return latest, True
+    raise HTTPException(status_code=409, detail="Not clocked in")
@@ -0,0 +1,114 @@
+"""Storage codec for timestamp fields, plus the migration off ISO strings.
+
+Timestamps are stored as native BSON datetimes and the Motor client is
+created with ``tz_aware=True``, so documents come back with aware UTC
+datetimes that pydantic accepts as-is. Legacy rows written as ISO strings
+still decode (pydantic parses them), and ``python codec.py migrate``
+converts them in place in batches while the API keeps serving.
+
+The attendance ``date`` field stays an ISO ``YYYY-MM-DD`` string: BSON has
+no date-only type, it is the key of the unique index, the rollups and the
+pagination cursors, and zero-padded ISO dates already sort chronologically,
+so range queries on it are index range scans.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FIELDS = {
+    "workers": ["created_at"],
+    "attendance": ["created_at"],
+}
+
+
+def to_datetime(value) -> Optional[datetime]:
+    """Coerce a stored timestamp (ISO string or datetime) to an aware UTC datetime."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def encode_document(collection: str, doc: dict) -> dict:
+    """Return ``doc`` with its timestamp fields in storage form."""
+    for field in DATETIME_FIELDS.get(collection, []):
+        if field in doc:
+            doc[field] = to_datetime(doc[field])
+    return doc
+
+
+async def migrate_collection(db, collection: str, batch_size: int = 1000) -> int:
+    """Convert string timestamps in ``collection`` to datetimes; returns rows changed.
+
+    Each update is conditional on the old string value, so a concurrent
+    write that already replaced the row with a datetime is left alone.
+    """
+    converted = 0
+    for field in DATETIME_FIELDS[collection]:
+        last_id = None
+        while True:
+            query = {field: {"$type": "string"}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await db[collection].find(query, {field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]['_id']
+
+            operations = []
+            for doc in batch:
+                try:
+                    value = to_datetime(doc[field])
+                except ValueError:
+                    logger.warning("Skipping %s %s: unparseable %s %r", collection, doc['_id'], field, doc[field])
+                    continue
+                operations.append(UpdateOne({"_id": doc['_id'], field: doc[field]}, {"$set": {field: value}}))
+            if operations:
+                result = await db[collection].bulk_write(operations, ordered=False)
+                converted += result.modified_count
+            logger.info("Migrated %d %s.%s values so far", converted, collection, field)
+    return converted
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    cli = typer.Typer(help="Storage codec maintenance.")
+
+    @cli.callback()
+    def main():
+        pass
+
+    @cli.command()
+    def migrate(batch_size: int = typer.Option(1000, help="Documents converted per bulk write.")):
+        """Convert ISO-string timestamps to native datetimes, in batches."""
+        load_dotenv(Path(__file__).parent / '.env')
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+        db = client[os.environ['DB_NAME']]
+
+        async def run():
+            for collection in DATETIME_FIELDS:
+                started = time.perf_counter()
+                converted = await migrate_collection(db, collection, batch_size)
+                typer.echo(f"{collection}: converted {converted} value(s) in {time.perf_counter() - started:.1f}s")
+
+        try:
+            asyncio.run(run())
+        finally:
+            client.close()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cli()
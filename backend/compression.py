@@ -0,0 +1,112 @@
+"""Response compression negotiated from ``Accept-Encoding``.
+
+Brotli is preferred when the optional ``brotli`` package is installed and
+the client accepts it; gzip is used otherwise. Only complete bodies of at
+least ``minimum_size`` bytes are compressed. Streaming responses (SSE,
+NDJSON, exports) pass through untouched, because buffering them for a
+compressor would hold back frames the client is waiting for. Parquet is
+already compressed.
+"""
+import gzip
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def accepted_encodings(header: str) -> dict:
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in (("br",) if brotli else ()) + ("gzip",):
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # Quality 4 is close to gzip's ratio at a fraction of brotli's default cost.
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body") or not self._compressible(response_start, body):
+                await send(response_start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            response_headers = [
+                (k, v) for k, v in response_start["headers"] if k.lower() not in (b"content-length", b"etag")
+            ]
+            for k, v in response_start["headers"]:
+                # The compressed bytes differ from the identity body, so the
+                # tag is only weakly valid for them (RFC 9110 8.8.3).
+                if k.lower() == b"etag":
+                    response_headers.append((k, v if v.startswith(b"W/") else b"W/" + v))
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**response_start, "headers": response_headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start: dict, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        headers = {k.lower(): v for k, v in start["headers"]}
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
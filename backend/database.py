@@ -0,0 +1,63 @@
+"""Motor client configuration, connection warm-up and liveness checks.
+
+Pool size and timeouts come from the environment so each deployment can
+size them to its worker count and MongoDB limits:
+
+    MONGO_MAX_POOL_SIZE                  connections per process (100)
+    MONGO_MIN_POOL_SIZE                  connections kept open when idle (10)
+    MONGO_MAX_IDLE_MS                    close idle connections after this (300000)
+    MONGO_CONNECT_TIMEOUT_MS             TCP connect + handshake (5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS    give up finding a server (5000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS          wait for a free pooled connection (2000)
+    MONGO_WARMUP_CONNECTIONS             connections opened before ready (MIN_POOL_SIZE, 0 to skip)
+
+Creating the client does no I/O. ``warm_up`` opens connections at startup
+with concurrent pings, so the first requests after a deploy do not pay for
+the TCP, TLS and auth handshakes.
+"""
+import asyncio
+import logging
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+def client_options() -> dict:
+    return {
+        "maxPoolSize": _env_int('MONGO_MAX_POOL_SIZE', 100),
+        "minPoolSize": _env_int('MONGO_MIN_POOL_SIZE', 10),
+        "maxIdleTimeMS": _env_int('MONGO_MAX_IDLE_MS', 300000),
+        "connectTimeoutMS": _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        "serverSelectionTimeoutMS": _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        "waitQueueTimeoutMS": _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000),
+    }
+
+
+def create_client(mongo_url: str, **kwargs) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(mongo_url, tz_aware=True, **client_options(), **kwargs)
+
+
+def warmup_connections() -> int:
+    return _env_int('MONGO_WARMUP_CONNECTIONS', client_options()["minPoolSize"])
+
+
+async def ping(db, timeout: float = 2.0) -> bool:
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+        return True
+    except Exception as exc:
+        logger.warning("MongoDB ping failed: %s", exc)
+        return False
+
+
+async def warm_up(db, connections: int):
+    """Open up to ``connections`` pooled connections by pinging concurrently."""
+    # Concurrent pings each need their own connection, so the pool grows to
+    # ``connections`` here rather than during the first burst of traffic.
+    await asyncio.gather(*(db.command("ping") for _ in range(connections)))
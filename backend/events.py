@@ -0,0 +1,148 @@
+"""Server-Sent Events fan-out of attendance and worker changes.
+
+Writes publish compact events (``attendance``, ``worker``, ``worker_removed``,
+``stats``) to an ``EventBroker``. The broker encodes each event into an SSE
+frame once and offers it to every subscriber's bounded queue. A subscriber
+that falls behind loses its backlog and gets a single ``resync`` event, which
+tells the client to refetch. One slow tablet therefore cannot hold frames
+for everyone else. ``MongoEventBroker`` also relays events between processes
+through a capped collection.
+"""
+import asyncio
+import json
+from typing import Set
+
+from fastapi.encoders import jsonable_encoder
+
+from feeds import CappedFeed
+
+RESYNC_FRAME = 'event: resync\ndata: {"type": "resync"}\n\n'
+CONNECTED_FRAME = ": connected\n\n"
+KEEPALIVE_FRAME = ": keep-alive\n\n"
+
+
+def encode_frame(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, broker: "EventBroker", queue_size: int):
+        self._broker = broker
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflows = 0
+
+    def offer(self, frame: str):
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Drop the backlog rather than block publishers; the client
+            # refetches on resync and then resumes from live events.
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC_FRAME)
+            self.overflows += 1
+            self._broker.overflows += 1
+
+    def close(self):
+        """End the stream; the client reconnects, to another process if this one is stopping."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def frames(self, heartbeat: float):
+        """SSE frames for this subscriber, with keep-alives when idle."""
+        yield CONNECTED_FRAME
+        while True:
+            try:
+                frame = await asyncio.wait_for(self._queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE_FRAME
+                continue
+            if frame is None:
+                return
+            yield frame
+
+
+class EventBroker:
+    """In-process broker; events reach subscribers of this process only."""
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.overflows = 0
+
+    @property
+    def has_audience(self) -> bool:
+        """Whether publishing could reach anyone; lets writers skip building events."""
+        return bool(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    async def stream(self, heartbeat: float):
+        """Subscribe and yield SSE frames until the stream ends.
+
+        The subscription is taken on the first iteration, not when the
+        response is built, so a client that disconnects before the body
+        starts never leaves one behind.
+        """
+        subscription = self.subscribe()
+        try:
+            async for frame in subscription.frames(heartbeat):
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    async def publish(self, event: dict):
+        self._fan_out(jsonable_encoder(event))
+
+    def _fan_out(self, event: dict):
+        frame = encode_frame(event)
+        self.published += 1
+        for subscription in list(self._subscribers):
+            subscription.offer(frame)
+
+    async def start(self):
+        pass
+
+    def disconnect(self):
+        """End every open stream; clients reconnect, to another process if this one is stopping."""
+        for subscription in list(self._subscribers):
+            subscription.close()
+        self._subscribers.clear()
+
+    async def close(self):
+        self.disconnect()
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "published": self.published, "overflows": self.overflows}
+
+
+class MongoEventBroker(EventBroker):
+    """Relays events to every process through a capped collection."""
+
+    def __init__(self, db, queue_size: int = 256, collection: str = "events"):
+        super().__init__(queue_size)
+        self._feed = CappedFeed(db, collection, size_bytes=16 << 20)
+
+    @property
+    def has_audience(self) -> bool:
+        return True
+
+    async def publish(self, event: dict):
+        event = jsonable_encoder(event)
+        self._fan_out(event)
+        await self._feed.publish(event)
+
+    async def start(self):
+        await self._feed.start(self._fan_out)
+
+    async def close(self):
+        await self._feed.close()
+        await super().close()
@@ -0,0 +1,268 @@
+"""Streaming payroll exports over arbitrary date ranges.
+
+Attendance rows are read off a Motor cursor in fixed-size chunks. Each chunk
+becomes a pandas frame and is joined with worker metadata in one vectorized
+step. An as-of merge against every worker's rate history then gives each
+row the daily rate in effect on its date. The chunk is encoded as CSV text
+or a Parquet row group before the next one is read. Memory is bounded by
+the chunk size, not by the range, or by one month's buckets for archived
+months (see archive.py). The pandas and pyarrow work runs in the thread
+pool so the event loop keeps serving other requests.
+
+Very large ranges can run as background jobs instead. ``ExportJobs`` writes
+the file to ``EXPORT_DIR`` and reports progress for polling. A finished job
+and its file are deleted ``ttl`` seconds after it finished, and a job that
+fails or is cancelled removes its partial file. Jobs live in the process
+that started them, so multi-process deployments need sticky routing for the
+polling and download calls.
+"""
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+from archive import count_archived, merged_rows
+from rates import RateSchedule, schedules
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+ATTENDANCE_COLUMNS = ["date", "worker_id", "worker_name", "status", "clock_in", "clock_out", "hours_worked", "wage_earned"]
+EXPORT_COLUMNS = [
+    "date", "worker_id", "worker_number", "worker_name", "daily_wage_rate",
+    "status", "clock_in", "clock_out", "hours_worked", "wage_earned",
+]
+CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '5000'))
+
+
+async def load_workers(db):
+    """Worker metadata frame and the rate frame of every worker's schedule."""
+    workers = [
+        w async for w in db.workers.find({}, {"_id": 0, "id": 1, "worker_id": 1, "daily_wage_rate": 1, "rate_history": 1})
+    ]
+    frame = pd.DataFrame.from_records(workers, columns=["id", "worker_id"])
+    return frame.rename(columns={"worker_id": "worker_number"}).set_index("id"), rate_frame(schedules(workers))
+
+
+def rate_frame(rates: Dict[str, RateSchedule]) -> pd.DataFrame:
+    """One row per schedule entry, sorted by ``effective_from`` for ``merge_asof``."""
+    records = [
+        # The first entry also covers any earlier dates.
+        (worker_id, pd.Timestamp.min if i == 0 else pd.Timestamp(d), r)
+        for worker_id, schedule in rates.items()
+        for i, (d, r) in enumerate(zip(schedule.dates, schedule.rates))
+    ]
+    frame = pd.DataFrame.from_records(records, columns=["worker_id", "effective_from", "daily_wage_rate"])
+    frame["effective_from"] = frame["effective_from"].astype("datetime64[ns]")
+    frame["daily_wage_rate"] = frame["daily_wage_rate"].astype("float64")
+    return frame.sort_values("effective_from", kind="stable")
+
+
+def rates_on(frame: pd.DataFrame, rates: pd.DataFrame) -> pd.Series:
+    """The rate in effect on each row's date, not the worker's current one."""
+    days = pd.DataFrame({"worker_id": frame["worker_id"], "day": pd.to_datetime(frame["date"], format="%Y-%m-%d").astype("datetime64[ns]")})
+    days = days.reset_index().sort_values("day", kind="stable")
+    matched = pd.merge_asof(days, rates, left_on="day", right_on="effective_from", by="worker_id")
+    return matched.set_index("index")["daily_wage_rate"].reindex(frame.index)
+
+
+def day_after(date_str: str) -> str:
+    return (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+
+
+async def iter_chunks(db, start_date: str, end_date: str, chunk_size: int = CHUNK_SIZE):
+    chunk = []
+    async for doc in merged_rows(db, start_date, day_after(end_date), ATTENDANCE_COLUMNS, chunk_size):
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_frame(docs, workers: pd.DataFrame, rates) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(docs, columns=ATTENDANCE_COLUMNS)
+    frame = frame.join(workers, on="worker_id")
+    frame["daily_wage_rate"] = rates_on(frame, rates)
+    frame["hours_worked"] = frame["hours_worked"].fillna(0.0).astype("float64").round(2)
+    frame["wage_earned"] = frame["wage_earned"].fillna(0.0).astype("float64").round(2)
+    return frame[EXPORT_COLUMNS]
+
+
+class CsvEncoder:
+    def __init__(self):
+        self._header = True
+
+    def encode(self, frame: pd.DataFrame) -> bytes:
+        text = frame.to_csv(index=False, header=self._header)
+        self._header = False
+        return text.encode()
+
+    def finish(self) -> bytes:
+        if self._header:
+            return pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(index=False).encode()
+        return b""
+
+
+class ParquetEncoder:
+    """Writes one row group per chunk and hands back the bytes produced so far."""
+
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ("date", pa.string()), ("worker_id", pa.string()), ("worker_number", pa.string()),
+            ("worker_name", pa.string()), ("daily_wage_rate", pa.float64()), ("status", pa.string()),
+            ("clock_in", pa.string()), ("clock_out", pa.string()),
+            ("hours_worked", pa.float64()), ("wage_earned", pa.float64()),
+        ])
+        self._sink = io.BytesIO()
+        self._writer = pq.ParquetWriter(self._sink, self._schema)
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def encode(self, frame: pd.DataFrame) -> bytes:
+        table = self._pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+        return self._drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+
+def make_encoder(fmt: str):
+    return ParquetEncoder() if fmt == "parquet" else CsvEncoder()
+
+
+async def stream_export(db, start_date: str, end_date: str, fmt: str, progress=None):
+    """Yield encoded export bytes chunk by chunk; ``progress`` gets the running row count."""
+    workers, rates = await load_workers(db)
+    encoder = await run_in_threadpool(make_encoder, fmt)
+    rows = 0
+    async for docs in iter_chunks(db, start_date, end_date):
+        data = await run_in_threadpool(lambda: encoder.encode(build_frame(docs, workers, rates)))
+        rows += len(docs)
+        if progress:
+            progress(rows)
+        if data:
+            yield data
+    data = await run_in_threadpool(encoder.finish)
+    if data:
+        yield data
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportJobs:
+    def __init__(self, directory: Optional[str] = None, ttl: float = 86400.0, sweep_interval: float = 300.0):
+        self.directory = directory or os.environ.get('EXPORT_DIR') or tempfile.gettempdir()
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.jobs: Dict[str, dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.ttl > 0:
+            self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(min(self.ttl, self.sweep_interval))
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Export job sweep failed")
+
+    async def sweep(self) -> int:
+        """Delete jobs that finished more than ``ttl`` seconds ago, with their files."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.ttl)).isoformat()
+        expired = [job for job in self.jobs.values() if job["finished_at"] and job["finished_at"] < cutoff]
+        for job in expired:
+            del self.jobs[job["id"]]
+            await run_in_threadpool(remove_file, self.path(job))
+        return len(expired)
+
+    async def submit(self, db, start_date: str, end_date: str, fmt: str) -> dict:
+        job_id = str(uuid.uuid4())
+        total = await db.attendance.count_documents({"date": {"$gte": start_date, "$lte": end_date}})
+        total += await count_archived(db, start_date, day_after(end_date))
+        job = {
+            "id": job_id,
+            "status": "running",
+            "format": fmt,
+            "from": start_date,
+            "to": end_date,
+            "rows_total": total,
+            "rows_written": 0,
+            "progress": 0.0 if total else 1.0,
+            "error": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+        }
+        self.jobs[job_id] = job
+        self._tasks[job_id] = asyncio.create_task(self._run(db, job))
+        return job
+
+    def path(self, job: dict) -> str:
+        return os.path.join(self.directory, f"payroll-{job['id']}.{EXPORT_FORMATS[job['format']][1]}")
+
+    async def _run(self, db, job: dict):
+        def progress(rows):
+            job["rows_written"] = rows
+            job["progress"] = round(min(1.0, rows / job["rows_total"]), 4) if job["rows_total"] else 1.0
+
+        try:
+            handle = await run_in_threadpool(open, self.path(job), "wb")
+            try:
+                async for data in stream_export(db, job["from"], job["to"], job["format"], progress):
+                    await run_in_threadpool(handle.write, data)
+            finally:
+                await run_in_threadpool(handle.close)
+            job["status"] = "done"
+            job["progress"] = 1.0
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as exc:
+            logger.exception("Payroll export %s failed", job["id"])
+            job["status"] = "failed"
+            job["error"] = str(exc)
+        finally:
+            if job["status"] != "done":
+                remove_file(self.path(job))
+            job["finished_at"] = datetime.now(timezone.utc).isoformat()
+            self._tasks.pop(job["id"], None)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        if self._sweeper:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        # Each export removes its partial file as it unwinds.
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,60 @@
+"""Cross-process fan-out over a MongoDB capped collection.
+
+Each process inserts its messages into the collection and tails it with an
+awaitable tailable cursor, so every process sees every message. Messages
+carry an origin token, and a process skips its own messages because it has
+already applied them locally.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Callable
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class CappedFeed:
+    def __init__(self, db, collection: str, size_bytes: int = 1 << 20):
+        self._db = db
+        self._name = collection
+        self._size = size_bytes
+        self._origin = uuid.uuid4().hex
+        self._task = None
+
+    async def start(self, callback: Callable[[dict], None]):
+        try:
+            await self._db.create_collection(self._name, capped=True, size=self._size)
+        except CollectionInvalid:
+            pass
+        last = await self._db[self._name].find_one(sort=[("$natural", -1)])
+        self._task = asyncio.create_task(self._tail(callback, last['_id'] if last else None))
+
+    async def _tail(self, callback, last_id):
+        collection = self._db[self._name]
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            try:
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for message in cursor:
+                        last_id = message['_id']
+                        if message.get('origin') != self._origin:
+                            try:
+                                callback(message['payload'])
+                            except Exception:
+                                # One bad message must not end the tail for good.
+                                logger.exception("Feed %s callback failed", self._name)
+            except PyMongoError as exc:
+                logger.warning("Feed %s interrupted: %s", self._name, exc)
+            # Tailable cursors die on an empty collection; back off and re-open.
+            await asyncio.sleep(1)
+
+    async def publish(self, payload: dict):
+        await self._db[self._name].insert_one({"origin": self._origin, "payload": payload})
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
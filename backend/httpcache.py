@@ -0,0 +1,228 @@
+"""Version counters, ETags and a serialized-response cache for read endpoints.
+
+A cacheable read depends on one or more scopes: ``workers`` for anything
+built from worker documents, ``attendance:<date>`` for one day's
+attendance. Each scope has a counter in the ``versions`` collection. Write
+endpoints increment it once their write and the dashboard rollups have
+landed, so a reader that sees the new version also sees the new data. A
+response is tagged with a hash of the versions it was built from. A client
+that sends the tag back in ``If-None-Match`` gets a 304. An identical
+request from any client is answered from the ``ResponseCache``, which
+keeps serialized bodies keyed by path, query and tag.
+
+The ``VersionClock`` holds versions in memory, so neither a 304 nor a cache
+hit costs a database round trip. A bump is published on an
+``InvalidationBus`` as ``scope=version``, and peers keep the highest
+version they have seen of each scope. Entries expire after ``ttl`` seconds
+and are re-read from the collection. That picks up a missed message, or a
+bump from outside the API: the ``rates`` CLI bumps the counters but has no
+bus.
+
+Tags start with an epoch drawn once per database. Counters on a fresh
+database start over, and the epoch keeps them from repeating a tag that a
+client still holds.
+"""
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from pymongo import ReturnDocument, UpdateOne
+
+from cache import InMemoryInvalidationBus, InvalidationBus
+
+VERSIONS = "versions"
+EPOCH_ID = "epoch"
+WORKERS = "workers"
+
+
+def date_scope(date_str: str) -> str:
+    return f"attendance:{date_str}"
+
+
+async def read_versions(db, scopes: Iterable[str]) -> Dict[str, int]:
+    scopes = list(scopes)
+    found = {doc['_id']: doc['version'] async for doc in db[VERSIONS].find({"_id": {"$in": scopes}})}
+    return {scope: found.get(scope, 0) for scope in scopes}
+
+
+async def increment(db, scopes: Iterable[str]) -> Dict[str, int]:
+    """Bump each scope's counter; returns the new versions."""
+    scopes = sorted(set(scopes))
+    if len(scopes) == 1:
+        doc = await db[VERSIONS].find_one_and_update(
+            {"_id": scopes[0]}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return {scopes[0]: doc['version']}
+    if not scopes:
+        return {}
+    await db[VERSIONS].bulk_write(
+        [UpdateOne({"_id": scope}, {"$inc": {"version": 1}}, upsert=True) for scope in scopes], ordered=False
+    )
+    return await read_versions(db, scopes)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+def cache_control(max_age: int = 0) -> str:
+    return f"max-age={max_age}, must-revalidate" if max_age > 0 else "no-cache"
+
+
+class VersionClock:
+    def __init__(self, ttl: float = 60.0, bus: Optional[InvalidationBus] = None, max_scopes: int = 10000):
+        self.ttl = ttl
+        self.bus = bus or InMemoryInvalidationBus()
+        self.max_scopes = max_scopes
+        self.epoch = ""
+        self._versions: Dict[str, Tuple[float, int]] = {}
+        self.hits = 0
+        self.loads = 0
+        self.bumps = 0
+        self.received = 0
+
+    async def start(self, db):
+        doc = await db[VERSIONS].find_one_and_update(
+            {"_id": EPOCH_ID},
+            {"$setOnInsert": {"value": uuid.uuid4().hex[:8]}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self.epoch = doc['value']
+        await self.bus.start(self._on_bus)
+
+    async def close(self):
+        await self.bus.close()
+
+    async def get(self, db, scopes: List[str]) -> List[int]:
+        """Current versions of ``scopes``, from memory unless an entry is missing or expired."""
+        now = time.monotonic()
+        stale = [scope for scope in scopes if self._versions.get(scope, (0.0, 0))[0] <= now]
+        if stale:
+            self.loads += 1
+            self._merge(await read_versions(db, stale))
+        else:
+            self.hits += 1
+        return [self._versions[scope][1] for scope in scopes]
+
+    async def bump(self, db, scopes: Iterable[str]):
+        """Advance ``scopes`` after a write, here and in every peer."""
+        versions = await increment(db, scopes)
+        if not versions:
+            return
+        self.bumps += 1
+        self._merge(versions)
+        await self.bus.publish([f"{scope}={version}" for scope, version in versions.items()])
+
+    def etag(self, scopes: List[str], versions: List[int], variant: str = "") -> str:
+        # Scopes are part of the hash: today's dashboard must not repeat the
+        # tag it had yesterday just because both days reached version 3.
+        state = "|".join(f"{scope}={version}" for scope, version in zip(scopes, versions))
+        digest = hashlib.blake2b(f"{state}|{variant}".encode(), digest_size=8).hexdigest()
+        return f'"{self.epoch}-{digest}"'
+
+    def clear(self):
+        self._versions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "scopes": len(self._versions),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "loads": self.loads,
+            "bumps": self.bumps,
+            "received": self.received,
+        }
+
+    def _merge(self, versions: Dict[str, int]):
+        # A load that raced with a bump must not roll the version back, so
+        # the higher of the two wins; the database value never lags either.
+        expires = time.monotonic() + self.ttl
+        for scope, version in versions.items():
+            known = self._versions.get(scope)
+            self._versions[scope] = (expires, max(version, known[1]) if known else version)
+        if len(self._versions) > self.max_scopes:
+            now = time.monotonic()
+            for scope in [s for s, (e, _) in self._versions.items() if e <= now]:
+                del self._versions[scope]
+
+    def _on_bus(self, keys: List[str]):
+        self.received += 1
+        versions = {}
+        for key in keys:
+            scope, _, version = key.rpartition("=")
+            versions[scope] = int(version)
+        self._merge(versions)
+
+
+class ResponseCache:
+    """LRU of serialized response bodies and headers, keyed by ``(path, query, etag)``.
+
+    A key carries the versions its body was built from, so entries are never
+    invalidated: a write moves readers to a new key and the old one ages
+    out. Concurrent misses for the same key share one render.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[bytes, dict]]" = OrderedDict()
+        self._rendering: Dict[tuple, asyncio.Task] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def fetch(self, key: tuple, render: Callable[[], Awaitable[Response]]) -> Tuple[bytes, dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(key, render))
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, key: tuple, render) -> Tuple[bytes, dict]:
+        response = await render()
+        headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+        entry = (bytes(response.body), headers)
+        if len(entry[0]) <= self.max_bytes:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = entry
+            self.size += len(entry[0])
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (body, _) = self._entries.popitem(last=False)
+                self.size -= len(body)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,125 @@
+import logging
+import time
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Declared indexes, keyed by collection. Names are explicit so reconciliation
+# can tell "same index, different spec" apart from "new index".
+INDEXES = {
+    "attendance": [
+        IndexModel([("worker_id", ASCENDING), ("date", ASCENDING)], name="worker_id_date", unique=True),
+        IndexModel([("date", ASCENDING), ("id", ASCENDING)], name="date_id"),
+        IndexModel([("_seq", ASCENDING)], name="seq"),
+    ],
+    "workers": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("worker_id", ASCENDING)], name="worker_id", unique=True),
+        IndexModel([("_seq", ASCENDING)], name="seq"),
+    ],
+    "tombstones": [
+        IndexModel([("_seq", ASCENDING)], name="seq"),
+    ],
+    "attendance_archive": [
+        IndexModel([("worker_id", ASCENDING), ("month", ASCENDING)], name="worker_id_month", unique=True),
+        IndexModel([("month", ASCENDING)], name="month"),
+    ],
+}
+
+# Indexes superseded by a declaration above, dropped during reconciliation.
+RETIRED_INDEXES = {
+    "attendance": ["date"],
+}
+
+# Hot queries from server.py and the index each one is expected to use.
+SAMPLE_DATE = "1970-01-01"
+HOT_QUERIES = [
+    ("mark_attendance", "attendance", {"worker_id": "", "date": SAMPLE_DATE}, None, "worker_id_date"),
+    ("clock_out", "attendance", {"worker_id": "", "status": "clocked_in"}, [("date", DESCENDING)], "worker_id_date"),
+    ("reprice", "attendance", {"worker_id": "", "status": "present", "date": {"$gte": SAMPLE_DATE}}, [("date", ASCENDING)], "worker_id_date"),
+    ("get_today_attendance", "attendance", {"date": SAMPLE_DATE}, [("id", ASCENDING)], "date_id"),
+    ("get_worker_attendance", "attendance", {"worker_id": ""}, [("date", DESCENDING)], "worker_id_date"),
+    ("get_monthly_report", "attendance", {"date": {"$gte": SAMPLE_DATE, "$lt": SAMPLE_DATE}}, None, "date_id"),
+    ("get_worker", "workers", {"id": ""}, None, "id"),
+    ("get_workers", "workers", {"id": {"$gt": ""}}, [("id", ASCENDING)], "id"),
+    ("create_worker", "workers", {"worker_id": ""}, None, "worker_id"),
+    ("sync_workers", "workers", {"_seq": {"$gt": 0}}, [("_seq", ASCENDING)], "seq"),
+    ("sync_attendance", "attendance", {"_seq": {"$gt": 0}}, [("_seq", ASCENDING)], "seq"),
+    ("sync_tombstones", "tombstones", {"_seq": {"$gt": 0}}, [("_seq", ASCENDING)], "seq"),
+    ("archived_worker_attendance", "attendance_archive", {"worker_id": ""}, [("month", DESCENDING)], "worker_id_month"),
+    ("archived_month", "attendance_archive", {"month": ""}, None, "month"),
+]
+
+
+def _spec_matches(existing: dict, model: IndexModel) -> bool:
+    wanted = model.document
+    return (
+        list(existing.get("key", [])) == list(wanted["key"].items())
+        and bool(existing.get("unique", False)) == bool(wanted.get("unique", False))
+    )
+
+
+async def ensure_indexes(db):
+    """Create the declared indexes, rebuilding any whose spec has drifted."""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        for name in RETIRED_INDEXES.get(collection_name, []):
+            if name in existing:
+                logger.info("Dropping retired index %s.%s", collection_name, name)
+                await collection.drop_index(name)
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                if _spec_matches(existing[name], model):
+                    continue
+                logger.warning("Index %s.%s does not match its declaration, rebuilding", collection_name, name)
+                await collection.drop_index(name)
+
+            started = time.perf_counter()
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as exc:
+                # Typically duplicate keys under a unique index; the app keeps
+                # running, but the hot query will scan until the data is fixed.
+                logger.error("Failed to build index %s.%s: %s", collection_name, name, exc)
+                continue
+            logger.info(
+                "Built index %s.%s in %.1f ms",
+                collection_name, name, (time.perf_counter() - started) * 1000
+            )
+
+
+def _plan_stages(plan: dict):
+    stages = []
+    while plan:
+        stages.append((plan.get("stage"), plan.get("indexName")))
+        inputs = plan.get("inputStages") or []
+        plan = plan.get("inputStage") or (inputs[0] if inputs else None)
+    return stages
+
+
+async def verify_query_plans(db):
+    """Log the winning plan for each hot query and flag collection scans."""
+    for label, collection_name, query, sort, expected_index in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explained = await cursor.explain()
+        except (OperationFailure, NotImplementedError, AttributeError) as exc:
+            logger.info("Skipping plan verification for %s: %s", label, exc)
+            continue
+
+        winning = explained.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning)
+        used = {index for _, index in stages if index}
+        if expected_index in used:
+            logger.info("Query plan for %s uses index %s", label, expected_index)
+        else:
+            logger.warning(
+                "Query plan for %s does not use index %s: %s",
+                label, expected_index, " <- ".join(stage for stage, _ in stages if stage)
+            )
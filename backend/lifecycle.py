@@ -0,0 +1,192 @@
+"""Process lifecycle: startup phases, readiness and graceful drain.
+
+The process moves through ``starting`` -> ``ready`` -> ``draining``.
+``/api/ready`` answers 200 only while ``ready``, so a load balancer sends no
+traffic to a process that is still warming up or is being shut down.
+``/api/health`` only says the event loop is alive. It stays 200 during
+startup so a slow index build does not get the process restarted.
+
+Under ``manage.py serve`` the process reports ``draining`` as soon as the
+shutdown signal arrives: ``DrainingServer`` keeps the listeners open for
+``SHUTDOWN_DRAIN_SECONDS`` more, so a load balancer polling ``/api/ready``
+sees the 503 and stops routing before connections are refused. It then
+ends long-lived streams such as SSE and hands over to uvicorn's own
+shutdown. Run directly under uvicorn, the process only reports
+``draining`` once the lifespan shuts down, after the listeners are closed.
+Either way it then waits up to ``SHUTDOWN_GRACE_SECONDS`` for in-flight
+requests to finish before the database client and background tasks are
+closed.
+
+A request counts as in flight from its arrival until the last chunk of its
+body is sent, which ``InFlightMiddleware`` tracks at the ASGI level so
+streamed bodies count until they end.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger(__name__)
+
+# Every Lifecycle in this process, so a signal handler outside the app can reach them.
+_lifecycles: "weakref.WeakSet[Lifecycle]" = weakref.WeakSet()
+
+
+class Lifecycle:
+    def __init__(self):
+        self.state = "starting"
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.phases: Dict[str, float] = {}
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stream_closers: List[Callable[[], None]] = []
+        _lifecycles.add(self)
+
+    def begin(self):
+        self.state = "starting"
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.phases = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        """Time one startup step; the durations are reported by ``/api/ready``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def mark_ready(self):
+        self.state = "ready"
+        self.ready_at = time.monotonic()
+        logger.info(
+            "Ready in %.3fs (%s)", self.ready_at - self.started_at,
+            ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        )
+
+    def request_started(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def request_finished(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def close_streams_with(self, close: Callable[[], None]):
+        """Register ``close`` to end long-lived responses once the drain period is over."""
+        self._stream_closers.append(close)
+
+    def begin_drain(self):
+        """Stop reporting ready; the process keeps serving until it is shut down."""
+        if self.state != "draining":
+            self.state = "draining"
+            logger.info("Shutdown requested; reporting draining")
+
+    def close_streams(self):
+        for close in self._stream_closers:
+            close()
+
+    async def drain(self, grace: float):
+        """Stop reporting ready and wait up to ``grace`` seconds for in-flight requests."""
+        self.begin_drain()
+        self.close_streams()
+        if self.in_flight:
+            logger.info("Draining %d in-flight request(s)", self.in_flight)
+        try:
+            await asyncio.wait_for(self._idle.wait(), grace)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %d request(s) still in flight", self.in_flight)
+
+    def status(self) -> dict:
+        return {
+            "status": self.state,
+            "startup_seconds": round(self.ready_at - self.started_at, 4) if self.ready_at else None,
+            "phases": self.phases,
+            "in_flight": self.in_flight,
+        }
+
+
+class InFlightMiddleware:
+    """Counts HTTP requests in ``lifecycle.in_flight`` until their final body chunk is sent."""
+
+    def __init__(self, app, lifecycle: Lifecycle):
+        self.app = app
+        self.lifecycle = lifecycle
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if not finished:
+                finished = True
+                self.lifecycle.request_finished()
+
+        async def counted_send(message):
+            try:
+                await send(message)
+            finally:
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    finish()
+
+        self.lifecycle.request_started()
+        try:
+            await self.app(scope, receive, counted_send)
+        finally:
+            finish()
+
+
+class DrainingServer(uvicorn.Server):
+    """A uvicorn server that reports ``draining`` for ``delay`` seconds before it stops listening.
+
+    A second signal during that period exits right away.
+    """
+
+    def __init__(self, config: uvicorn.Config, delay: float):
+        super().__init__(config)
+        self.delay = delay
+        self.draining = False
+
+    def handle_exit(self, sig, frame):
+        if self.draining or self.delay <= 0:
+            super().handle_exit(sig, frame)
+            return
+        self.draining = True
+        for lifecycle in list(_lifecycles):
+            lifecycle.begin_drain()
+        asyncio.get_event_loop().call_later(self.delay, self._stop, sig, frame)
+
+    def _stop(self, sig, frame):
+        # uvicorn waits for open connections before the lifespan shutdown,
+        # so streams that never end on their own are closed here.
+        for lifecycle in list(_lifecycles):
+            lifecycle.close_streams()
+        super().handle_exit(sig, frame)
+
+
+class DrainingSupervisor(Multiprocess):
+    """Signals every worker before waiting for any, so they drain side by side."""
+
+    def shutdown(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        logger.info("Stopping parent process [%d]", self.pid)
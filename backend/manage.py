@@ -0,0 +1,113 @@
+"""Production entry point: ``python manage.py serve``.
+
+Runs ``server:app`` under uvicorn with N worker processes. Every worker
+imports server.py on its own, so it gets its own Motor client, worker cache,
+event broker and export jobs, and shares nothing in memory with the others.
+Only MongoDB is shared. With more than one worker, ``serve`` therefore
+defaults the worker-cache invalidation bus, the HTTP version bus and the
+event broker to their MongoDB-backed variants. A rename in one process then
+evicts stale cache entries in the others, ETags move with writes from every
+process, and SSE clients see those writes too.
+
+On SIGTERM each worker reports ``draining`` on ``/api/ready`` for
+``--drain-seconds`` while still serving, then shuts down as before (see
+lifecycle.py).
+
+``--pool-size`` is the connection budget for the whole deployment. Each
+worker gets ``pool-size / workers`` connections, so adding workers does not
+multiply the load on MongoDB.
+"""
+import importlib.util
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+cli = typer.Typer(help="WageFlow server management.")
+
+
+def default_workers() -> int:
+    return int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+
+def require_module(option: str, value: str, module: str):
+    if value == module and importlib.util.find_spec(module) is None:
+        raise typer.BadParameter(f"{module} is not installed", param_hint=option)
+
+
+@cli.callback()
+def main():
+    pass
+
+
+@cli.command()
+def serve(
+    host: str = typer.Option("0.0.0.0", help="Interface to bind."),
+    port: int = typer.Option(8001, help="Port to bind."),
+    workers: int = typer.Option(None, help="Worker processes; defaults to WEB_CONCURRENCY or the CPU count."),
+    loop: str = typer.Option("auto", help="Event loop: auto, asyncio or uvloop."),
+    http: str = typer.Option("auto", help="HTTP parser: auto, h11 or httptools."),
+    pool_size: int = typer.Option(None, help="MongoDB connections across all workers; split evenly."),
+    backlog: int = typer.Option(2048, help="Listen socket backlog."),
+    graceful_timeout: float = typer.Option(None, help="Seconds to wait for open connections on shutdown."),
+    drain_seconds: float = typer.Option(None, help="Seconds to report draining before closing the listeners."),
+    log_level: str = typer.Option("info"),
+):
+    """Serve the API with one uvicorn worker process per core."""
+    import uvicorn
+
+    # uvicorn.run would do this for app_dir; spawned workers inherit it.
+    sys.path.insert(0, str(ROOT_DIR))
+    from lifecycle import DrainingServer, DrainingSupervisor
+
+    load_dotenv(ROOT_DIR / '.env')
+    if loop not in ("auto", "asyncio", "uvloop"):
+        raise typer.BadParameter("must be auto, asyncio or uvloop", param_hint="--loop")
+    if http not in ("auto", "h11", "httptools"):
+        raise typer.BadParameter("must be auto, h11 or httptools", param_hint="--http")
+    require_module("--loop", loop, "uvloop")
+    require_module("--http", http, "httptools")
+
+    workers = workers or default_workers()
+    # Worker processes inherit the environment, so per-process settings are
+    # passed this way rather than as arguments to server.py.
+    if workers > 1:
+        os.environ.setdefault('WORKER_CACHE_BUS', 'mongo')
+        os.environ.setdefault('EVENT_BROKER', 'mongo')
+        os.environ.setdefault('HTTP_CACHE_BUS', 'mongo')
+    if pool_size:
+        per_worker = max(1, pool_size // workers)
+        os.environ['MONGO_MAX_POOL_SIZE'] = str(per_worker)
+        os.environ['MONGO_MIN_POOL_SIZE'] = str(min(per_worker, int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))))
+    if graceful_timeout is None:
+        graceful_timeout = float(os.environ.get('SHUTDOWN_GRACE_SECONDS', '20')) + 5
+    if drain_seconds is None:
+        drain_seconds = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', '5'))
+
+    typer.echo(f"Serving on {host}:{port} with {workers} worker(s), loop={loop}, http={http}")
+    config = uvicorn.Config(
+        "server:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=backlog,
+        timeout_graceful_shutdown=graceful_timeout,
+        log_level=log_level,
+        proxy_headers=True,
+    )
+    server = DrainingServer(config, delay=drain_seconds)
+    if workers > 1:
+        DrainingSupervisor(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    cli()
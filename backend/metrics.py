@@ -0,0 +1,248 @@
+"""Per-request timing, database command profiling and Prometheus export.
+
+Each request gets a ``RequestProfile`` in a context variable. The Motor
+command listener attributes every command (and its duration and returned
+documents) to the profile of the request that issued it; ``TimedRoute``
+splits handler time into endpoint work and response serialization. The
+middleware turns the profile into a ``Server-Timing`` header, aggregates it
+into ``registry`` for ``/api/metrics``, and logs requests slower than
+``SLOW_REQUEST_MS`` with their query breakdown.
+"""
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.endpoint_seconds = 0.0
+        self.handler_seconds = 0.0
+        self.db_commands: List[Tuple[str, str, float, int]] = []
+        self._lock = threading.Lock()
+
+    def add_command(self, name: str, collection: str, seconds: float, documents: int):
+        with self._lock:
+            self.db_commands.append((name, collection, seconds, documents))
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(c[2] for c in self.db_commands)
+
+    @property
+    def db_documents(self) -> int:
+        return sum(c[3] for c in self.db_commands)
+
+
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+class CommandProfiler(monitoring.CommandListener):
+    """Attributes Motor commands to the request that is running them.
+
+    Motor copies the caller's context into its executor threads, so
+    ``current_profile`` is visible in ``started``.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple, Tuple[RequestProfile, str]] = {}
+
+    def started(self, event):
+        profile = current_profile.get()
+        if profile is None:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        self._pending[(event.connection_id, event.request_id)] = (profile, collection)
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        profile, collection = pending
+        profile.add_command(event.command_name, collection, event.duration_micros / 1e6, _returned(event.reply))
+
+    def failed(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        profile, collection = pending
+        profile.add_command(event.command_name, collection, event.duration_micros / 1e6, 0)
+
+
+def _returned(reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:
+        return 1 if reply["value"] else 0
+    return 0
+
+
+class TimedRoute(APIRoute):
+    """Times the endpoint body separately from the whole route handler.
+
+    The difference is FastAPI's response work: ``response_model`` validation
+    and JSON encoding.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        # ``include_router`` rebuilds each route from the already-timed endpoint.
+        if getattr(endpoint, "timed", False):
+            super().__init__(path, endpoint, **kwargs)
+            return
+
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                profile = current_profile.get()
+                if profile is not None:
+                    profile.endpoint_seconds += time.perf_counter() - started
+
+        timed_endpoint.timed = True
+        super().__init__(path, timed_endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                profile = current_profile.get()
+                if profile is not None:
+                    profile.handler_seconds += time.perf_counter() - started
+
+        return timed_handler
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.durations = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self.duration_sums = defaultdict(float)
+        self.db_commands = defaultdict(int)
+        self.db_seconds = defaultdict(float)
+        self.db_documents = defaultdict(int)
+        self.serialize_seconds = defaultdict(float)
+
+    def observe(self, method: str, route: str, status: int, seconds: float, profile: RequestProfile):
+        key = (method, route)
+        self.requests[key + (str(status),)] += 1
+        buckets = self.durations[key]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+                break
+        else:
+            buckets[-1] += 1
+        self.duration_sums[key] += seconds
+        self.db_commands[key] += len(profile.db_commands)
+        self.db_seconds[key] += profile.db_seconds
+        self.db_documents[key] += profile.db_documents
+        self.serialize_seconds[key] += max(0.0, profile.handler_seconds - profile.endpoint_seconds)
+
+    def render(self) -> str:
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        family("wageflow_http_requests_total", "counter", "HTTP requests by route and status.", [
+            ({"method": m, "route": r, "status": s}, v) for (m, r, s), v in sorted(self.requests.items())
+        ])
+
+        lines.append("# HELP wageflow_http_request_duration_seconds HTTP request latency.")
+        lines.append("# TYPE wageflow_http_request_duration_seconds histogram")
+        for (method, route), buckets in sorted(self.durations.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ("+Inf",), buckets):
+                cumulative += count
+                labels = {"method": method, "route": route, "le": str(bound)}
+                lines.append(f"wageflow_http_request_duration_seconds_bucket{_labels(labels)} {cumulative}")
+            labels = _labels({"method": method, "route": route})
+            lines.append(f"wageflow_http_request_duration_seconds_sum{labels} {self.duration_sums[(method, route)]}")
+            lines.append(f"wageflow_http_request_duration_seconds_count{labels} {cumulative}")
+
+        for name, help_text, values in (
+            ("wageflow_db_commands_total", "Database commands issued while serving a route.", self.db_commands),
+            ("wageflow_db_seconds_total", "Time spent in database commands per route.", self.db_seconds),
+            ("wageflow_db_documents_returned_total", "Documents returned by database commands per route.", self.db_documents),
+            ("wageflow_response_serialize_seconds_total", "Time spent validating and encoding responses per route.", self.serialize_seconds),
+        ):
+            family(name, "counter", help_text, [
+                ({"method": m, "route": r}, v) for (m, r), v in sorted(values.items())
+            ])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_gauges(prefix: str, help_text: str, values: dict) -> str:
+    """Render a flat dict of numbers (e.g. cache stats) as Prometheus gauges."""
+    lines = []
+    for key, value in values.items():
+        lines.append(f"# HELP {prefix}_{key} {help_text}")
+        lines.append(f"# TYPE {prefix}_{key} gauge")
+        lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(profile: RequestProfile, total_seconds: float) -> str:
+    serialize = max(0.0, profile.handler_seconds - profile.endpoint_seconds)
+    app = max(0.0, profile.endpoint_seconds - profile.db_seconds)
+    return ", ".join([
+        f'db;dur={profile.db_seconds * 1000:.2f};desc="{len(profile.db_commands)} commands"',
+        f"app;dur={app * 1000:.2f}",
+        f"serialize;dur={serialize * 1000:.2f}",
+        f"total;dur={total_seconds * 1000:.2f}",
+    ])
+
+
+def log_slow_request(method: str, route: str, status: int, seconds: float, profile: RequestProfile):
+    breakdown = ", ".join(
+        f"{name} {collection} {duration * 1000:.1f}ms/{docs} docs"
+        for name, collection, duration, docs in profile.db_commands
+    )
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms (db %.1f ms over %d commands, serialize %.1f ms): %s",
+        method, route, status, seconds * 1000, profile.db_seconds * 1000, len(profile.db_commands),
+        max(0.0, profile.handler_seconds - profile.endpoint_seconds) * 1000, breakdown or "no queries"
+    )
+
+
+registry = MetricsRegistry()
+command_profiler = CommandProfiler()
@@ -0,0 +1,180 @@
+"""Keyset pagination and NDJSON streaming for list endpoints.
+
+A page is requested with ``limit`` and continued with ``after``, the sort-key
+values of the last row joined by ``|`` (``<id>`` for workers,
+``<date>|<id>`` for attendance). JSON responses also carry the next value in
+the ``X-Next-Cursor`` header when the page is full. Sending
+``Accept: application/x-ndjson`` streams rows straight off the Motor cursor.
+``merged_page`` pages over a collection plus rows read from elsewhere, such
+as the attendance archive.
+
+Rows come from our own collections and are projected to exactly the fields
+of the endpoint's response model, so they are already in response shape.
+Pages are therefore encoded straight to JSON bytes with orjson. They skip
+the ``response_model`` round trip, which validates every row into a
+pydantic object and back through ``jsonable_encoder`` and usually costs
+more CPU than the query itself. ``response_model`` stays on the routes for
+the OpenAPI schema.
+"""
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional, Tuple, Type, Union
+
+import orjson
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+Sort = List[Tuple[str, int]]
+
+
+def encode_cursor(doc: dict, sort: Sort) -> str:
+    return "|".join(str(doc[field]) for field, _ in sort)
+
+
+def keyset_filter(after: str, sort: Sort) -> dict:
+    """Match rows strictly past ``after`` in ``sort`` order."""
+    values = after.split("|")
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def dump_json(content) -> bytes:
+    # OPT_UTC_Z writes UTC as "Z", matching pydantic's rendering of the models.
+    return orjson.dumps(content, default=_json_default, option=orjson.OPT_UTC_Z)
+
+
+class RowsResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
+def projection(model: Type[BaseModel]) -> dict:
+    """Project a document down to ``model``'s fields, dropping internal ones."""
+    return {"_id": 0, **{field: 1 for field in model.model_fields}}
+
+
+async def _ndjson_lines(cursor):
+    async for doc in cursor:
+        yield dump_json(doc) + b"\n"
+
+
+async def list_page(collection, query: dict, sort: Sort, model: Type[BaseModel], request: Request,
+                    limit: Optional[int] = None, after: Optional[str] = None):
+    """Run ``query`` in keyset order and return a page of ``model`` rows, JSON or NDJSON."""
+    if after:
+        query = {"$and": [query, keyset_filter(after, sort)]}
+    cursor = collection.find(query, projection(model)).sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    if wants_ndjson(request):
+        return StreamingResponse(_ndjson_lines(cursor), media_type=NDJSON_MEDIA_TYPE)
+    return _page_response([doc async for doc in cursor], sort, limit)
+
+
+def _key(doc: dict, sort: Sort) -> tuple:
+    return tuple(doc[field] for field, _ in sort)
+
+
+def _past(doc: dict, values: List[str], sort: Sort) -> bool:
+    for (field, direction), value in zip(sort, values):
+        if doc[field] != value:
+            return (doc[field] > value) == (direction > 0)
+    return False
+
+
+async def _iterate(rows: Union[Iterable[dict], AsyncIterable[dict]]) -> AsyncIterator[dict]:
+    if hasattr(rows, "__aiter__"):
+        async for doc in rows:
+            yield doc
+    else:
+        for doc in rows:
+            yield doc
+
+
+async def _merge(primary: AsyncIterator[dict], extra: AsyncIterator[dict], sort: Sort) -> AsyncIterator[dict]:
+    """Merge two row streams already in ``sort`` order; on equal keys ``primary``'s row wins."""
+    descending = sort[0][1] < 0
+    a, b = await anext(primary, None), await anext(extra, None)
+    while a is not None or b is not None:
+        if a is None:
+            yield b
+            b = await anext(extra, None)
+            continue
+        if b is not None:
+            key_a, key_b = _key(a, sort), _key(b, sort)
+            if key_b == key_a:
+                b = await anext(extra, None)
+            elif (key_b < key_a) != descending:
+                yield b
+                b = await anext(extra, None)
+                continue
+        yield a
+        a = await anext(primary, None)
+
+
+async def _take(rows: AsyncIterator[dict], limit: int) -> AsyncIterator[dict]:
+    taken = 0
+    async for doc in rows:
+        yield doc
+        taken += 1
+        if taken >= limit:
+            return
+
+
+async def merged_page(collection, query: dict, extra: Union[Iterable[dict], AsyncIterable[dict]], sort: Sort,
+                      model: Type[BaseModel], request: Request, limit: Optional[int] = None,
+                      after: Optional[str] = None):
+    """``list_page`` over ``collection`` plus ``extra``, rows of the same shape kept elsewhere.
+
+    ``extra`` must already be projected to ``model``, come in ``sort`` order
+    and hold every row that could fall on the page. The two are merged as
+    they are read, so NDJSON still streams in constant memory. A row in
+    both places (same sort key) is taken from ``collection``. Every field
+    in ``sort`` must run in one direction.
+    """
+    extra = _iterate(extra)
+    if after:
+        query = {"$and": [query, keyset_filter(after, sort)]}
+        values = after.split("|")
+        extra = (doc async for doc in extra if _past(doc, values, sort))
+    cursor = collection.find(query, projection(model)).sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    rows = _merge(_iterate(cursor), extra, sort)
+    if limit:
+        rows = _take(rows, limit)
+    if wants_ndjson(request):
+        return StreamingResponse(_ndjson_lines(rows), media_type=NDJSON_MEDIA_TYPE)
+    return _page_response([doc async for doc in rows], sort, limit)
+
+
+def _page_response(docs: List[dict], sort: Sort, limit: Optional[int]) -> Response:
+    headers = {}
+    if limit and len(docs) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort)
+    return RowsResponse(docs, headers=headers)
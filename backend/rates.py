@@ -0,0 +1,240 @@
+"""Effective-dated daily wage rates and re-pricing of affected attendance.
+
+Each worker document carries ``rate_history``, a list of
+``{"effective_from": "YYYY-MM-DD", "daily_wage_rate": x}`` entries sorted
+by date. ``daily_wage_rate`` mirrors the entry in effect today, for readers
+that only want the current rate. A rate applies from its ``effective_from``
+until the next entry. The first entry also covers any earlier dates, and a
+worker without history (created before rates were versioned) is priced at
+``daily_wage_rate`` throughout. ``backfill_rate_history`` gives such workers
+that history at startup, because list endpoints serve projected documents
+as stored and would otherwise leave the field out.
+
+``RateSchedule`` keeps a worker's history as parallel sorted arrays and
+resolves the rate for a date with one bisect. The history travels with
+the worker document, so the worker cache and its invalidation bus keep it
+current in every process.
+
+A rate change only touches the dates it governs, ``[effective_from, next
+effective_from)``. ``reprice`` re-prices the worker's attendance in that
+range with batched bulk writes and returns the per-date changes, so the
+caller can move the rollups and dirty the monthly snapshots. Archived
+months in the range are restored to daily rows first (``archive.thaw``).
+"""
+import asyncio
+import logging
+import os
+from bisect import bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from codec import to_datetime
+from sync import stamps
+
+logger = logging.getLogger(__name__)
+
+REPRICE_BATCH_SIZE = 1000
+
+
+class RateSchedule:
+    __slots__ = ("dates", "rates")
+
+    def __init__(self, entries: List[dict]):
+        self.dates = [e['effective_from'] for e in entries]
+        self.rates = [e['daily_wage_rate'] for e in entries]
+
+    @classmethod
+    def for_worker(cls, worker: dict) -> "RateSchedule":
+        history = worker.get('rate_history')
+        if not history:
+            return cls([{"effective_from": "", "daily_wage_rate": worker['daily_wage_rate']}])
+        return cls(history)
+
+    def rate_on(self, date_str: str) -> float:
+        return self.rates[max(0, bisect_right(self.dates, date_str) - 1)]
+
+    def period(self, effective_from: str) -> Tuple[Optional[str], Optional[str]]:
+        """The [start, end) dates governed by the entry at ``effective_from``; None is unbounded."""
+        i = self.dates.index(effective_from)
+        start = None if i == 0 else effective_from
+        end = self.dates[i + 1] if i + 1 < len(self.dates) else None
+        return start, end
+
+    def switch_expression(self, date_field: str = "$date"):
+        """Aggregation expression for the rate on ``date_field``, for pipeline updates."""
+        branches = [
+            {"case": {"$gte": [date_field, d]}, "then": r}
+            for d, r in reversed(list(zip(self.dates, self.rates)))
+        ]
+        return {"$switch": {"branches": branches, "default": self.rates[0]}}
+
+
+def rate_on(worker: dict, date_str: str) -> float:
+    return RateSchedule.for_worker(worker).rate_on(date_str)
+
+
+def schedules(workers) -> Dict[str, RateSchedule]:
+    return {w['id']: RateSchedule.for_worker(w) for w in workers}
+
+
+def initial_history(worker: dict) -> List[dict]:
+    """History for a worker that has none yet: its current rate since it was created."""
+    created_at = to_datetime(worker.get('created_at')) or datetime.now(timezone.utc)
+    return [{"effective_from": created_at.date().isoformat(), "daily_wage_rate": worker['daily_wage_rate']}]
+
+
+async def backfill_rate_history(db, batch_size: int = REPRICE_BATCH_SIZE) -> int:
+    """Write ``initial_history`` into workers that have no ``rate_history``; returns how many."""
+    total = 0
+    while True:
+        batch = await db.workers.find(
+            {"rate_history": {"$exists": False}}, {"_id": 0, "id": 1, "daily_wage_rate": 1, "created_at": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        # Conditional, so a concurrent set_rate's history is kept.
+        operations = [
+            UpdateOne({"id": worker['id'], "rate_history": {"$exists": False}},
+                      {"$set": {"rate_history": initial_history(worker), **s}})
+            for worker, s in zip(batch, stamps(len(batch)))
+        ]
+        await db.workers.bulk_write(operations, ordered=False)
+        total += len(operations)
+    if total:
+        logger.info("Backfilled rate history for %d worker(s)", total)
+    return total
+
+
+async def set_rate(db, worker: dict, effective_from: str, rate: float) -> dict:
+    """Record ``rate`` from ``effective_from`` on; returns the updated worker document."""
+    if not worker.get('rate_history'):
+        await db.workers.update_one(
+            {"id": worker['id'], "rate_history": {"$exists": False}},
+            {"$set": {"rate_history": initial_history(worker)}}
+        )
+    entry = {"effective_from": effective_from, "daily_wage_rate": rate}
+    # Replace the entry for that date if there is one, else insert in order;
+    # each step is a single conditional update, so concurrent changes don't
+    # lose entries.
+    result = await db.workers.update_one(
+        {"id": worker['id'], "rate_history.effective_from": effective_from},
+        {"$set": {"rate_history.$.daily_wage_rate": rate}}
+    )
+    if result.matched_count == 0:
+        await db.workers.update_one(
+            {"id": worker['id']},
+            {"$push": {"rate_history": {"$each": [entry], "$sort": {"effective_from": 1}}}}
+        )
+    updated = await db.workers.find_one({"id": worker['id']}, {"_id": 0})
+    current = rate_on(updated, datetime.now(timezone.utc).date().isoformat())
+    if updated['daily_wage_rate'] != current:
+        await db.workers.update_one({"id": worker['id']}, {"$set": {"daily_wage_rate": current}})
+        updated['daily_wage_rate'] = current
+    return updated
+
+
+def priced_hours(att: dict) -> float:
+    """Hours for pricing, from the clock times when both are known."""
+    if att.get('clock_in') and att.get('clock_out'):
+        clock_in, clock_out = to_datetime(att['clock_in']), to_datetime(att['clock_out'])
+        return max(0.0, (clock_out - clock_in).total_seconds() / 3600)
+    return att.get('hours_worked', 0) or 0.0
+
+
+async def reprice(db, worker: dict, start: Optional[str] = None, end: Optional[str] = None,
+                  batch_size: int = REPRICE_BATCH_SIZE) -> Dict[str, list]:
+    """Re-price ``worker``'s present rows with dates in [start, end).
+
+    Returns ``{date: [(old, new), ...]}`` for the rows whose wage changed.
+    """
+    schedule = RateSchedule.for_worker(worker)
+    query = {"worker_id": worker['id'], "status": "present"}
+    date_range = {}
+    if start:
+        date_range["$gte"] = start
+    if end:
+        date_range["$lt"] = end
+    if date_range:
+        query["date"] = date_range
+
+    changes: Dict[str, list] = {}
+    pending = []
+
+    async def write(pending):
+        # Conditional on the old wage, so a concurrent clock event wins.
+        operations = [
+            UpdateOne({"id": att['id'], "wage_earned": att.get('wage_earned')}, {"$set": {"wage_earned": wage, **s}})
+            for (att, wage), s in zip(pending, stamps(len(pending)))
+        ]
+        await db.attendance.bulk_write(operations, ordered=False)
+
+    cursor = db.attendance.find(
+        query, {"_id": 0, "id": 1, "worker_id": 1, "date": 1, "status": 1, "clock_in": 1, "clock_out": 1, "hours_worked": 1, "wage_earned": 1}
+    ).sort([("date", 1)])
+    async for att in cursor:
+        wage = round(priced_hours(att) * schedule.rate_on(att['date']), 2)
+        if wage == att.get('wage_earned'):
+            continue
+        pending.append((att, wage))
+        changes.setdefault(att['date'], []).append((att, {**att, "wage_earned": wage}))
+        if len(pending) >= batch_size:
+            await write(pending)
+            pending = []
+    if pending:
+        await write(pending)
+    if changes:
+        logger.info("Re-priced %d attendance row(s) for worker %s", sum(map(len, changes.values())), worker['id'])
+    return changes
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from archive import thaw
+    from httpcache import date_scope, increment
+    from reports import mark_months_dirty
+    from rollups import apply_attendance_changes
+
+    cli = typer.Typer(help="Wage rate maintenance.")
+
+    @cli.callback()
+    def main():
+        pass
+
+    @cli.command("reprice")
+    def reprice_command(
+        worker: List[str] = typer.Option(None, help="Worker id to re-price; repeatable. Defaults to all workers."),
+        start: str = typer.Option(None, "--from", help="First date to re-price (YYYY-MM-DD)."),
+        end: str = typer.Option(None, "--to", help="Re-price dates before this one (YYYY-MM-DD)."),
+        batch_size: int = typer.Option(REPRICE_BATCH_SIZE, help="Rows per bulk write."),
+    ):
+        """Recompute stored wages from each worker's rate history."""
+        load_dotenv(Path(__file__).parent / '.env')
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+        db = client[os.environ['DB_NAME']]
+
+        async def run():
+            query = {"id": {"$in": worker}} if worker else {}
+            rows = 0
+            async for doc in db.workers.find(query, {"_id": 0}):
+                thawed = await thaw(db, doc['id'], start, end)
+                changes = await reprice(db, doc, start, end, batch_size)
+                for date_str, date_changes in changes.items():
+                    await apply_attendance_changes(db, date_str, date_changes, upsert=False)
+                await mark_months_dirty(db, list(changes) + thawed)
+                await increment(db, [date_scope(date_str) for date_str in changes])
+                rows += sum(map(len, changes.values()))
+            typer.echo(f"Re-priced {rows} row(s)")
+
+        try:
+            asyncio.run(run())
+        finally:
+            client.close()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cli()
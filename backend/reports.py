@@ -0,0 +1,158 @@
+"""Monthly payroll report with materialized snapshots for closed months.
+
+The attendance half of a report (per-worker day counts, hours and wages) is
+cached in ``monthly_reports`` keyed by ``YYYY-MM``. Worker metadata is merged
+in at serve time, so renames never invalidate a snapshot, and the rate shown
+is the one in effect on the month's last day. A back-dated rate change
+re-prices the affected rows, and like any other write that lands in a
+closed month it bumps the month's ``version``; a snapshot is stale
+whenever ``built_version`` lags behind it. The open month is always computed
+live since every clock event changes it. For an archived month, the
+buckets' precomputed totals (see archive.py) are added to whatever daily
+rows are left.
+"""
+import hashlib
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from pymongo.errors import OperationFailure
+
+from archive import PRESENT_STATUS, archived_totals
+from rates import rate_on
+
+logger = logging.getLogger(__name__)
+
+EMPTY_TOTALS = {"total_days": 0, "present_days": 0, "total_hours": 0, "total_wages": 0}
+
+
+def month_key(year: int, month: int) -> str:
+    return f"{year}-{month:02d}"
+
+
+def month_bounds(year: int, month: int):
+    start_date = f"{year}-{month:02d}-01"
+    if month == 12:
+        end_date = f"{year+1}-01-01"
+    else:
+        end_date = f"{year}-{month+1:02d}-01"
+    return start_date, end_date
+
+
+def is_open_month(year: int, month: int) -> bool:
+    today = datetime.now(timezone.utc).date()
+    return (year, month) >= (today.year, today.month)
+
+
+def monthly_totals_pipeline(start_date: str, end_date: str):
+    return [
+        {"$match": {"date": {"$gte": start_date, "$lt": end_date}}},
+        {"$group": {
+            "_id": "$worker_id",
+            "total_days": {"$sum": 1},
+            "present_days": {"$sum": {"$cond": [{"$eq": ["$status", PRESENT_STATUS]}, 1, 0]}},
+            "total_hours": {"$sum": "$hours_worked"},
+            "total_wages": {"$sum": "$wage_earned"},
+        }},
+    ]
+
+
+async def aggregate_monthly_totals(db, start_date: str, end_date: str):
+    """Per-worker attendance totals for [start_date, end_date), keyed by worker id.
+
+    Runs as a single server-side ``$group``. In-process stand-ins that do not
+    implement the pipeline operators fall back to summing one range scan here.
+    """
+    totals = {}
+    try:
+        async for row in db.attendance.aggregate(monthly_totals_pipeline(start_date, end_date)):
+            totals[row.pop('_id')] = row
+        return totals
+    except (OperationFailure, NotImplementedError) as exc:
+        logger.warning("Monthly aggregation unavailable (%s), using fallback scan", exc)
+
+    totals = {}
+    cursor = db.attendance.find(
+        {"date": {"$gte": start_date, "$lt": end_date}},
+        {"_id": 0, "worker_id": 1, "status": 1, "hours_worked": 1, "wage_earned": 1}
+    )
+    async for att in cursor:
+        row = totals.setdefault(att['worker_id'], dict(EMPTY_TOTALS))
+        row['total_days'] += 1
+        if att.get('status') == PRESENT_STATUS:
+            row['present_days'] += 1
+        row['total_hours'] += att.get('hours_worked', 0)
+        row['total_wages'] += att.get('wage_earned', 0)
+    return totals
+
+
+async def load_monthly_totals(db, year: int, month: int):
+    """Monthly totals, from the snapshot when it is current, rebuilding it otherwise."""
+    start_date, end_date = month_bounds(year, month)
+    if is_open_month(year, month):
+        return await aggregate_monthly_totals(db, start_date, end_date)
+
+    key = month_key(year, month)
+    snapshot = await db.monthly_reports.find_one({"_id": key}) or {}
+    version = snapshot.get('version', 0)
+    if 'totals' in snapshot and snapshot.get('built_version') == version:
+        return snapshot['totals']
+
+    totals = await aggregate_monthly_totals(db, start_date, end_date)
+    for worker_id, archived in (await archived_totals(db, key)).items():
+        row = totals.setdefault(worker_id, dict(EMPTY_TOTALS))
+        for k in EMPTY_TOTALS:
+            row[k] += archived[k]
+    # Record the version we read before aggregating: a write that lands
+    # meanwhile bumps ``version`` past it and leaves the snapshot stale.
+    await db.monthly_reports.update_one(
+        {"_id": key},
+        {"$set": {
+            "totals": totals,
+            "built_version": version,
+            "built_at": datetime.now(timezone.utc).isoformat(),
+        }},
+        upsert=True
+    )
+    logger.info("Rebuilt monthly report snapshot %s (%d workers)", key, len(totals))
+    return totals
+
+
+async def mark_months_dirty(db, dates):
+    """Invalidate snapshots for the closed months any of ``dates`` fall in."""
+    for key in {d[:7] for d in dates}:
+        year, month = int(key[:4]), int(key[5:7])
+        if is_open_month(year, month):
+            continue
+        await db.monthly_reports.update_one({"_id": key}, {"$inc": {"version": 1}}, upsert=True)
+
+
+async def build_monthly_report(db, year: int, month: int):
+    totals = await load_monthly_totals(db, year, month)
+    _, end_date = month_bounds(year, month)
+    rate_date = min(date.fromisoformat(end_date) - timedelta(days=1), datetime.now(timezone.utc).date()).isoformat()
+    report = []
+
+    async for worker in db.workers.find({}, {"_id": 0}):
+        row = totals.get(worker['id'], EMPTY_TOTALS)
+        total_days = row['total_days']
+        present_days = row['present_days']
+
+        report.append({
+            "worker_id": worker['id'],
+            "worker_name": worker['name'],
+            "worker_number": worker['worker_id'],
+            "daily_wage_rate": rate_on(worker, rate_date),
+            "total_days": total_days,
+            "present_days": present_days,
+            "absent_days": total_days - present_days if total_days > present_days else 0,
+            "total_hours": round(row['total_hours'], 2),
+            "total_wages": round(row['total_wages'], 2)
+        })
+
+    return report
+
+
+def report_etag(report) -> str:
+    body = json.dumps(report, sort_keys=True, separators=(",", ":")).encode()
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
@@ -0,0 +1,229 @@
+"""Incrementally maintained dashboard rollups.
+
+``daily_stats`` holds one document per date (``_id`` is the ISO date) with the
+present, clocked-in and recorded counts and hour/wage sums for that day, plus a single
+``workers`` document carrying the worker headcount. Write endpoints apply
+``$inc`` deltas; ``python rollups.py verify`` recomputes everything from raw
+data to catch drift.
+
+``seed_all_rollups`` fills in every past date that has attendance but no
+complete rollup, so the analytics series can be read from ``daily_stats``
+alone instead of grouping raw attendance.
+"""
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from archive import OPEN_STATUS, PRESENT_STATUS, archived_dates, archived_day, archived_rows
+
+logger = logging.getLogger(__name__)
+
+WORKERS_KEY = "workers"
+# Rollups marked with an older version are recomputed by ``seed_all_rollups``.
+SEEDED_VERSION = 2
+TOLERANCE = 0.005
+
+
+def attendance_contribution(att: Optional[dict]) -> dict:
+    if not att:
+        return {"present_count": 0, "clocked_in_count": 0, "recorded_count": 0, "total_hours": 0.0, "total_wages": 0.0}
+    return {
+        "present_count": 1 if att.get('status') == PRESENT_STATUS else 0,
+        "clocked_in_count": 1 if att.get('status') == OPEN_STATUS else 0,
+        "recorded_count": 1,
+        "total_hours": att.get('hours_worked', 0) or 0.0,
+        "total_wages": att.get('wage_earned', 0) or 0.0,
+    }
+
+
+async def apply_attendance_changes(db, date_str: str, changes, upsert: bool = True):
+    """Apply several ``(old, new)`` attendance transitions as one ``$inc``.
+
+    Pass ``upsert=False`` for past dates: a rollup that was never seeded
+    would otherwise be created holding only this delta.
+    """
+    delta = attendance_contribution(None)
+    for old, new in changes:
+        before = attendance_contribution(old)
+        after = attendance_contribution(new)
+        for k in delta:
+            delta[k] += after[k] - before[k]
+    delta = {k: v for k, v in delta.items() if v}
+    if not delta:
+        return
+    await db.daily_stats.update_one({"_id": date_str}, {"$inc": delta}, upsert=upsert)
+
+
+async def adjust_worker_count(db, delta: int):
+    await db.daily_stats.update_one({"_id": WORKERS_KEY}, {"$inc": {"total_workers": delta}}, upsert=True)
+
+
+async def read_dashboard_rollup(db, date_str: str):
+    """Return (total_workers, day rollup) from a single keyed read."""
+    docs = {}
+    async for doc in db.daily_stats.find({"_id": {"$in": [WORKERS_KEY, date_str]}}):
+        docs[doc['_id']] = doc
+    day = attendance_contribution(None)
+    day.update({k: v for k, v in docs.get(date_str, {}).items() if k != '_id'})
+    return docs.get(WORKERS_KEY, {}).get('total_workers', 0), day
+
+
+async def compute_day(db, date_str: str) -> dict:
+    totals = attendance_contribution(None)
+    rows = {att['id']: att async for att in db.attendance.find(
+        {"date": date_str}, {"_id": 0, "id": 1, "status": 1, "hours_worked": 1, "wage_earned": 1}
+    )}
+    for att in await archived_day(db, date_str):
+        rows.setdefault(att['id'], att)
+    for att in rows.values():
+        for k, v in attendance_contribution(att).items():
+            totals[k] += v
+    return totals
+
+
+async def seed_rollups(db, date_str: str):
+    """Create the headcount and ``date_str`` rollups from raw data if they do not exist yet."""
+    existing = {doc['_id'] async for doc in db.daily_stats.find({"_id": {"$in": [WORKERS_KEY, date_str]}}, {"_id": 1})}
+    if WORKERS_KEY not in existing:
+        total_workers = await db.workers.count_documents({})
+        await db.daily_stats.update_one(
+            {"_id": WORKERS_KEY}, {"$setOnInsert": {"total_workers": total_workers}}, upsert=True
+        )
+    if date_str not in existing:
+        await db.daily_stats.update_one({"_id": date_str}, {"$setOnInsert": await compute_day(db, date_str)}, upsert=True)
+
+
+def day_totals_pipeline(dates: List[str]):
+    return [
+        {"$match": {"date": {"$in": dates}}},
+        {"$group": {
+            "_id": "$date",
+            "total_hours": {"$sum": "$hours_worked"},
+            "total_wages": {"$sum": "$wage_earned"},
+            "present_count": {"$sum": {"$cond": [{"$eq": ["$status", PRESENT_STATUS]}, 1, 0]}},
+            "clocked_in_count": {"$sum": {"$cond": [{"$eq": ["$status", OPEN_STATUS]}, 1, 0]}},
+            "recorded_count": {"$sum": 1},
+        }},
+    ]
+
+
+async def compute_days(db, dates: List[str]) -> Dict[str, dict]:
+    """``compute_day`` for many dates: one server-side ``$group`` plus the archive."""
+    totals = {date_str: attendance_contribution(None) for date_str in dates}
+    try:
+        async for row in db.attendance.aggregate(day_totals_pipeline(dates)):
+            totals[row.pop('_id')].update({k: v or 0 for k, v in row.items()})
+    except (OperationFailure, NotImplementedError) as exc:
+        logger.warning("Daily aggregation unavailable (%s), using fallback scan", exc)
+        async for att in db.attendance.find(
+            {"date": {"$in": dates}}, {"_id": 0, "date": 1, "status": 1, "hours_worked": 1, "wage_earned": 1}
+        ):
+            for k, v in attendance_contribution(att).items():
+                totals[att['date']][k] += v
+    wanted = set(dates)
+    through = (date.fromisoformat(max(dates)) + timedelta(days=1)).isoformat()
+    async for att in archived_rows(db, min(dates), through):
+        if att['date'] in wanted:
+            for k, v in attendance_contribution(att).items():
+                totals[att['date']][k] += v
+    return totals
+
+
+async def seed_all_rollups(db) -> int:
+    """Seed or complete the rollup of every past date with attendance; returns the number written.
+
+    A rollup counts as complete once it is marked ``seeded`` with the
+    current ``SEEDED_VERSION``. Rollups created by a write's ``$inc`` and
+    rollups from before the current fields existed are recomputed with ``$set``, which can lose a back-dated write
+    that lands on the same date meanwhile; ``verify --fix`` repairs that.
+    Today's rollup takes every live clock event, so it is left to
+    ``seed_rollups`` and the writes' own ``$inc``.
+    """
+    today = datetime.now(timezone.utc).date().isoformat()
+    dates = {d for d in await db.attendance.distinct("date") if d < today}
+    dates.update(d for d in await archived_dates(db) if d < today)
+    dates.difference_update([doc['_id'] async for doc in db.daily_stats.find({"seeded": SEEDED_VERSION}, {"_id": 1})])
+    if not dates:
+        return 0
+    totals = await compute_days(db, sorted(dates))
+    await db.daily_stats.bulk_write([
+        UpdateOne({"_id": date_str}, {"$set": {**day, "seeded": SEEDED_VERSION}}, upsert=True)
+        for date_str, day in totals.items()
+    ], ordered=False)
+    logger.info("Seeded %d daily rollup(s)", len(totals))
+    return len(totals)
+
+
+def _differs(stored: dict, expected: dict) -> bool:
+    return any(abs((stored.get(k) or 0) - v) > TOLERANCE for k, v in expected.items())
+
+
+async def verify_rollups(db, dates: Optional[List[str]] = None, fix: bool = False) -> List[str]:
+    """Recompute rollups from raw attendance and report (optionally repair) drift.
+
+    With no ``dates`` every date present in ``attendance`` or ``daily_stats`` is checked.
+    Returns the keys whose stored rollup disagreed with the recomputed one.
+    """
+    if dates is None:
+        dates = set(await db.attendance.distinct("date"))
+        dates.update(await archived_dates(db))
+        dates.update(k for k in await db.daily_stats.distinct("_id") if k != WORKERS_KEY)
+        dates = sorted(dates)
+
+    drifted = []
+    total_workers = await db.workers.count_documents({})
+    stored = await db.daily_stats.find_one({"_id": WORKERS_KEY}) or {}
+    if stored.get('total_workers') != total_workers:
+        drifted.append(WORKERS_KEY)
+        logger.warning("Rollup drift in %s: stored %s, actual %s", WORKERS_KEY, stored.get('total_workers'), total_workers)
+        if fix:
+            await db.daily_stats.update_one({"_id": WORKERS_KEY}, {"$set": {"total_workers": total_workers}}, upsert=True)
+
+    for date_str in dates:
+        expected = await compute_day(db, date_str)
+        stored = await db.daily_stats.find_one({"_id": date_str}) or {}
+        if not _differs(stored, expected):
+            continue
+        drifted.append(date_str)
+        logger.warning("Rollup drift on %s: stored %s, actual %s", date_str, {k: stored.get(k) for k in expected}, expected)
+        if fix:
+            await db.daily_stats.update_one({"_id": date_str}, {"$set": expected}, upsert=True)
+    return drifted
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    cli = typer.Typer(help="Maintain the daily_stats dashboard rollups.")
+
+    def _run(dates: Optional[List[str]], fix: bool):
+        load_dotenv(Path(__file__).parent / '.env')
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        try:
+            return asyncio.run(verify_rollups(client[os.environ['DB_NAME']], dates or None, fix=fix))
+        finally:
+            client.close()
+
+    @cli.command()
+    def verify(dates: Optional[List[str]] = typer.Option(None, "--date", help="Limit to these ISO dates.")):
+        """Report rollups that disagree with raw attendance."""
+        drifted = _run(dates, fix=False)
+        typer.echo(f"{len(drifted)} drifted rollup(s)")
+        raise typer.Exit(1 if drifted else 0)
+
+    @cli.command()
+    def rebuild(dates: Optional[List[str]] = typer.Option(None, "--date", help="Limit to these ISO dates.")):
+        """Recompute rollups from raw attendance and overwrite drifted ones."""
+        drifted = _run(dates, fix=True)
+        typer.echo(f"Rebuilt {len(drifted)} rollup(s)")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cli()
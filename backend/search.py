@@ -0,0 +1,214 @@
+"""In-process worker search over names and badge numbers.
+
+``WorkerIndex`` holds three sorted ``(term, id)`` lists: badge numbers, full
+names and the later words of each name. Terms are case-folded with
+whitespace collapsed. A prefix query is a bisect into each list and a walk
+over the matching run. Those runs are already in term order, so each walk
+stops after ``limit`` hits.
+
+Queries of three or more characters also match anywhere inside a name or
+badge, through a trigram index. The candidates are the intersection of the
+query's trigram postings, checked with a plain substring test. Shorter
+queries only match prefixes.
+
+Results are ranked by how they matched, then by the matched term:
+
+0. exact badge number
+1. badge number prefix
+2. full name prefix (an exact name sorts first)
+3. prefix of a later word in the name
+4. substring of the name or badge number
+
+The index only holds ``id``, ``name`` and ``worker_id``; callers hydrate
+full documents through the worker cache. It is loaded at startup. The
+worker endpoints update it directly after each write. Writes from other
+processes reach it through the worker cache's invalidation bus, as a
+re-read of the invalidated workers.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_PROJECTION = {"_id": 0, "id": 1, "name": 1, "worker_id": 1}
+GRAM = 3
+
+EXACT_BADGE, BADGE_PREFIX, NAME_PREFIX, WORD_PREFIX, SUBSTRING = range(5)
+
+
+def normalize(text: str) -> str:
+    return " ".join(str(text).casefold().split())
+
+
+def trigrams(term: str) -> Set[str]:
+    return {term[i:i + GRAM] for i in range(len(term) - GRAM + 1)}
+
+
+class WorkerIndex:
+    def __init__(self):
+        # id -> (normalized name, normalized badge number, badge number)
+        self._docs: Dict[str, Tuple[str, str, str]] = {}
+        self._by_badge: Dict[str, str] = {}
+        self._badges: List[Tuple[str, str]] = []
+        self._names: List[Tuple[str, str]] = []
+        self._words: List[Tuple[str, str]] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._refreshes: Set[asyncio.Task] = set()
+        self.queries = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    @staticmethod
+    def _terms(name: str, badge: str):
+        yield "_badges", badge
+        yield "_names", name
+        for word in set(name.split()[1:]):
+            yield "_words", word
+
+    def _index_grams(self, worker_id: str, name: str, badge: str):
+        for gram in trigrams(name) | trigrams(badge):
+            self._grams.setdefault(gram, set()).add(worker_id)
+
+    async def load(self, db):
+        """Rebuild the index from every worker document."""
+        started = time.perf_counter()
+        docs, by_badge = {}, {}
+        lists = {"_badges": [], "_names": [], "_words": []}
+        postings = defaultdict(list)
+        # Names repeat a lot more than badge numbers; split them once each.
+        name_grams = {}
+        async for doc in db.workers.find({}, INDEX_PROJECTION):
+            worker_id = doc['id']
+            name, badge = normalize(doc['name']), normalize(doc['worker_id'])
+            docs[worker_id] = (name, badge, doc['worker_id'])
+            by_badge[doc['worker_id']] = worker_id
+            for attr, term in self._terms(name, badge):
+                lists[attr].append((term, worker_id))
+            grams = name_grams.get(name)
+            if grams is None:
+                grams = name_grams[name] = trigrams(name)
+            for gram in grams.union(trigrams(badge)):
+                postings[gram].append(worker_id)
+        for terms in lists.values():
+            terms.sort()
+        self._docs, self._by_badge = docs, by_badge
+        self._badges, self._names, self._words = lists["_badges"], lists["_names"], lists["_words"]
+        self._grams = {gram: set(ids) for gram, ids in postings.items()}
+        logger.info("Indexed %d worker(s) for search in %.3fs", len(docs), time.perf_counter() - started)
+
+    def add(self, doc: dict):
+        """Index ``doc``, replacing any previous version of it."""
+        self.remove(doc['id'])
+        name, badge = normalize(doc['name']), normalize(doc['worker_id'])
+        self._docs[doc['id']] = (name, badge, doc['worker_id'])
+        self._by_badge[doc['worker_id']] = doc['id']
+        for attr, term in self._terms(name, badge):
+            insort(getattr(self, attr), (term, doc['id']))
+        self._index_grams(doc['id'], name, badge)
+
+    def remove(self, worker_id: str):
+        entry = self._docs.pop(worker_id, None)
+        if entry is None:
+            return
+        name, badge, number = entry
+        if self._by_badge.get(number) == worker_id:
+            del self._by_badge[number]
+        for attr, term in self._terms(name, badge):
+            terms = getattr(self, attr)
+            i = bisect_left(terms, (term, worker_id))
+            if i < len(terms) and terms[i] == (term, worker_id):
+                del terms[i]
+        for gram in trigrams(name) | trigrams(badge):
+            postings = self._grams.get(gram)
+            if postings is not None:
+                postings.discard(worker_id)
+                if not postings:
+                    del self._grams[gram]
+
+    async def refresh(self, db, keys: Iterable[str]):
+        """Re-read the workers behind invalidated ``keys`` (ids or badge numbers)."""
+        keys = list(keys)
+        found = set()
+        async for doc in db.workers.find(
+            {"$or": [{"id": {"$in": keys}}, {"worker_id": {"$in": keys}}]}, INDEX_PROJECTION
+        ):
+            self.add(doc)
+            found.add(doc['id'])
+        for key in keys:
+            worker_id = key if key in self._docs else self._by_badge.get(key)
+            if worker_id and worker_id not in found:
+                self.remove(worker_id)
+
+    def schedule_refresh(self, db, keys: Iterable[str]):
+        task = asyncio.ensure_future(self.refresh(db, list(keys)))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    def _prefix_run(self, terms: List[Tuple[str, str]], query: str):
+        i = bisect_left(terms, (query, ""))
+        while i < len(terms) and terms[i][0].startswith(query):
+            yield terms[i]
+            i += 1
+
+    def _substring_matches(self, query: str, candidates: Set[str], ranked: dict, wanted: int):
+        def matches(worker_id):
+            name, badge, _ = self._docs[worker_id]
+            return worker_id not in ranked and (query in name or query in badge)
+
+        # Dense candidates: walk the names in order until enough match, which
+        # takes about wanted * workers / candidates steps. Sparse ones: check
+        # them all and keep the smallest.
+        if len(candidates) ** 2 > wanted * len(self._docs):
+            found = []
+            for name, worker_id in self._names:
+                if worker_id in candidates and matches(worker_id):
+                    found.append((SUBSTRING, name, worker_id))
+                    if len(found) >= wanted:
+                        break
+            return found
+        return heapq.nsmallest(wanted, (
+            (SUBSTRING, self._docs[worker_id][0], worker_id) for worker_id in candidates if matches(worker_id)
+        ))
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """Ids of the best ``limit`` matches for ``query``, best first."""
+        self.queries += 1
+        query = normalize(query)
+        if not query:
+            return []
+
+        ranked: Dict[str, tuple] = {}
+        for rank, terms in ((BADGE_PREFIX, self._badges), (NAME_PREFIX, self._names), (WORD_PREFIX, self._words)):
+            hits = 0
+            for term, worker_id in self._prefix_run(terms, query):
+                if worker_id in ranked:
+                    continue
+                if rank == BADGE_PREFIX and term == query:
+                    ranked[worker_id] = (EXACT_BADGE, term, worker_id)
+                else:
+                    ranked[worker_id] = (rank, term, worker_id)
+                hits += 1
+                if hits >= limit:
+                    break
+
+        if len(ranked) < limit and len(query) >= GRAM:
+            postings = sorted((self._grams.get(g, set()) for g in trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings and postings[0] else set()
+            for key in self._substring_matches(query, candidates, ranked, limit - len(ranked)):
+                ranked[key[2]] = key
+
+        return [key[2] for key in sorted(ranked.values())[:limit]]
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._docs),
+            "terms": len(self._badges) + len(self._names) + len(self._words),
+            "trigrams": len(self._grams),
+            "queries": self.queries,
+        }
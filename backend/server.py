@@ -1,32 +1,141 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Path as PathParam, Query, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import json
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import List, Literal, Optional
 import uuid
-from datetime import datetime, timezone, date, time
+from datetime import datetime, timezone, date, time, timedelta
+
+from analytics import TimeSeriesStore, bucket_count
+from archive import Compactor, archived_day, may_hold, thaw, worker_history
+from metrics import (
+    RequestProfile, TimedRoute, command_profiler, current_profile, log_slow_request, registry,
+    render_gauges, server_timing,
+)
+from clock import clock_in, clock_out
+from codec import encode_document, to_datetime
+from compression import CompressionMiddleware
+from database import create_client, ping, warm_up, warmup_connections
+from exports import EXPORT_FORMATS, ExportJobs, stream_export
+from events import EventBroker, MongoEventBroker
+from cache import InMemoryInvalidationBus, MongoInvalidationBus, WorkerCache
+from httpcache import WORKERS, ResponseCache, VersionClock, cache_control, date_scope, etag_matches, increment
+from pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, RowsResponse, list_page, merged_page, wants_ndjson
+from reports import build_monthly_report, mark_months_dirty, report_etag
+from indexes import ensure_indexes, verify_query_plans
+from rates import RateSchedule, backfill_rate_history, initial_history, rate_on, reprice, set_rate
+from lifecycle import InFlightMiddleware, Lifecycle
+from rollups import adjust_worker_count, apply_attendance_changes, read_dashboard_rollup, seed_rollups
+from search import WorkerIndex
+from writebehind import WriteBehindQueue
+from sync import CHANGED_AT_FIELD, backfill, changes_since, next_stamp, parse_token, record_deletions, stamps, touch
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = create_client(mongo_url, event_listeners=[command_profiler])
 db = client[os.environ['DB_NAME']]
 
-app = FastAPI()
-api_router = APIRouter(prefix="/api")
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+if os.environ.get('WORKER_CACHE_BUS', 'memory') == 'mongo':
+    cache_bus = MongoInvalidationBus(db)
+else:
+    cache_bus = InMemoryInvalidationBus()
+worker_cache = WorkerCache(
+    max_size=int(os.environ.get('WORKER_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('WORKER_CACHE_TTL', '60')),
+    bus=cache_bus,
+)
+worker_index = WorkerIndex()
+worker_cache.listeners.append(lambda keys: worker_index.schedule_refresh(db, keys))
+MAX_SEARCH_RESULTS = 100
+
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '256'))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get('EVENT_HEARTBEAT_SECONDS', '15'))
+if os.environ.get('EVENT_BROKER', 'memory') == 'mongo':
+    event_broker = MongoEventBroker(db, queue_size=EVENT_QUEUE_SIZE)
+else:
+    event_broker = EventBroker(queue_size=EVENT_QUEUE_SIZE)
+export_jobs = ExportJobs(ttl=float(os.environ.get('EXPORT_TTL_SECONDS', '86400')))
+timeseries_store = TimeSeriesStore(
+    ttl=float(os.environ.get('ANALYTICS_TTL', '300')),
+    max_workers=int(os.environ.get('ANALYTICS_MAX_WORKER_SERIES', '1000')),
+)
+
+lifecycle = Lifecycle()
+lifecycle.close_streams_with(lambda: event_broker.disconnect())
+SHUTDOWN_GRACE_SECONDS = float(os.environ.get('SHUTDOWN_GRACE_SECONDS', '20'))
+READY_PING_TIMEOUT = float(os.environ.get('READY_PING_TIMEOUT', '2'))
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '2'))
+SYNC_TOMBSTONE_RETENTION = timedelta(days=float(os.environ.get('SYNC_TOMBSTONE_DAYS', '30')))
+
+if os.environ.get('ATTENDANCE_WRITE_MODE', 'direct') == 'group_commit':
+    attendance_writer = WriteBehindQueue(
+        Path(os.environ.get('ATTENDANCE_JOURNAL_DIR') or ROOT_DIR / 'journal'),
+        max_batch=int(os.environ.get('GROUP_COMMIT_MAX_BATCH', '500')),
+        window=float(os.environ.get('GROUP_COMMIT_WINDOW_MS', '5')) / 1000,
+        queue_size=int(os.environ.get('GROUP_COMMIT_QUEUE_SIZE', '10000')),
+        fsync=os.environ.get('GROUP_COMMIT_FSYNC', 'on') != 'off',
+    )
+else:
+    attendance_writer = None
+# Ids of journaled rows not yet committed, by (date, worker id).
+queued_attendance_ids = {}
+
+if os.environ.get('HTTP_CACHE_BUS', 'memory') == 'mongo':
+    version_bus = MongoInvalidationBus(db, "version_changes")
+else:
+    version_bus = InMemoryInvalidationBus()
+version_clock = VersionClock(ttl=float(os.environ.get('VERSION_TTL', '60')), bus=version_bus)
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', '1000')),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MB', '64')) << 20,
+)
+HISTORY_MAX_AGE = int(os.environ.get('HTTP_HISTORY_MAX_AGE', '0'))
+
+archive_compactor = Compactor(
+    keep_months=int(os.environ.get('ARCHIVE_AFTER_MONTHS', '3')),
+    interval=float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600')),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_services()
+    try:
+        yield
+    finally:
+        await stop_services()
+
+app = FastAPI(lifespan=lifespan)
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
 
 # Models
+class WageRate(BaseModel):
+    effective_from: str
+    daily_wage_rate: float
+
 class Worker(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     worker_id: str
     daily_wage_rate: float
+    rate_history: List[WageRate] = Field(default_factory=list)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class WorkerCreate(BaseModel):
@@ -38,6 +147,7 @@ class WorkerUpdate(BaseModel):
     name: Optional[str] = None
     worker_id: Optional[str] = None
     daily_wage_rate: Optional[float] = None
+    effective_from: Optional[str] = None
 
 class Attendance(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -57,6 +167,10 @@ class AttendanceCreate(BaseModel):
     clock_in: Optional[str] = None
     clock_out: Optional[str] = None
 
+class ClockEvent(BaseModel):
+    worker_id: str
+    at: Optional[datetime] = None
+
 class DashboardStats(BaseModel):
     total_workers: int
     present_today: int
@@ -64,68 +178,216 @@ class DashboardStats(BaseModel):
     total_hours_today: float
     total_wages_today: float
 
+# Worker cache
+async def find_worker(worker_id: str) -> Optional[dict]:
+    worker = worker_cache.get(worker_id)
+    if worker is None:
+        generation = worker_cache.generation
+        worker = await db.workers.find_one({"id": worker_id}, {"_id": 0})
+        if worker:
+            worker_cache.put(worker, generation)
+    return worker
+
+async def find_worker_by_number(number: str) -> Optional[dict]:
+    worker = worker_cache.get_by_worker_id(number)
+    if worker is None:
+        generation = worker_cache.generation
+        worker = await db.workers.find_one({"worker_id": number}, {"_id": 0})
+        if worker:
+            worker_cache.put(worker, generation)
+    return worker
+
+async def find_workers(worker_ids: List[str]) -> dict:
+    workers = {}
+    missing = []
+    for worker_id in worker_ids:
+        worker = worker_cache.get(worker_id)
+        if worker is None:
+            missing.append(worker_id)
+        else:
+            workers[worker_id] = worker
+    if missing:
+        generation = worker_cache.generation
+        async for worker in db.workers.find({"id": {"$in": missing}}, {"_id": 0}):
+            worker_cache.put(worker, generation)
+            workers[worker['id']] = worker
+    return workers
+
+# Attendance changes
+async def record_attendance_changes(date_str: str, changes, upsert: bool = True):
+    """Move the dashboard rollup and the analytics series by ``(old, new)`` transitions."""
+    await apply_attendance_changes(db, date_str, changes, upsert=upsert)
+    timeseries_store.apply_changes(date_str, changes)
+    if changes:
+        await version_clock.bump(db, [date_scope(date_str)])
+
+# Conditional reads
+async def versioned(request: Request, scopes: List[str], render, max_age: int = 0) -> Response:
+    """Answer a read of ``scopes`` with a 304, a cached body or a fresh ``render()``."""
+    ndjson = wants_ndjson(request)
+    versions = await version_clock.get(db, scopes)
+    etag = version_clock.etag(scopes, versions, "ndjson" if ndjson else "json")
+    headers = {"ETag": etag, "Cache-Control": cache_control(max_age)}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if ndjson:
+        # Streamed straight off the cursor, so there is no body to keep.
+        response = await render()
+        response.headers.update(headers)
+        return response
+    body, cached_headers = await response_cache.fetch((request.url.path, request.url.query, etag), render)
+    return Response(body, headers={**cached_headers, **headers})
+
+# Live events
+async def publish_events(*events, stats: bool = True):
+    """Publish change events, followed by the refreshed dashboard stats."""
+    if not event_broker.has_audience:
+        return
+    for event in events:
+        await event_broker.publish(event)
+    if stats:
+        await event_broker.publish({"type": "stats", "stats": await compute_dashboard_stats()})
+
 # Worker Endpoints
 @api_router.post("/workers", response_model=Worker)
 async def create_worker(worker: WorkerCreate):
-    existing = await db.workers.find_one({"worker_id": worker.worker_id}, {"_id": 0})
-    if existing:
+    if await find_worker_by_number(worker.worker_id):
         raise HTTPException(status_code=400, detail="Worker ID already exists")
     
     worker_obj = Worker(**worker.model_dump())
-    doc = worker_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.workers.insert_one(doc)
+    worker_obj.rate_history = [
+        WageRate(effective_from=worker_obj.created_at.date().isoformat(), daily_wage_rate=worker_obj.daily_wage_rate)
+    ]
+    doc = encode_document("workers", worker_obj.model_dump())
+    doc.update(next_stamp())
+    try:
+        await db.workers.insert_one(doc)
+    except DuplicateKeyError:
+        # A concurrent create took the number after the check above.
+        raise HTTPException(status_code=400, detail="Worker ID already exists")
+    worker_index.add(doc)
+    await worker_cache.invalidate([doc['id'], doc['worker_id']])
+    await adjust_worker_count(db, 1)
+    await version_clock.bump(db, [WORKERS])
+    await publish_events({"type": "worker", "worker": worker_obj})
     return worker_obj
 
+WORKER_SORT = [("id", 1)]
+DATE_ATTENDANCE_SORT = [("date", 1), ("id", 1)]
+WORKER_ATTENDANCE_SORT = [("date", -1), ("id", -1)]
+
 @api_router.get("/workers", response_model=List[Worker])
-async def get_workers():
-    workers = await db.workers.find({}, {"_id": 0}).to_list(1000)
-    for worker in workers:
-        if isinstance(worker.get('created_at'), str):
-            worker['created_at'] = datetime.fromisoformat(worker['created_at'])
-    return workers
+async def get_workers(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    return await versioned(
+        request, [WORKERS], lambda: list_page(db.workers, {}, WORKER_SORT, Worker, request, limit, after)
+    )
+
+@api_router.get("/workers/search", response_model=List[Worker])
+async def search_workers(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS)
+):
+    worker_ids = worker_index.search(q, limit)
+    workers = await find_workers(worker_ids)
+    return [workers[worker_id] for worker_id in worker_ids if worker_id in workers]
 
 @api_router.get("/workers/{worker_id}", response_model=Worker)
 async def get_worker(worker_id: str):
-    worker = await db.workers.find_one({"id": worker_id}, {"_id": 0})
+    worker = await find_worker(worker_id)
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found")
-    if isinstance(worker.get('created_at'), str):
-        worker['created_at'] = datetime.fromisoformat(worker['created_at'])
     return worker
 
+def parse_effective_from(value: Optional[str]) -> str:
+    if value is None:
+        return datetime.now(timezone.utc).date().isoformat()
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="effective_from must be a YYYY-MM-DD date")
+
+async def change_rate(worker: dict, effective_from: str, rate: float):
+    """Record a rate and re-price the attendance it governs; returns (worker, rows re-priced)."""
+    updated = await set_rate(db, worker, effective_from, rate)
+    await touch(db, "workers", {"id": worker['id']})
+    await worker_cache.invalidate([worker['id'], worker['worker_id']])
+    await version_clock.bump(db, [WORKERS])
+    start, end = RateSchedule.for_worker(updated).period(effective_from)
+    thawed = await thaw(db, worker['id'], start, end)
+    changes = await reprice(db, updated, start, end)
+    for date_str, date_changes in changes.items():
+        await record_attendance_changes(date_str, date_changes, upsert=False)
+    await mark_months_dirty(db, list(changes) + thawed)
+    return updated, sum(len(c) for c in changes.values())
+
 @api_router.put("/workers/{worker_id}", response_model=Worker)
 async def update_worker(worker_id: str, worker_update: WorkerUpdate):
-    worker = await db.workers.find_one({"id": worker_id}, {"_id": 0})
+    worker = await find_worker(worker_id)
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found")
     
     update_data = {k: v for k, v in worker_update.model_dump().items() if v is not None}
+    rate = update_data.pop('daily_wage_rate', None)
+    effective_from = parse_effective_from(update_data.pop('effective_from', None))
+    if update_data.get('worker_id', worker['worker_id']) != worker['worker_id']:
+        if await find_worker_by_number(update_data['worker_id']):
+            raise HTTPException(status_code=400, detail="Worker ID already exists")
     if update_data:
-        await db.workers.update_one({"id": worker_id}, {"$set": update_data})
+        try:
+            await db.workers.update_one({"id": worker_id}, {"$set": {**update_data, **next_stamp()}})
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Worker ID already exists")
+        await worker_cache.invalidate([worker_id, worker['worker_id']])
+        await version_clock.bump(db, [WORKERS])
+    # The frontend PUTs the whole form, so an unchanged rate is not a rate change.
+    if rate is not None and rate == rate_on(worker, effective_from):
+        rate = None
+    if rate is not None:
+        await change_rate(worker, effective_from, rate)
     
     updated_worker = await db.workers.find_one({"id": worker_id}, {"_id": 0})
-    if isinstance(updated_worker.get('created_at'), str):
-        updated_worker['created_at'] = datetime.fromisoformat(updated_worker['created_at'])
+    if update_data:
+        worker_index.add(updated_worker)
+    if update_data or rate is not None:
+        await publish_events({"type": "worker", "worker": Worker(**updated_worker)}, stats=rate is not None)
     return updated_worker
 
+@api_router.get("/workers/{worker_id}/rates", response_model=List[WageRate])
+async def get_worker_rates(worker_id: str):
+    worker = await find_worker(worker_id)
+    if not worker:
+        raise HTTPException(status_code=404, detail="Worker not found")
+    return worker.get('rate_history') or initial_history(worker)
+
+@api_router.post("/workers/{worker_id}/rates")
+async def set_worker_rate(worker_id: str, rate: WageRate):
+    worker = await find_worker(worker_id)
+    if not worker:
+        raise HTTPException(status_code=404, detail="Worker not found")
+    
+    updated, repriced = await change_rate(worker, parse_effective_from(rate.effective_from), rate.daily_wage_rate)
+    await publish_events({"type": "worker", "worker": Worker(**updated)})
+    return {"worker": Worker(**updated), "repriced": repriced}
+
 @api_router.delete("/workers/{worker_id}")
 async def delete_worker(worker_id: str):
     result = await db.workers.delete_one({"id": worker_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Worker not found")
+    await record_deletions(db, "workers", [worker_id], SYNC_TOMBSTONE_RETENTION)
+    worker_index.remove(worker_id)
+    await worker_cache.invalidate([worker_id])
+    await adjust_worker_count(db, -1)
+    await version_clock.bump(db, [WORKERS])
+    await publish_events({"type": "worker_removed", "id": worker_id})
     return {"message": "Worker deleted successfully"}
 
 # Attendance Endpoints
-@api_router.post("/attendance", response_model=Attendance)
-async def mark_attendance(attendance: AttendanceCreate):
-    worker = await db.workers.find_one({"id": attendance.worker_id}, {"_id": 0})
-    if not worker:
-        raise HTTPException(status_code=404, detail="Worker not found")
-    
-    today = datetime.now(timezone.utc).date().isoformat()
-    existing = await db.attendance.find_one({"worker_id": attendance.worker_id, "date": today}, {"_id": 0})
-    
+def build_attendance(worker: dict, attendance: AttendanceCreate, today: str) -> Attendance:
     hours_worked = 0.0
     wage_earned = 0.0
     status = "absent"
@@ -134,12 +396,12 @@ async def mark_attendance(attendance: AttendanceCreate):
         clock_in_time = datetime.fromisoformat(attendance.clock_in)
         clock_out_time = datetime.fromisoformat(attendance.clock_out)
         hours_worked = (clock_out_time - clock_in_time).total_seconds() / 3600
-        wage_earned = hours_worked * worker['daily_wage_rate']
+        wage_earned = hours_worked * rate_on(worker, today)
         status = "present"
     elif attendance.clock_in:
         status = "clocked_in"
     
-    attendance_obj = Attendance(
+    return Attendance(
         worker_id=attendance.worker_id,
         worker_name=worker['name'],
         date=today,
@@ -149,120 +411,532 @@ async def mark_attendance(attendance: AttendanceCreate):
         wage_earned=round(wage_earned, 2),
         status=status
     )
+
+@api_router.post("/attendance", response_model=Attendance)
+async def mark_attendance(attendance: AttendanceCreate):
+    worker = await find_worker(attendance.worker_id)
+    if not worker:
+        raise HTTPException(status_code=404, detail="Worker not found")
     
-    doc = attendance_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    today = datetime.now(timezone.utc).date().isoformat()
+    attendance_obj = build_attendance(worker, attendance, today)
+    if attendance_writer:
+        # The commit keeps the stored row's id, so answer with that one.
+        key = (today, attendance.worker_id)
+        stored_id = queued_attendance_ids.get(key)
+        if stored_id is None:
+            stored = await db.attendance.find_one({"worker_id": attendance.worker_id, "date": today}, {"_id": 0, "id": 1})
+            stored_id = stored and stored['id']
+        if stored_id:
+            attendance_obj.id = stored_id
+        queued_attendance_ids[key] = attendance_obj.id
+        await attendance_writer.submit(today, attendance_obj.model_dump(mode="json"))
+        return attendance_obj
+    doc = encode_document("attendance", attendance_obj.model_dump())
+    doc.update(next_stamp())
     
-    if existing:
-        await db.attendance.update_one(
-            {"worker_id": attendance.worker_id, "date": today},
-            {"$set": doc}
+    # One upsert rather than find-then-insert, so concurrent first marks
+    # land on a single row. Clients apply synced rows by ``id``, so a
+    # re-mark keeps the stored row's.
+    query = {"worker_id": attendance.worker_id, "date": today}
+    update = {"$set": {k: v for k, v in doc.items() if k != 'id'}, "$setOnInsert": {"id": doc['id']}}
+    try:
+        existing = await db.attendance.find_one_and_update(
+            query, update, {"_id": 0}, upsert=True, return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # Lost the insert race; the row exists now, so this is an update.
+        existing = await db.attendance.find_one_and_update(
+            query, update, {"_id": 0}, return_document=ReturnDocument.BEFORE
         )
-    else:
-        await db.attendance.insert_one(doc)
+    if existing:
+        attendance_obj.id = doc['id'] = existing['id']
+    await record_attendance_changes(today, [(existing, doc)])
+    await mark_months_dirty(db, [today])
+    await publish_events({"type": "attendance", "attendance": [attendance_obj]})
     
     return attendance_obj
 
+def clock_time(event: ClockEvent) -> datetime:
+    return to_datetime(event.at) if event.at else datetime.now(timezone.utc)
+
+@api_router.post("/attendance/clock-in", response_model=Attendance)
+async def clock_in_worker(event: ClockEvent, idempotency_key: Optional[str] = Header(None)):
+    worker = await find_worker(event.worker_id)
+    if not worker:
+        raise HTTPException(status_code=404, detail="Worker not found")
+    
+    row, previous, replayed = await clock_in(db, worker, clock_time(event), idempotency_key, str(uuid.uuid4()))
+    if not replayed:
+        await record_attendance_changes(row['date'], [(previous, row)])
+        await mark_months_dirty(db, [row['date']])
+        await publish_events({"type": "attendance", "attendance": [Attendance(**row)]})
+    return row
+
+@api_router.post("/attendance/clock-out", response_model=Attendance)
+async def clock_out_worker(event: ClockEvent, idempotency_key: Optional[str] = Header(None)):
+    worker = await find_worker(event.worker_id)
+    if not worker:
+        raise HTTPException(status_code=404, detail="Worker not found")
+    
+    row, replayed = await clock_out(db, worker, clock_time(event), idempotency_key)
+    if not replayed:
+        await record_attendance_changes(row['date'], [({"status": "clocked_in", "worker_id": row['worker_id']}, row)])
+        await mark_months_dirty(db, [row['date']])
+        await publish_events({"type": "attendance", "attendance": [Attendance(**row)]})
+    return row
+
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '1000'))
+DUPLICATE_KEY = 11000
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+async def iter_bulk_events(request: Request):
+    """Yield raw clock events from a JSON array body or a streamed NDJSON body."""
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    if content_type not in NDJSON_TYPES:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of attendance events")
+        for event in body:
+            yield event
+        return
+    
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+def parse_bulk_event(raw) -> AttendanceCreate:
+    if isinstance(raw, bytes):
+        raw = json.loads(raw)
+    return AttendanceCreate.model_validate(raw)
+
+async def write_attendance_batch(batch, results, today: str):
+    """Resolve, price and upsert one batch of (index, AttendanceCreate) events."""
+    worker_ids = list({event.worker_id for _, event in batch})
+    workers = await find_workers(worker_ids)
+    
+    # Later events for the same worker win, as they would with sequential POSTs.
+    latest = {}
+    for index, event in batch:
+        worker = workers.get(event.worker_id)
+        if not worker:
+            results[index] = {"index": index, "worker_id": event.worker_id, "ok": False, "error": "Worker not found"}
+            continue
+        try:
+            attendance_obj = build_attendance(worker, event, today)
+        except (ValueError, TypeError) as exc:
+            # Unparseable timestamps, or naive and aware ones mixed.
+            results[index] = {"index": index, "worker_id": event.worker_id, "ok": False, "error": str(exc)}
+            continue
+        if event.worker_id in latest:
+            superseded = latest[event.worker_id][0]
+            results[superseded] = {"index": superseded, "worker_id": event.worker_id, "ok": True, "superseded": True}
+        latest[event.worker_id] = (index, attendance_obj)
+    
+    if latest:
+        await upsert_attendance(latest, results, today)
+
+async def commit_attendance_rows(rows, replayed: bool = False):
+    """Group-commit callback: upsert journaled ``(n, date, row)`` rows, a bulk write per date.
+
+    Replayed rows are only written over rows last changed before they were
+    acknowledged, since live processes kept writing after their own died.
+    """
+    by_date = {}
+    for n, date_str, row in rows:
+        by_date.setdefault(date_str, {})[row['worker_id']] = (n, Attendance(**row))
+    for date_str, latest in by_date.items():
+        results = {}
+        submitted = {worker_id: attendance_obj.id for worker_id, (_, attendance_obj) in latest.items()}
+        await upsert_attendance(latest, results, date_str, only_older=replayed)
+        for worker_id, row_id in submitted.items():
+            # Stored now, so later marks can read the id back.
+            if queued_attendance_ids.get((date_str, worker_id)) == row_id:
+                del queued_attendance_ids[(date_str, worker_id)]
+        for result in results.values():
+            if result.get('superseded'):
+                logger.info("Replayed attendance for worker %s is older than the stored row", result['worker_id'])
+            elif not result['ok']:
+                logger.error("Group commit dropped attendance for worker %s: %s", result['worker_id'], result['error'])
+
+async def upsert_attendance(latest: dict, results: dict, today: str, only_older: bool = False):
+    """Upsert ``{worker_id: (index, Attendance)}`` rows for ``today`` in one bulk write.
+
+    With ``only_older``, a stored row changed after an incoming row's
+    ``created_at`` is kept, and the incoming row is reported superseded.
+    """
+    existing = {
+        a['worker_id']: a
+        async for a in db.attendance.find({"worker_id": {"$in": list(latest)}, "date": today}, {"_id": 0})
+    }
+    docs = {}
+    operations = []
+    operation_workers = list(latest)
+    for (worker_id, (index, attendance_obj)), change_stamp in zip(latest.items(), stamps(len(latest))):
+        if worker_id in existing:
+            attendance_obj.id = existing[worker_id]['id']
+        doc = encode_document("attendance", {**attendance_obj.model_dump(), **change_stamp})
+        docs[worker_id] = doc
+        # ``id`` only goes on a new row: replicas apply rows by it.
+        fields = {k: v for k, v in doc.items() if k != 'id'}
+        match = {"worker_id": worker_id, "date": today}
+        if only_older:
+            # A newer stored row fails the match, and the upsert's insert then
+            # hits the unique worker_id_date index instead of overwriting it.
+            match["$or"] = [
+                {CHANGED_AT_FIELD: {"$lt": attendance_obj.created_at}}, {CHANGED_AT_FIELD: {"$exists": False}}
+            ]
+        operations.append(UpdateOne(match, {"$set": fields, "$setOnInsert": {"id": doc['id']}}, upsert=True))
+    
+    failed = {}
+    superseded = set()
+    try:
+        await db.attendance.bulk_write(operations, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get('writeErrors', []):
+            if only_older and error.get('code') == DUPLICATE_KEY:
+                superseded.add(operation_workers[error['index']])
+            else:
+                failed[operation_workers[error['index']]] = error.get('errmsg', 'Write failed')
+    
+    changes = []
+    for worker_id, (index, attendance_obj) in latest.items():
+        if worker_id in superseded:
+            results[index] = {"index": index, "worker_id": worker_id, "ok": True, "superseded": True}
+            continue
+        if worker_id in failed:
+            results[index] = {"index": index, "worker_id": worker_id, "ok": False, "error": failed[worker_id]}
+            continue
+        changes.append((existing.get(worker_id), docs[worker_id]))
+        results[index] = {
+            "index": index, "worker_id": worker_id, "ok": True,
+            "attendance": attendance_obj.model_dump(mode="json")
+        }
+    await record_attendance_changes(today, changes)
+    await mark_months_dirty(db, [today])
+    await publish_events({"type": "attendance", "attendance": [
+        attendance_obj for worker_id, (_, attendance_obj) in latest.items()
+        if worker_id not in failed and worker_id not in superseded
+    ]})
+
+@api_router.post("/attendance/bulk")
+async def mark_attendance_bulk(request: Request):
+    today = datetime.now(timezone.utc).date().isoformat()
+    results = {}
+    batch = []
+    index = 0
+    
+    async for raw in iter_bulk_events(request):
+        try:
+            batch.append((index, parse_bulk_event(raw)))
+        except (ValueError, ValidationError) as exc:
+            results[index] = {"index": index, "ok": False, "error": str(exc)}
+        index += 1
+        if len(batch) >= BULK_BATCH_SIZE:
+            await write_attendance_batch(batch, results, today)
+            batch = []
+    if batch:
+        await write_attendance_batch(batch, results, today)
+    
+    ordered = [results[i] for i in range(index)]
+    succeeded = sum(1 for r in ordered if r['ok'])
+    return {"processed": index, "succeeded": succeeded, "failed": index - succeeded, "results": ordered}
+
 @api_router.get("/attendance/today", response_model=List[Attendance])
-async def get_today_attendance():
+async def get_today_attendance(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
     today = datetime.now(timezone.utc).date().isoformat()
-    attendance = await db.attendance.find({"date": today}, {"_id": 0}).to_list(1000)
-    for att in attendance:
-        if isinstance(att.get('created_at'), str):
-            att['created_at'] = datetime.fromisoformat(att['created_at'])
-    return attendance
+    return await get_attendance_by_date(today, request, limit, after)
 
 @api_router.get("/attendance/date/{date_str}", response_model=List[Attendance])
-async def get_attendance_by_date(date_str: str):
-    attendance = await db.attendance.find({"date": date_str}, {"_id": 0}).to_list(1000)
-    for att in attendance:
-        if isinstance(att.get('created_at'), str):
-            att['created_at'] = datetime.fromisoformat(att['created_at'])
-    return attendance
+async def get_attendance_by_date(
+    date_str: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    async def render():
+        if may_hold(date_str):
+            return await merged_page(
+                db.attendance, {"date": date_str}, await archived_day(db, date_str),
+                DATE_ATTENDANCE_SORT, Attendance, request, limit, after
+            )
+        return await list_page(db.attendance, {"date": date_str}, DATE_ATTENDANCE_SORT, Attendance, request, limit, after)
+    
+    today = datetime.now(timezone.utc).date().isoformat()
+    return await versioned(request, [date_scope(date_str)], render, HISTORY_MAX_AGE if date_str < today else 0)
 
 @api_router.get("/attendance/monthly/{year}/{month}")
-async def get_monthly_report(year: int, month: int):
-    workers = await db.workers.find({}, {"_id": 0}).to_list(1000)
-    report = []
-    
-    for worker in workers:
-        start_date = f"{year}-{month:02d}-01"
-        if month == 12:
-            end_date = f"{year+1}-01-01"
-        else:
-            end_date = f"{year}-{month+1:02d}-01"
-        
-        attendance = await db.attendance.find({
-            "worker_id": worker['id'],
-            "date": {"$gte": start_date, "$lt": end_date}
-        }, {"_id": 0}).to_list(1000)
-        
-        total_days = len(attendance)
-        present_days = len([a for a in attendance if a['status'] == 'present'])
-        total_hours = sum(a.get('hours_worked', 0) for a in attendance)
-        total_wages = sum(a.get('wage_earned', 0) for a in attendance)
-        
-        report.append({
-            "worker_id": worker['id'],
-            "worker_name": worker['name'],
-            "worker_number": worker['worker_id'],
-            "daily_wage_rate": worker['daily_wage_rate'],
-            "total_days": total_days,
-            "present_days": present_days,
-            "absent_days": total_days - present_days if total_days > present_days else 0,
-            "total_hours": round(total_hours, 2),
-            "total_wages": round(total_wages, 2)
-        })
-    
+async def get_monthly_report(
+    request: Request,
+    response: Response,
+    # Four-digit years, so the month and the one after it are ISO dates.
+    year: int = PathParam(..., ge=1000, le=9998),
+    month: int = PathParam(..., ge=1, le=12)
+):
+    report = await build_monthly_report(db, year, month)
+    etag = report_etag(report)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return report
 
 @api_router.get("/attendance/worker/{worker_id}", response_model=List[Attendance])
-async def get_worker_attendance(worker_id: str):
-    attendance = await db.attendance.find({"worker_id": worker_id}, {"_id": 0}).sort("date", -1).to_list(1000)
-    for att in attendance:
-        if isinstance(att.get('created_at'), str):
-            att['created_at'] = datetime.fromisoformat(att['created_at'])
-    return attendance
+async def get_worker_attendance(
+    worker_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    # One row per worker per date, so one archived row past ``limit`` covers
+    # the one that may share the cursor's date.
+    archived = worker_history(db, worker_id, after.split("|")[0] if after else None, limit and limit + 1)
+    return await merged_page(
+        db.attendance, {"worker_id": worker_id}, archived, WORKER_ATTENDANCE_SORT, Attendance, request, limit, after
+    )
 
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats():
-    total_workers = await db.workers.count_documents({})
-    today = datetime.now(timezone.utc).date().isoformat()
-    today_attendance = await db.attendance.find({"date": today}, {"_id": 0}).to_list(1000)
+async def get_dashboard_stats(request: Request):
+    async def render():
+        return RowsResponse((await compute_dashboard_stats()).model_dump())
     
-    present_today = len([a for a in today_attendance if a['status'] in ['present', 'clocked_in']])
-    absent_today = total_workers - present_today
-    total_hours_today = sum(a.get('hours_worked', 0) for a in today_attendance)
-    total_wages_today = sum(a.get('wage_earned', 0) for a in today_attendance)
+    today = datetime.now(timezone.utc).date().isoformat()
+    return await versioned(request, [WORKERS, date_scope(today)], render)
+
+async def compute_dashboard_stats() -> DashboardStats:
+    today = datetime.now(timezone.utc).date().isoformat()
+    total_workers, rollup = await read_dashboard_rollup(db, today)
+    # Workers still clocked in are on site, so they are not absent today.
+    present_today = rollup['present_count'] + rollup['clocked_in_count']
     
     return DashboardStats(
         total_workers=total_workers,
         present_today=present_today,
-        absent_today=absent_today,
-        total_hours_today=round(total_hours_today, 2),
-        total_wages_today=round(total_wages_today, 2)
+        absent_today=total_workers - present_today,
+        total_hours_today=round(rollup['total_hours'], 2),
+        total_wages_today=round(rollup['total_wages'], 2)
+    )
+
+MAX_TIMESERIES_BUCKETS = 3660
+
+@api_router.get("/analytics/timeseries")
+async def get_timeseries(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    bucket: Literal["day", "week", "month"] = "day",
+    worker_id: Optional[str] = None
+):
+    start_date, end_date = parse_export_range(start, end)
+    start_date, end_date = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    if bucket_count(start_date, end_date, bucket) > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"A series is limited to {MAX_TIMESERIES_BUCKETS} {bucket} buckets")
+    if worker_id and not await find_worker(worker_id):
+        raise HTTPException(status_code=404, detail="Worker not found")
+    today = datetime.now(timezone.utc).date()
+    return await timeseries_store.timeseries(db, start_date, end_date, bucket, today, worker_id)
+
+def parse_export_range(start: str, end: str):
+    try:
+        start_date, end_date = date.fromisoformat(start), date.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be YYYY-MM-DD dates")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    return start_date.isoformat(), end_date.isoformat()
+
+@api_router.get("/exports/payroll")
+async def export_payroll(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    format: Literal["csv", "parquet"] = "csv"
+):
+    start_date, end_date = parse_export_range(start, end)
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream_export(db, start_date, end_date, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="payroll-{start_date}-{end_date}.{extension}"'}
+    )
+
+@api_router.post("/exports/payroll/jobs")
+async def create_payroll_export_job(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    format: Literal["csv", "parquet"] = "csv"
+):
+    start_date, end_date = parse_export_range(start, end)
+    return await export_jobs.submit(db, start_date, end_date, format)
+
+@api_router.get("/exports/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    job = export_jobs.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@api_router.get("/exports/jobs/{job_id}/download")
+async def download_export_job(job_id: str):
+    job = export_jobs.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job['status'] != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    media_type, extension = EXPORT_FORMATS[job['format']]
+    return FileResponse(
+        export_jobs.path(job),
+        media_type=media_type,
+        filename=f"payroll-{job['from']}-{job['to']}.{extension}"
+    )
+
+@api_router.get("/sync")
+async def sync_changes(
+    since: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    changes = await changes_since(
+        db, parse_token(since, SYNC_TOMBSTONE_RETENTION), {"workers": Worker, "attendance": Attendance}, limit, SYNC_SETTLE_SECONDS
+    )
+    return RowsResponse(changes)
+
+@api_router.get("/events")
+async def stream_events():
+    return StreamingResponse(
+        event_broker.stream(EVENT_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@api_router.get("/events/stats")
+async def get_event_stats():
+    return event_broker.stats()
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    stats = {"workers": worker_cache.stats(), "search": worker_index.stats(), "timeseries": timeseries_store.stats()}
+    if attendance_writer:
+        stats["write_behind"] = attendance_writer.stats()
+    stats["archive"] = archive_compactor.stats()
+    stats["versions"] = version_clock.stats()
+    stats["responses"] = response_cache.stats()
+    return stats
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return registry.render() + render_gauges(
+        "wageflow_worker_cache", "Worker cache statistics for this process.", worker_cache.stats()
+    )
+
+@api_router.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@api_router.get("/ready")
+async def ready(response: Response):
+    status = lifecycle.status()
+    if not lifecycle.ready:
+        response.status_code = 503
+    elif not await ping(db, READY_PING_TIMEOUT):
+        status["status"] = "database_unavailable"
+        response.status_code = 503
+    return status
+
 @api_router.get("/")
 async def root():
     return {"message": "WageFlow API"}
 
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get('COMPRESSION_MIN_BYTES', '1024')))
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    try:
+        response = await call_next(request)
+    finally:
+        current_profile.reset(token)
+    
+    elapsed = profile.elapsed
+    route = getattr(request.scope.get('route'), 'path', 'unmatched')
+    registry.observe(request.method, route, response.status_code, elapsed, profile)
+    response.headers['Server-Timing'] = server_timing(profile, elapsed)
+    if elapsed * 1000 > SLOW_REQUEST_MS:
+        log_slow_request(request.method, route, response.status_code, elapsed, profile)
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Server-Timing"],
 )
+app.add_middleware(InFlightMiddleware, lifecycle=lifecycle)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+def warm_models():
+    """Build the OpenAPI schema and run each response model once before traffic arrives."""
+    app.openapi()
+    samples = [
+        Worker(name="", worker_id="", daily_wage_rate=0),
+        Attendance(worker_id="", worker_name="", date=""),
+        DashboardStats(total_workers=0, present_today=0, absent_today=0, total_hours_today=0, total_wages_today=0),
+    ]
+    for sample in samples:
+        type(sample).model_validate(sample.model_dump()).model_dump_json()
+
+async def archive_compacted(month: str):
+    # Snapshots and series built mid-move may have counted rows in both tiers.
+    await mark_months_dirty(db, [month])
+    timeseries_store.clear()
+
+async def start_services():
+    lifecycle.begin()
+    async with lifecycle.phase("connections"):
+        await warm_up(db, warmup_connections())
+    async with lifecycle.phase("models"):
+        warm_models()
+    async with lifecycle.phase("indexes"):
+        await ensure_indexes(db)
+        await verify_query_plans(db)
+        await backfill(db, ["workers", "attendance"])
+        if await backfill_rate_history(db):
+            # Cached worker lists were rendered without the field.
+            await increment(db, [WORKERS])
+    async with lifecycle.phase("caches"):
+        await worker_cache.start()
+        await version_clock.start(db)
+        await worker_index.load(db)
+        await event_broker.start()
+        await seed_rollups(db, datetime.now(timezone.utc).date().isoformat())
+    if attendance_writer:
+        async with lifecycle.phase("journal"):
+            await attendance_writer.start(commit_attendance_rows)
+    await archive_compactor.start(db, archive_compacted)
+    await export_jobs.start()
+    lifecycle.mark_ready()
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def stop_services():
+    await lifecycle.drain(SHUTDOWN_GRACE_SECONDS)
+    if attendance_writer:
+        await attendance_writer.close()
+    await archive_compactor.close()
+    await event_broker.close()
+    await export_jobs.close()
+    await worker_cache.close()
+    await version_clock.close()
+    client.close()
@@ -0,0 +1,183 @@
+"""Change sequence and delta sync for workers and attendance.
+
+Every write to a worker or an attendance row stamps the document with
+``_seq`` and ``_changed_at``. ``_seq`` is the wall clock in microseconds,
+taken by the writing process and kept strictly increasing within it, so
+stamping costs no round trip and no shared document. Deleting a worker
+leaves a tombstone carrying its own sequence number. A client that
+remembers the highest sequence it has applied can ask for everything after
+it: ``GET /api/sync?since=<token>`` returns the changed rows, the deleted
+ids and the token to send next time. A client with no token gets the whole
+data set, page by page.
+
+Writes overlap, and processes stamp independently, so a reader can see
+sequence 10 before sequence 9 lands. Handing out 10 as the next token
+would skip 9 for good. So the token only advances to rows stamped at least
+``settle`` seconds ago: any write stamped lower has landed by then,
+provided ``settle`` covers a write's latency plus the clock skew between
+the hosts. Rows newer than that are still returned, and again on the next
+call. Clients apply rows by ``id``, so repeats are harmless.
+
+Tombstones are pruned once they are older than ``retention``. A token from
+before then may have missed a deletion, so it is refused with 410, and
+the client starts over without one.
+
+The stamp always goes on the last write of an operation, so a reader
+that sees the new sequence number also sees the final document.
+Documents written before sequencing existed are stamped by ``backfill``
+at startup.
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+from codec import to_datetime
+from pagination import projection
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_FIELD = "_seq"
+CHANGED_AT_FIELD = "_changed_at"
+TOMBSTONES = "tombstones"
+TOMBSTONE_RETENTION = timedelta(days=30)
+BACKFILL_BATCH_SIZE = 1000
+
+_last_seq = 0
+
+
+def reserve(count: int = 1) -> int:
+    """Reserve ``count`` consecutive sequence numbers; returns the first."""
+    global _last_seq
+    first = max(_last_seq + 1, time.time_ns() // 1000)
+    _last_seq = first + count - 1
+    return first
+
+
+def seq_at(moment: datetime) -> int:
+    """The sequence number a write stamped at ``moment`` would get."""
+    return int(moment.timestamp() * 1_000_000)
+
+
+def stamp(seq: int) -> dict:
+    return {SEQUENCE_FIELD: seq, CHANGED_AT_FIELD: datetime.now(timezone.utc)}
+
+
+def next_stamp() -> dict:
+    return stamp(reserve())
+
+
+def stamps(count: int) -> List[dict]:
+    """``count`` stamps from one reservation, for bulk writes."""
+    if count == 0:
+        return []
+    first = reserve(count)
+    return [stamp(first + i) for i in range(count)]
+
+
+async def touch(db, collection: str, query: dict):
+    """Stamp one document after a write that could not carry the stamp itself."""
+    await db[collection].update_one(query, {"$set": next_stamp()})
+
+
+async def record_deletions(db, collection: str, ids: Iterable[str], retention: timedelta = TOMBSTONE_RETENTION):
+    ids = list(ids)
+    tombstones = [{"collection": collection, "id": doc_id, **s} for doc_id, s in zip(ids, stamps(len(ids)))]
+    if tombstones:
+        await db[TOMBSTONES].insert_many(tombstones)
+        await prune_tombstones(db, retention)
+
+
+async def prune_tombstones(db, retention: timedelta = TOMBSTONE_RETENTION) -> int:
+    """Delete tombstones older than ``retention``; tokens from before then are refused."""
+    horizon = seq_at(datetime.now(timezone.utc) - retention)
+    result = await db[TOMBSTONES].delete_many({SEQUENCE_FIELD: {"$lt": horizon}})
+    return result.deleted_count
+
+
+async def backfill(db, collections: Iterable[str], batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Stamp documents written before sequencing; returns how many were stamped."""
+    total = 0
+    for collection in collections:
+        stamped = 0
+        while True:
+            batch = await db[collection].find(
+                {SEQUENCE_FIELD: {"$exists": False}}, {"_id": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            # Conditional, so a concurrent write's own stamp is kept.
+            operations = [
+                UpdateOne({"_id": doc['_id'], SEQUENCE_FIELD: {"$exists": False}}, {"$set": s})
+                for doc, s in zip(batch, stamps(len(batch)))
+            ]
+            await db[collection].bulk_write(operations, ordered=False)
+            stamped += len(operations)
+        if stamped:
+            logger.info("Stamped %d unsequenced document(s) in %s", stamped, collection)
+        total += stamped
+    return total
+
+
+def parse_token(token, retention: timedelta = TOMBSTONE_RETENTION) -> int:
+    if token is None or token == "":
+        return 0
+    try:
+        since = int(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if since < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if since and since < seq_at(datetime.now(timezone.utc) - retention):
+        raise HTTPException(status_code=410, detail="Sync token expired; sync again without one")
+    return since
+
+
+async def changes_since(db, since: int, models: Dict[str, Type[BaseModel]], limit: int, settle: float) -> dict:
+    """Rows of each collection in ``models`` changed after ``since``, plus deletions."""
+    query = {SEQUENCE_FIELD: {"$gt": since}}
+    meta = {SEQUENCE_FIELD: 1, CHANGED_AT_FIELD: 1}
+    projections = {name: {**projection(model), **meta} for name, model in models.items()}
+    projections[TOMBSTONES] = {"_id": 0, "collection": 1, "id": 1, **meta}
+
+    # Each collection is read in sequence order. If any page is full, only
+    # rows up to its last sequence number are complete, so later rows from
+    # the other collections wait for the next page.
+    pages = {}
+    cut = None
+    for name, fields in projections.items():
+        rows = await db[name].find(query, fields).sort(SEQUENCE_FIELD, 1).limit(limit + 1).to_list(limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cut = min(cut, rows[-1][SEQUENCE_FIELD]) if cut is not None else rows[-1][SEQUENCE_FIELD]
+        pages[name] = rows
+    if cut is not None:
+        pages = {name: [r for r in rows if r[SEQUENCE_FIELD] <= cut] for name, rows in pages.items()}
+
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=settle)
+    token = since
+    for rows in pages.values():
+        for row in rows:
+            seq = row.pop(SEQUENCE_FIELD)
+            if to_datetime(row.pop(CHANGED_AT_FIELD)) <= settled_before:
+                token = max(token, seq)
+
+    # Without a cut every row stamped before the settle point is on this
+    # page, so the token can move up to it even when nothing changed. That
+    # keeps an idle client's token inside the tombstone retention.
+    if cut is None:
+        token = max(token, seq_at(settled_before))
+
+    deleted = {name: [] for name in models}
+    for tombstone in pages.pop(TOMBSTONES):
+        deleted.setdefault(tombstone['collection'], []).append(tombstone['id'])
+    return {
+        "token": str(token),
+        "more": cut is not None and token > since,
+        **pages,
+        "deleted": deleted,
+    }
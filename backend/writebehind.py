@@ -0,0 +1,284 @@
+"""Write-behind group commit for attendance, with a local journal.
+
+With ``ATTENDANCE_WRITE_MODE=group_commit``, ``POST /api/attendance`` does not wait
+for its own MongoDB write. The request prices the row and appends it to
+this process's journal file. It returns once the journal is fsynced and
+the row is queued. A background flusher takes whatever has queued up
+within ``window`` seconds, up to ``max_batch`` rows, and commits them as
+one ``bulk_write``. The rollups, analytics, sync stamps and events for the
+whole batch come with it. During a burst, many requests share one fsync
+and one database round trip instead of paying for their own.
+
+The journal is one JSON line per row, numbered, plus ``committed`` marks
+written after each batch. The file is truncated whenever everything in
+it has been committed. Each process writes its own file under the
+journal directory and holds an exclusive lock on it. At startup, any
+file that can be locked belongs to a process that died, so its
+uncommitted rows are committed again and the file is removed. By then
+live processes may have written newer rows for the same worker and date,
+so a replayed row only lands where the stored row was last changed before
+the replayed one was acknowledged (its ``created_at``). That comparison
+spans hosts, so their clocks need to agree to within the sync settle
+window (see sync.py).
+
+A batch that fails on a dropped connection or a network timeout is retried
+until the database is back. Any other failure will not go away on retry:
+the batch's rows are committed one at a time, and any that still fail
+are appended to ``dead-letter.ndjson`` in the journal directory with the
+error, so one bad row cannot stall the queue.
+
+The trade-off is read-your-writes. A row is acknowledged before it
+reaches MongoDB, so reads can miss it for up to one window plus a bulk
+write. The bounded queue pushes back on requests when the database falls
+behind. The journal relies on ``fcntl`` file locks, so it is POSIX-only.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo.errors import AutoReconnect, NetworkTimeout
+
+from pagination import dump_json
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+DEAD_LETTER_FILE = "dead-letter.ndjson"
+TRANSIENT_ERRORS = (AutoReconnect, NetworkTimeout)
+
+# Commits ``[(n, date, row), ...]``; rows are plain attendance dicts. The
+# flag is set for rows replayed from a dead process's journal.
+CommitFn = Callable[[List[Tuple[int, str, dict]], bool], Awaitable[None]]
+
+
+class Journal:
+    """Append-only, group-fsynced record of acknowledged rows for one process."""
+
+    def __init__(self, directory: Path, fsync: bool = True):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"{uuid.uuid4().hex}{JOURNAL_SUFFIX}"
+        self.fsync = fsync
+        self._file = open(self.path, "ab")
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._n = 0
+        self._open = set()
+        self._waiters: List[asyncio.Future] = []
+        self._syncer: Optional[asyncio.Task] = None
+        self.syncs = 0
+
+    async def append(self, date_str: str, row: dict) -> int:
+        """Record ``row``; returns its number once it is on disk."""
+        self._n += 1
+        n = self._n
+        self._open.add(n)
+        self._file.write(dump_json({"n": n, "date": date_str, "row": row}) + b"\n")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._syncer is None:
+            self._syncer = asyncio.create_task(self._sync())
+        try:
+            await waiter
+        except OSError:
+            self._open.discard(n)
+            raise
+        return n
+
+    async def _sync(self):
+        # Every append that arrives while an fsync runs shares the next one.
+        try:
+            while self._waiters:
+                waiters, self._waiters = self._waiters, []
+                try:
+                    self._file.flush()
+                    if self.fsync:
+                        await asyncio.to_thread(os.fsync, self._file.fileno())
+                    self.syncs += 1
+                except OSError as exc:
+                    for waiter in waiters:
+                        waiter.set_exception(exc)
+                    continue
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+        finally:
+            self._syncer = None
+
+    def committed(self, numbers):
+        """Mark rows committed; truncates the file once nothing is outstanding."""
+        self._open.difference_update(numbers)
+        if self._open:
+            self._file.write(dump_json({"committed": min(self._open) - 1}) + b"\n")
+        elif self._syncer is None:
+            self._file.flush()
+            self._file.truncate(0)
+            self._file.seek(0)
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._open)
+
+    def size(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self, remove: bool):
+        self._file.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+def read_journal(path: Path) -> List[Tuple[int, str, dict]]:
+    """Rows in a journal file that were not marked committed."""
+    rows, committed = [], 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-append was never acknowledged.
+                continue
+            if "committed" in record:
+                committed = max(committed, record["committed"])
+            else:
+                rows.append((record["n"], record["date"], record["row"]))
+    return [row for row in rows if row[0] > committed]
+
+
+class WriteBehindQueue:
+    def __init__(self, directory: Path, max_batch: int = 500, window: float = 0.005,
+                 queue_size: int = 10000, fsync: bool = True):
+        self.directory = Path(directory)
+        self.max_batch = max_batch
+        self.window = window
+        self.queue_size = queue_size
+        self.fsync = fsync
+        self.journal: Optional[Journal] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._commit: Optional[CommitFn] = None
+        self.batches = 0
+        self.rows = 0
+        self.replayed = 0
+        self.retries = 0
+        self.dead_lettered = 0
+
+    async def start(self, commit: CommitFn):
+        self._commit = commit
+        await self.replay()
+        self.journal = Journal(self.directory, self.fsync)
+        self._queue = asyncio.Queue(self.queue_size)
+        self._flusher = asyncio.create_task(self._run())
+
+    async def replay(self):
+        """Commit rows from the journals of processes that are gone."""
+        for path in sorted(self.directory.glob(f"*{JOURNAL_SUFFIX}")):
+            try:
+                f = open(path, "rb+")
+            except FileNotFoundError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live process owns it
+                if not path.exists():
+                    continue  # replayed and removed by another process meanwhile
+                rows = read_journal(path)
+                for start in range(0, len(rows), self.max_batch):
+                    await self._commit_or_set_aside(rows[start:start + self.max_batch], True)
+                path.unlink(missing_ok=True)
+            if rows:
+                logger.warning("Replayed %d uncommitted attendance row(s) from %s", len(rows), path.name)
+                self.replayed += len(rows)
+
+    async def submit(self, date_str: str, row: dict):
+        """Journal ``row`` and queue it for the next batch."""
+        n = await self.journal.append(date_str, row)
+        await self._queue.put((n, date_str, row))
+
+    async def _run(self):
+        # A None on the queue asks the flusher to commit what precedes it and stop.
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    await self._flush(batch)
+                    return
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        await self._commit_or_set_aside(batch, False)
+        self.batches += 1
+        self.rows += len(batch)
+        self.journal.committed([n for n, _, _ in batch])
+
+    async def _commit_retrying(self, rows, replayed: bool):
+        delay = 0.1
+        while True:
+            try:
+                return await self._commit(rows, replayed)
+            except TRANSIENT_ERRORS:
+                # The rows are journaled; keep them and retry until the
+                # database is back, while the queue bound pushes back.
+                self.retries += 1
+                logger.exception("Group commit of %d attendance row(s) failed, retrying in %.1fs", len(rows), delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    async def _commit_or_set_aside(self, rows, replayed: bool):
+        """Commit ``rows``, dead-lettering any that fail for a reason a retry will not fix."""
+        try:
+            await self._commit_retrying(rows, replayed)
+        except Exception as exc:
+            if len(rows) > 1:
+                logger.warning("Group commit of %d attendance row(s) failed (%s); committing them one at a time",
+                               len(rows), exc)
+                for row in rows:
+                    await self._commit_or_set_aside([row], replayed)
+                return
+            [(_, date_str, row)] = rows
+            logger.exception("Attendance for worker %s on %s cannot be committed; moved to %s",
+                             row.get('worker_id'), date_str, DEAD_LETTER_FILE)
+            with open(self.directory / DEAD_LETTER_FILE, "ab") as f:
+                f.write(dump_json({"date": date_str, "row": row, "error": repr(exc)}) + b"\n")
+            self.dead_lettered += 1
+
+    async def close(self, timeout: float = 30.0):
+        """Commit everything queued, then stop.
+
+        The journal is removed once empty. If the database does not take the
+        remaining rows within ``timeout``, they stay journaled for replay.
+        """
+        if self._flusher is None:
+            return
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(self._flusher, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Gave up flushing attendance; %d row(s) left in %s", self.journal.outstanding, self.journal.path)
+        self._flusher = None
+        self.journal.close(remove=self.journal.outstanding == 0)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch": round(self.rows / self.batches, 1) if self.batches else 0.0,
+            "journal_syncs": self.journal.syncs if self.journal else 0,
+            "journal_bytes": self.journal.size() if self.journal else 0,
+            "replayed": self.replayed,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+        }
@@ -0,0 +1,46 @@
+import { useEffect, useRef } from 'react';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const EVENTS_URL = `${BACKEND_URL}/api/events`;
+
+// Subscribes to the server's change feed. `handlers` maps event types
+// (attendance, worker, worker_removed, stats) to callbacks receiving the
+// parsed event. `resync` is called whenever the stream may have missed
+// events (server-side overflow or a reconnect) and should refetch.
+export function useEventStream(handlers) {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') {
+      return undefined;
+    }
+    const source = new EventSource(EVENTS_URL);
+    let dropped = false;
+
+    const dispatch = (type) => (message) => {
+      const handler = handlersRef.current[type];
+      if (handler) {
+        handler(JSON.parse(message.data));
+      }
+    };
+    const types = ['attendance', 'worker', 'worker_removed', 'stats', 'resync'];
+    const listeners = types.map((type) => [type, dispatch(type)]);
+    listeners.forEach(([type, listener]) => source.addEventListener(type, listener));
+
+    source.onerror = () => {
+      dropped = true;
+    };
+    source.onopen = () => {
+      if (dropped && handlersRef.current.resync) {
+        handlersRef.current.resync();
+      }
+      dropped = false;
+    };
+
+    return () => {
+      listeners.forEach(([type, listener]) => source.removeEventListener(type, listener));
+      source.close();
+    };
+  }, []);
+}
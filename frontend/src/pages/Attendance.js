@@ -6,6 +6,7 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
+import { useEventStream } from '@/hooks/use-event-stream';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -22,6 +23,29 @@ const Attendance = () => {
     fetchData();
   }, []);
 
+  // Attendance rows are unique per worker and day, so a newer row replaces
+  // the worker's current one.
+  const mergeAttendance = (attendance) => {
+    const today = new Date().toISOString().split('T')[0];
+    const todays = attendance.filter((att) => att.date === today);
+    setTodayAttendance((rows) => [
+      ...rows.filter((row) => !todays.some((att) => att.worker_id === row.worker_id)),
+      ...todays,
+    ]);
+  };
+
+  useEventStream({
+    attendance: (event) => mergeAttendance(event.attendance),
+    worker: (event) =>
+      setWorkers((rows) =>
+        rows.some((row) => row.id === event.worker.id)
+          ? rows.map((row) => (row.id === event.worker.id ? event.worker : row))
+          : [...rows, event.worker]
+      ),
+    worker_removed: (event) => setWorkers((rows) => rows.filter((row) => row.id !== event.id)),
+    resync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
       const [workersRes, attendanceRes] = await Promise.all([
@@ -54,17 +78,19 @@ const Attendance = () => {
       const clockInISO = new Date(`${today}T${clockInTime}`).toISOString();
       const clockOutISO = new Date(`${today}T${clockOutTime}`).toISOString();
 
-      await axios.post(`${API}/attendance`, {
+      const response = await axios.post(`${API}/attendance`, {
         worker_id: selectedWorker,
         clock_in: clockInISO,
         clock_out: clockOutISO,
       });
 
+      // Show the row now rather than waiting for its event, which never
+      // arrives if the stream is down.
+      mergeAttendance([response.data]);
       toast.success('Attendance marked successfully');
       setSelectedWorker('');
       setClockInTime('');
       setClockOutTime('');
-      fetchData();
     } catch (error) {
       console.error('Error marking attendance:', error);
       toast.error(error.response?.data?.detail || 'Failed to mark attendance');
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { Users, UserCheck, UserX, Clock, DollarSign, Clipboard, FileText } from 'lucide-react';
+import { useEventStream } from '@/hooks/use-event-stream';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -33,6 +34,11 @@ const Dashboard = () => {
     fetchStats();
   }, []);
 
+  useEventStream({
+    stats: (event) => setStats(event.stats),
+    resync: () => fetchStats(),
+  });
+
   const fetchStats = async () => {
     try {
       const response = await axios.get(`${API}/dashboard/stats`);
@@ -14,6 +14,7 @@ const Workers = () => {
   const [workers, setWorkers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [editingWorker, setEditingWorker] = useState(null);
   const [formData, setFormData] = useState({
@@ -26,6 +27,27 @@ const Workers = () => {
     fetchWorkers();
   }, []);
 
+  useEffect(() => {
+    const query = searchTerm.trim();
+    if (!query) {
+      setSearchResults(null);
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/workers/search`, { params: { q: query, limit: 100 } });
+        if (!cancelled) setSearchResults(response.data);
+      } catch (error) {
+        console.error('Error searching workers:', error);
+      }
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, workers]);
+
   const fetchWorkers = async () => {
     try {
       const response = await axios.get(`${API}/workers`);
@@ -84,11 +106,7 @@ const Workers = () => {
     setFormData({ name: '', worker_id: '', daily_wage_rate: '' });
   };
 
-  const filteredWorkers = workers.filter(
-    (worker) =>
-      worker.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      worker.worker_id.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  const filteredWorkers = searchTerm.trim() ? searchResults || [] : workers;
 
   return (
     <div className="p-8">
@@ -0,0 +1,42 @@
+"""Run the API in-process against the mongomock-motor stand-in database."""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+# Tests compact the archive explicitly, never in the background.
+os.environ.setdefault('ARCHIVE_INTERVAL_SECONDS', '0')
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+from tests.helpers import serving  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    """A fresh stand-in database with every in-process cache emptied."""
+    server.client = AsyncMongoMockClient()
+    server.db = server.client[os.environ['DB_NAME']]
+    server.worker_cache.clear()
+    server.timeseries_store.clear()
+    server.version_clock.clear()
+    server.response_cache.clear()
+    server.queued_attendance_ids.clear()
+    return server.db
+
+
+@pytest.fixture
+async def api(db):
+    async with serving() as client:
+        yield client
@@ -0,0 +1,62 @@
+"""Shared steps for driving the API in tests."""
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import server
+
+
+@asynccontextmanager
+async def serving():
+    """An HTTP client for the app, inside its lifespan."""
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            yield client
+
+
+async def create_workers(api, count: int, rate: float = 100.0, prefix: str = "W") -> list:
+    ids = []
+    for i in range(count):
+        response = await api.post("/api/workers", json={"name": f"Worker {i}", "worker_id": f"{prefix}{i:03d}", "daily_wage_rate": rate})
+        response.raise_for_status()
+        ids.append(response.json()['id'])
+    return ids
+
+
+async def work_day(api, worker_id: str, day, hours: float = 8.0):
+    """Clock ``worker_id`` in and out on ``day`` through the API."""
+    clock_in = datetime(day.year, day.month, day.day, 8, tzinfo=timezone.utc)
+    (await api.post("/api/attendance/clock-in", json={"worker_id": worker_id, "at": clock_in.isoformat()})).raise_for_status()
+    clock_out = clock_in + timedelta(hours=hours)
+    (await api.post("/api/attendance/clock-out", json={"worker_id": worker_id, "at": clock_out.isoformat()})).raise_for_status()
+
+
+async def walk(api, url: str, limit: int, **params) -> list:
+    """Every row of a paged list endpoint, following ``X-Next-Cursor``."""
+    rows, after = [], None
+    while True:
+        response = await api.get(url, params={**params, "limit": limit, **({"after": after} if after else {})})
+        response.raise_for_status()
+        rows += response.json()
+        after = response.headers.get("x-next-cursor")
+        if not after:
+            return rows
+
+
+async def record_history(api):
+    """A mix of writes on today and past days, including a back-dated re-price."""
+    ids = await create_workers(api, 3)
+    today = datetime.now(timezone.utc).date()
+    for offset in (20, 9, 3, 1):
+        for worker_id in ids[:2]:
+            await work_day(api, worker_id, today - timedelta(days=offset), hours=6 + offset % 4)
+    now = datetime.now(timezone.utc)
+    await api.post("/api/attendance", json={
+        "worker_id": ids[2], "clock_in": (now - timedelta(hours=3)).isoformat(), "clock_out": now.isoformat(),
+    })
+    await api.post("/api/attendance/clock-in", json={"worker_id": ids[0]})
+    await api.post(f"/api/workers/{ids[1]}/rates", json={
+        "effective_from": (today - timedelta(days=10)).isoformat(), "daily_wage_rate": 175,
+    })
+    return ids, today
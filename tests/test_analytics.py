@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from rollups import seed_all_rollups
+from tests.helpers import create_workers, record_history, work_day
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_patched_series_matches_a_rebuilt_one(api):
+    _, today = await record_history(api)
+    params = {"from": (today - timedelta(days=30)).isoformat(), "to": today.isoformat(), "bucket": "week"}
+    # Built before the writes below, so they reach it only as patches.
+    await api.get("/api/analytics/timeseries", params=params)
+    [late] = await create_workers(api, 1, prefix="L")
+    await work_day(api, late, today - timedelta(days=2))
+
+    patched = (await api.get("/api/analytics/timeseries", params=params)).json()
+    server.timeseries_store.clear()
+    rebuilt = (await api.get("/api/analytics/timeseries", params=params)).json()
+
+    assert patched == rebuilt
+
+
+async def test_series_refresh_picks_up_rollups_written_elsewhere(api, db, monkeypatch):
+    [worker_id] = await create_workers(api, 1)
+    today = datetime.now(timezone.utc).date()
+    await work_day(api, worker_id, today - timedelta(days=4))
+    params = {"from": (today - timedelta(days=7)).isoformat(), "to": today.isoformat()}
+    monkeypatch.setattr(server.timeseries_store, "ttl", 0)
+    before = (await api.get("/api/analytics/timeseries", params=params)).json()['totals']
+    patched_days = server.timeseries_store.stats()['patched_days']
+
+    # What another process's write does to the shared rollup.
+    await db.daily_stats.update_one({"_id": (today - timedelta(days=2)).isoformat()},
+                                    {"$inc": {"total_hours": 4.0, "recorded_count": 1}}, upsert=True)
+    after = (await api.get("/api/analytics/timeseries", params=params)).json()['totals']
+
+    assert after['hours'] == before['hours'] + 4.0
+    assert after['recorded_days'] == before['recorded_days'] + 1
+    assert server.timeseries_store.stats()['patched_days'] == patched_days + 1
+
+
+async def test_oversized_bucket_ranges_are_rejected(api):
+    assert (await api.get("/api/analytics/timeseries", params={"from": "1900-01-01", "to": "2020-01-01", "bucket": "week"})).status_code == 400
+    assert (await api.get("/api/analytics/timeseries", params={"from": "1900-01-01", "to": "2020-01-01", "bucket": "month"})).status_code == 200
+
+
+async def test_seeding_completes_past_rollups_but_leaves_today_alone(api, db):
+    [worker_id] = await create_workers(api, 1)
+    today = datetime.now(timezone.utc).date()
+    past = (today - timedelta(days=5)).isoformat()
+    await work_day(api, worker_id, today - timedelta(days=5))
+    await api.post("/api/attendance/clock-in", json={"worker_id": worker_id})
+    # A past rollup from before recorded_count, and today's live counters.
+    await db.daily_stats.replace_one({"_id": past}, {"present_count": 1, "total_hours": 8.0, "total_wages": 800.0})
+    live = await db.daily_stats.find_one({"_id": today.isoformat()})
+
+    assert await seed_all_rollups(db) == 1
+    assert (await db.daily_stats.find_one({"_id": past}))['recorded_count'] == 1
+    assert await db.daily_stats.find_one({"_id": today.isoformat()}) == live
+    assert await seed_all_rollups(db) == 0
+
+
+async def test_series_and_monthly_report_agree_on_present_days(api):
+    ids = await create_workers(api, 2)
+    first = datetime.now(timezone.utc).date().replace(day=1) - timedelta(days=40)
+    for offset in range(3):
+        await work_day(api, ids[0], first + timedelta(days=offset))
+    # Never clocked out: recorded, but not a present day.
+    await api.post("/api/attendance/clock-in", json={
+        "worker_id": ids[1], "at": datetime(first.year, first.month, first.day, 9, tzinfo=timezone.utc).isoformat(),
+    })
+    month_end = first.replace(day=28)
+
+    report = (await api.get(f"/api/attendance/monthly/{first.year}/{first.month}")).json()
+    totals = (await api.get("/api/analytics/timeseries", params={
+        "from": first.replace(day=1).isoformat(), "to": month_end.isoformat(),
+    })).json()['totals']
+
+    assert totals['present_days'] == sum(row['present_days'] for row in report) == 3
+    assert totals['recorded_days'] == sum(row['total_days'] for row in report) == 4
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from archive import ARCHIVE, Compactor, month_range, shift_month
+from rollups import verify_rollups
+from sync import SEQUENCE_FIELD
+from tests.helpers import create_workers, work_day
+
+pytestmark = pytest.mark.anyio
+
+
+async def closed_month(api):
+    """Two workers with a few days each in a month old enough to archive."""
+    ids = await create_workers(api, 2)
+    month = shift_month(datetime.now(timezone.utc).strftime("%Y-%m"), -2)
+    first = datetime.fromisoformat(month_range(month)[0]).date()
+    for offset in (0, 4, 11):
+        for worker_id in ids:
+            await work_day(api, worker_id, first + timedelta(days=offset), hours=5 + offset % 3)
+    return ids, month, first
+
+
+async def reads(api, ids, month, first):
+    year, number = month.split("-")
+    return {
+        "history": [(await api.get(f"/api/attendance/worker/{worker_id}")).json() for worker_id in ids],
+        "day": (await api.get(f"/api/attendance/date/{(first + timedelta(days=4)).isoformat()}")).json(),
+        "report": (await api.get(f"/api/attendance/monthly/{year}/{int(number)}")).json(),
+    }
+
+
+async def test_compaction_keeps_every_read_the_same(api, db):
+    ids, month, first = await closed_month(api)
+    before = await reads(api, ids, month, first)
+
+    [result] = await Compactor(keep_months=1).run_once(db, server.archive_compacted)
+
+    assert result == {"month": month, "rows": 6, "buckets": 2}
+    assert await db.attendance.count_documents({}) == 0
+    assert await reads(api, ids, month, first) == before
+    assert await verify_rollups(db) == []
+
+
+async def test_back_dated_rate_change_thaws_the_buckets(api, db):
+    ids, month, first = await closed_month(api)
+    await Compactor(keep_months=1).run_once(db, server.archive_compacted)
+
+    response = await api.post(f"/api/workers/{ids[0]}/rates", json={
+        "effective_from": first.isoformat(), "daily_wage_rate": 240,
+    })
+
+    assert response.status_code == 200
+    rows = [row async for row in db.attendance.find({"worker_id": ids[0]})]
+    assert len(rows) == 3 and all(SEQUENCE_FIELD in row for row in rows)
+    assert await db[ARCHIVE].count_documents({"worker_id": ids[0]}) == 0
+    assert await db[ARCHIVE].count_documents({"worker_id": ids[1]}) == 1
+    history = (await api.get(f"/api/attendance/worker/{ids[0]}")).json()
+    assert {row['wage_earned'] for row in history} == {round(240 * row['hours_worked'], 2) for row in history}
+    assert await verify_rollups(db) == []
@@ -0,0 +1,55 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_each_event_gets_its_own_result(api, db):
+    ids = await create_workers(api, 2)
+    now = datetime.now(timezone.utc)
+    events = [
+        {"worker_id": ids[0], "clock_in": (now - timedelta(hours=8)).isoformat(), "clock_out": now.isoformat()},
+        {"worker_id": "missing", "clock_in": now.isoformat()},
+        {"worker_id": ids[1], "clock_in": "yesterday", "clock_out": now.isoformat()},
+        # Naive and aware timestamps cannot be subtracted.
+        {"worker_id": ids[1], "clock_in": "2026-01-01T08:00:00", "clock_out": now.isoformat()},
+        {"clock_in": now.isoformat()},
+    ]
+
+    body = (await api.post("/api/attendance/bulk", json=events)).json()
+
+    assert (body['processed'], body['succeeded'], body['failed']) == (5, 1, 4)
+    assert [r['ok'] for r in body['results']] == [True, False, False, False, False]
+    assert body['results'][1]['error'] == "Worker not found"
+    assert body['results'][0]['attendance']['hours_worked'] == 8.0
+    assert [row['worker_id'] async for row in db.attendance.find()] == [ids[0]]
+
+
+async def test_later_events_for_a_worker_supersede_earlier_ones(api, monkeypatch):
+    [worker_id] = await create_workers(api, 1)
+    now = datetime.now(timezone.utc)
+    monkeypatch.setattr(server, "BULK_BATCH_SIZE", 2)
+    lines = [
+        {"worker_id": worker_id, "clock_in": (now - timedelta(hours=h)).isoformat()} for h in (3, 2, 1)
+    ]
+
+    body = (await api.post(
+        "/api/attendance/bulk",
+        content=b"\n".join(json.dumps(line).encode() for line in lines) + b"\nnot json\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )).json()
+    today = (await api.get("/api/attendance/today")).json()
+
+    assert [r.get('superseded', False) for r in body['results'][:3]] == [True, False, False]
+    assert body['results'][3]['ok'] is False
+    assert [row['clock_in'] for row in today] == [lines[2]['clock_in']]
+
+
+async def test_a_body_that_is_not_an_array_is_rejected(api):
+    assert (await api.post("/api/attendance/bulk", content=b"{", headers={"Content-Type": "application/json"})).status_code == 400
+    assert (await api.post("/api/attendance/bulk", json={"worker_id": "x"})).status_code == 400
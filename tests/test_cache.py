@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from cache import InMemoryInvalidationBus, WorkerCache
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+def worker(worker_id: str, number: str, name: str = "Someone") -> dict:
+    return {"id": worker_id, "worker_id": number, "name": name}
+
+
+def test_entries_expire_and_the_least_recent_is_evicted(monkeypatch):
+    cache = WorkerCache(max_size=2, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache.put(worker("a", "A1"))
+    cache.put(worker("b", "B1"))
+    cache.get("a")
+    cache.put(worker("c", "C1"))
+
+    assert cache.get("b") is None and cache.get_by_worker_id("B1") is None
+    assert cache.get_by_worker_id("A1")['id'] == "a"
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats()['evictions'] == 1
+
+
+async def test_a_load_that_raced_a_write_is_not_cached():
+    cache = WorkerCache()
+    generation = cache.generation
+    await cache.invalidate(["a"])
+
+    cache.put(worker("a", "A1", "Stale"), generation)
+
+    assert cache.get("a") is None
+
+
+async def test_invalidation_reaches_peer_caches():
+    hub = []
+    here, there = WorkerCache(bus=InMemoryInvalidationBus(hub)), WorkerCache(bus=InMemoryInvalidationBus(hub))
+    await here.start()
+    await there.start()
+    for cache in (here, there):
+        cache.put(worker("a", "A1"))
+
+    await here.invalidate(["A1"])
+
+    assert here.get("a") is None and there.get("a") is None
+    assert there.stats()['invalidations'] == 1
+
+
+async def test_reads_see_every_write(api):
+    [worker_id] = await create_workers(api, 1)
+    assert (await api.get(f"/api/workers/{worker_id}")).json()['name'] == "Worker 0"
+
+    await api.put(f"/api/workers/{worker_id}", json={"name": "Renamed", "worker_id": "N1"})
+    marked = (await api.post("/api/attendance", json={
+        "worker_id": worker_id, "clock_in": datetime.now(timezone.utc).isoformat(),
+    })).json()
+
+    assert (await api.get(f"/api/workers/{worker_id}")).json()['name'] == "Renamed"
+    assert marked['worker_name'] == "Renamed"
+    # The old badge number no longer resolves to the worker.
+    assert (await api.post("/api/workers", json={"name": "New", "worker_id": "W000", "daily_wage_rate": 1})).status_code == 200
+
+    await api.delete(f"/api/workers/{worker_id}")
+    assert (await api.get(f"/api/workers/{worker_id}")).status_code == 404
+    assert server.worker_cache.stats()['hits'] > 0
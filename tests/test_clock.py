@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rollups import verify_rollups
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_clock_in_over_an_absent_row_keeps_one_recorded_day(api, db):
+    [worker_id] = await create_workers(api, 1)
+    today = datetime.now(timezone.utc).date().isoformat()
+    absent = (await api.post("/api/attendance", json={"worker_id": worker_id})).json()
+
+    response = await api.post("/api/attendance/clock-in", json={"worker_id": worker_id})
+
+    assert response.status_code == 200
+    row = response.json()
+    assert (row['id'], row['status']) == (absent['id'], "clocked_in")
+    stats = await db.daily_stats.find_one({"_id": today})
+    assert (stats['recorded_count'], stats['clocked_in_count'], stats['present_count']) == (1, 1, 0)
+    assert await verify_rollups(db) == []
+
+
+async def test_second_clock_in_conflicts_unless_it_is_a_retry(api):
+    [worker_id] = await create_workers(api, 1)
+    headers = {"Idempotency-Key": "k1"}
+    first = await api.post("/api/attendance/clock-in", json={"worker_id": worker_id}, headers=headers)
+
+    retry = await api.post("/api/attendance/clock-in", json={"worker_id": worker_id}, headers=headers)
+    other = await api.post("/api/attendance/clock-in", json={"worker_id": worker_id})
+
+    assert retry.status_code == 200 and retry.json()['id'] == first.json()['id']
+    assert other.status_code == 409
+
+
+async def test_clock_out_prices_the_open_row(api, db):
+    [worker_id] = await create_workers(api, 1, rate=50.0)
+    at = datetime.now(timezone.utc).replace(hour=1, minute=0, second=0, microsecond=0)
+    await api.post("/api/attendance/clock-in", json={"worker_id": worker_id, "at": at.isoformat()})
+
+    row = (await api.post("/api/attendance/clock-out", json={
+        "worker_id": worker_id, "at": (at + timedelta(hours=6, minutes=30)).isoformat(),
+    })).json()
+
+    assert (row['status'], row['hours_worked'], row['wage_earned']) == ("present", 6.5, 325.0)
+    assert (await api.post("/api/attendance/clock-out", json={"worker_id": worker_id})).status_code == 409
+    assert await verify_rollups(db) == []
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from codec import migrate_collection, to_datetime
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+def test_stored_timestamps_decode_to_aware_utc():
+    expected = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+    assert to_datetime("2026-01-02T03:04:05Z") == expected
+    assert to_datetime("2026-01-02T05:04:05+02:00") == expected
+    assert to_datetime(expected.replace(tzinfo=None)) == expected
+    assert to_datetime(None) is None
+
+
+async def test_new_workers_store_native_datetimes(api, db):
+    await create_workers(api, 1)
+
+    worker = await db.workers.find_one({})
+
+    assert isinstance(worker['created_at'], datetime)
+
+
+async def test_migration_converts_legacy_strings_and_skips_garbage(db):
+    await db.workers.insert_many([
+        {"id": "a", "created_at": "2026-01-02T03:04:05+00:00"},
+        {"id": "b", "created_at": "not a date"},
+        {"id": "c", "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc)},
+    ])
+
+    assert await migrate_collection(db, "workers", batch_size=1) == 1
+
+    stored = {doc['id']: doc['created_at'] async for doc in db.workers.find({})}
+    assert to_datetime(stored["a"]) == datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert isinstance(stored["a"], datetime)
+    assert stored["b"] == "not a date"
+
+
+async def test_list_and_single_reads_render_rows_alike(api):
+    [worker_id] = await create_workers(api, 1)
+
+    single = (await api.get(f"/api/workers/{worker_id}")).json()
+    [listed] = (await api.get("/api/workers")).json()
+
+    assert listed == single
@@ -0,0 +1,44 @@
+import pytest
+
+from compression import choose_encoding
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+def test_encoding_follows_the_accept_header():
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") in ("br", "gzip")
+
+
+async def test_large_lists_are_compressed_and_small_ones_are_not(api):
+    await create_workers(api, 30)
+
+    large = await api.get("/api/workers", headers={"Accept-Encoding": "gzip"})
+    small = await api.get("/api/workers", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["vary"] == "Accept-Encoding"
+    assert len(large.json()) == 30
+    assert "content-encoding" not in small.headers
+
+
+async def test_compressed_bodies_carry_a_weak_etag(api):
+    await create_workers(api, 30)
+
+    plain = await api.get("/api/workers", headers={"Accept-Encoding": "identity"})
+    compressed = await api.get("/api/workers", headers={"Accept-Encoding": "gzip"})
+
+    assert compressed.headers["etag"] == "W/" + plain.headers["etag"].removeprefix("W/")
+
+
+async def test_streamed_lists_are_not_compressed(api):
+    await create_workers(api, 30)
+
+    response = await api.get("/api/workers", headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert len(response.text.splitlines()) == 30
+
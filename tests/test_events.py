@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+from events import CONNECTED_FRAME, KEEPALIVE_FRAME, RESYNC_FRAME, EventBroker
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+async def next_events(frames, count: int) -> list:
+    events = []
+    while len(events) < count:
+        frame = await asyncio.wait_for(frames.__anext__(), 1)
+        if frame.startswith("event:"):
+            events.append(json.loads(frame.split("data: ", 1)[1]))
+    return events
+
+
+async def test_writes_publish_the_change_then_the_dashboard_stats(api):
+    frames = server.event_broker.stream(heartbeat=5)
+    assert await frames.__anext__() == CONNECTED_FRAME
+
+    await create_workers(api, 1)
+
+    worker, stats = await next_events(frames, 2)
+    assert (worker['type'], worker['worker']['worker_id']) == ("worker", "W000")
+    assert (stats['type'], stats['stats']['total_workers']) == ("stats", 1)
+    await frames.aclose()
+    assert server.event_broker.stats()['subscribers'] == 0
+
+
+async def test_a_subscriber_that_falls_behind_gets_one_resync():
+    broker = EventBroker(queue_size=2)
+    frames = broker.stream(heartbeat=5)
+    await frames.__anext__()
+
+    for i in range(4):
+        await broker.publish({"type": "worker", "n": i})
+
+    assert await frames.__anext__() == RESYNC_FRAME
+    assert json.loads((await frames.__anext__()).split("data: ", 1)[1])['n'] == 3
+    assert broker.stats()['overflows'] == 1
+
+
+async def test_idle_streams_send_keep_alives_and_end_on_disconnect():
+    broker = EventBroker()
+    frames = broker.stream(heartbeat=0.01)
+    await frames.__anext__()
+
+    assert await frames.__anext__() == KEEPALIVE_FRAME
+    broker.disconnect()
+    assert [frame async for frame in frames if frame != KEEPALIVE_FRAME] == []
@@ -0,0 +1,77 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+
+import pyarrow.parquet as pq
+import pytest
+
+import server
+from tests.helpers import create_workers, work_day
+
+pytestmark = pytest.mark.anyio
+
+
+async def worked_range(api, days=3):
+    [worker_id] = await create_workers(api, 1, rate=10.0)
+    today = datetime.now(timezone.utc).date()
+    dates = [today - timedelta(days=offset) for offset in range(days, 0, -1)]
+    for day in dates:
+        await work_day(api, worker_id, day, hours=2)
+    return worker_id, dates[0].isoformat(), dates[-1].isoformat()
+
+
+async def test_csv_export_prices_each_row_at_the_rate_of_its_date(api):
+    worker_id, start, end = await worked_range(api)
+    for effective_from, rate in ((start, 10), (end, 20)):
+        await api.post(f"/api/workers/{worker_id}/rates", json={"effective_from": effective_from, "daily_wage_rate": rate})
+
+    response = await api.get("/api/exports/payroll", params={"from": start, "to": end})
+
+    assert response.headers["content-disposition"] == f'attachment; filename="payroll-{start}-{end}.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row['worker_number'], float(row['daily_wage_rate']), float(row['wage_earned'])) for row in rows] == [
+        ("W000", 10.0, 20.0), ("W000", 10.0, 20.0), ("W000", 20.0, 40.0),
+    ]
+
+
+async def test_parquet_export_has_the_same_rows(api):
+    _, start, end = await worked_range(api)
+
+    response = await api.get("/api/exports/payroll", params={"from": start, "to": end, "format": "parquet"})
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 3
+    assert table.column("wage_earned").to_pylist() == [20.0] * 3
+
+
+async def test_an_empty_range_still_has_a_header(api):
+    response = await api.get("/api/exports/payroll", params={"from": "2020-01-01", "to": "2020-01-31"})
+
+    assert response.text.splitlines() == ["date,worker_id,worker_number,worker_name,daily_wage_rate,status,clock_in,clock_out,hours_worked,wage_earned"]
+
+
+async def test_reversed_ranges_are_rejected(api):
+    response = await api.get("/api/exports/payroll", params={"from": "2020-02-01", "to": "2020-01-01"})
+
+    assert response.status_code == 400
+
+
+async def test_export_job_runs_in_the_background_and_expires(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(server.export_jobs, "directory", str(tmp_path))
+    _, start, end = await worked_range(api)
+
+    job = (await api.post("/api/exports/payroll/jobs", params={"from": start, "to": end})).json()
+    assert job['rows_total'] == 3
+    while job['status'] == "running":
+        await asyncio.sleep(0.01)
+        job = (await api.get(f"/api/exports/jobs/{job['id']}")).json()
+    assert (job['status'], job['rows_written'], job['progress']) == ("done", 3, 1.0)
+
+    download = await api.get(f"/api/exports/jobs/{job['id']}/download")
+    assert len(download.text.splitlines()) == 4
+
+    monkeypatch.setattr(server.export_jobs, "ttl", 0)
+    assert await server.export_jobs.sweep() == 1
+    assert list(tmp_path.iterdir()) == []
+    assert (await api.get(f"/api/exports/jobs/{job['id']}")).status_code == 404
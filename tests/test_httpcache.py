@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_matching_tag_gets_not_modified(api):
+    await create_workers(api, 2)
+    first = await api.get("/api/workers")
+    tag = first.headers["etag"]
+
+    again = await api.get("/api/workers", headers={"If-None-Match": tag})
+    weak = await api.get("/api/workers", headers={"If-None-Match": f'"other", W/{tag}'})
+
+    assert again.status_code == weak.status_code == 304
+    assert again.content == b"" and again.headers["etag"] == tag
+
+
+async def test_stale_tag_gets_the_new_body(api):
+    await create_workers(api, 1)
+    tag = (await api.get("/api/workers")).headers["etag"]
+    await create_workers(api, 1, prefix="L")
+
+    response = await api.get("/api/workers", headers={"If-None-Match": tag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != tag
+    assert len(response.json()) == 2
+
+
+async def test_attendance_moves_only_the_days_it_touches(api):
+    [worker_id] = await create_workers(api, 1)
+    today = datetime.now(timezone.utc).date()
+    urls = ["/api/attendance/today", f"/api/attendance/date/{(today - timedelta(days=3)).isoformat()}"]
+    before = [(await api.get(url)).headers["etag"] for url in urls]
+
+    await api.post("/api/attendance/clock-in", json={"worker_id": worker_id})
+    after = [(await api.get(url)).headers["etag"] for url in urls]
+
+    assert after[0] != before[0]
+    assert after[1] == before[1]
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import ASCENDING
+
+from indexes import INDEXES, ensure_indexes
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_declared_indexes_are_built_and_drifted_ones_rebuilt(db):
+    await db.attendance.create_index([("date", ASCENDING)], name="date")
+    await db.workers.create_index([("worker_id", ASCENDING)], name="worker_id")
+
+    await ensure_indexes(db)
+
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        assert {m.document["name"] for m in models} <= set(existing)
+    assert "date" not in await db.attendance.index_information()
+    assert (await db.workers.index_information())["worker_id"].get("unique")
+
+
+async def test_duplicate_worker_numbers_are_rejected(api):
+    ids = await create_workers(api, 2)
+
+    created = await api.post("/api/workers", json={"name": "Twin", "worker_id": "W000", "daily_wage_rate": 1})
+    updated = await api.put(f"/api/workers/{ids[1]}", json={"worker_id": "W000"})
+
+    assert (created.status_code, created.json()['detail']) == (400, "Worker ID already exists")
+    assert updated.status_code == 400
+
+
+async def test_concurrent_first_marks_land_on_one_row(api, db):
+    [worker_id] = await create_workers(api, 1)
+    mark = {"worker_id": worker_id, "clock_in": datetime.now(timezone.utc).isoformat()}
+
+    responses = await asyncio.gather(*(api.post("/api/attendance", json=mark) for _ in range(5)))
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()['id'] for r in responses}) == 1
+    assert await db.attendance.count_documents({"worker_id": worker_id}) == 1
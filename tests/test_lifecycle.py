@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import server
+from lifecycle import Lifecycle
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ready_reports_startup_phases(api):
+    response = await api.get("/api/ready")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body['status'] == "ready"
+    assert {"connections", "indexes", "caches"} <= set(body['phases'])
+
+
+async def test_a_draining_process_is_alive_but_not_ready(api):
+    server.lifecycle.begin_drain()
+
+    assert (await api.get("/api/ready")).status_code == 503
+    assert (await api.get("/api/ready")).json()['status'] == "draining"
+    assert (await api.get("/api/health")).status_code == 200
+
+
+async def test_an_unreachable_database_is_not_ready(api, monkeypatch):
+    async def unreachable(db, timeout):
+        return False
+    monkeypatch.setattr(server, "ping", unreachable)
+
+    response = await api.get("/api/ready")
+
+    assert (response.status_code, response.json()['status']) == (503, "database_unavailable")
+
+
+async def test_drain_waits_for_requests_in_flight():
+    lifecycle = Lifecycle()
+    closed = []
+    lifecycle.close_streams_with(lambda: closed.append(True))
+    lifecycle.request_started()
+    asyncio.get_running_loop().call_later(0.05, lifecycle.request_finished)
+
+    await lifecycle.drain(grace=5)
+
+    assert (lifecycle.state, lifecycle.in_flight, closed) == ("draining", 0, [True])
+
+
+async def test_drain_gives_up_after_the_grace_period():
+    lifecycle = Lifecycle()
+    lifecycle.request_started()
+
+    await asyncio.wait_for(lifecycle.drain(grace=0.05), 1)
+
+    assert lifecycle.in_flight == 1
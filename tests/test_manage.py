@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from typer.testing import CliRunner
+
+import lifecycle
+from manage import cli
+
+SETTINGS = ("WORKER_CACHE_BUS", "EVENT_BROKER", "HTTP_CACHE_BUS", "MONGO_MAX_POOL_SIZE", "MONGO_MIN_POOL_SIZE")
+
+
+@pytest.fixture
+def launched(monkeypatch):
+    """Runs ``serve`` without starting uvicorn; records what it would have run."""
+    for name in SETTINGS:
+        monkeypatch.delenv(name, raising=False)
+    runs = []
+
+    class Server:
+        def __init__(self, config, delay):
+            self.config, self.delay = config, delay
+
+        def run(self):
+            runs.append(("server", self.config.workers))
+
+    class Supervisor:
+        def __init__(self, config, target, sockets):
+            for sock in sockets:
+                sock.close()
+            self.config = config
+
+        def run(self):
+            runs.append(("supervisor", self.config.workers))
+
+    monkeypatch.setattr(lifecycle, "DrainingServer", Server)
+    monkeypatch.setattr(lifecycle, "DrainingSupervisor", Supervisor)
+    return runs
+
+
+def serve(*args):
+    return CliRunner().invoke(cli, ["serve", "--host", "127.0.0.1", "--port", "0", *args])
+
+
+def test_several_workers_share_caches_through_mongo_and_split_the_pool(launched):
+    result = serve("--workers", "4", "--pool-size", "40")
+
+    assert result.exit_code == 0, result.output
+    assert launched == [("supervisor", 4)]
+    assert {name: os.environ[name] for name in SETTINGS} == {
+        "WORKER_CACHE_BUS": "mongo", "EVENT_BROKER": "mongo", "HTTP_CACHE_BUS": "mongo",
+        "MONGO_MAX_POOL_SIZE": "10", "MONGO_MIN_POOL_SIZE": "10",
+    }
+
+
+def test_one_worker_keeps_the_in_process_defaults(launched):
+    assert serve("--workers", "1").exit_code == 0
+    assert launched == [("server", 1)]
+    assert "WORKER_CACHE_BUS" not in os.environ
+
+
+def test_unknown_loops_are_rejected(launched):
+    result = serve("--workers", "1", "--loop", "trio")
+
+    assert result.exit_code != 0
+    assert launched == []
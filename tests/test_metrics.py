@@ -0,0 +1,42 @@
+import pytest
+
+import server
+from metrics import MetricsRegistry
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+def timings(response) -> dict:
+    """``Server-Timing`` durations by metric name, in milliseconds."""
+    parsed = {}
+    for metric in response.headers["server-timing"].split(", "):
+        name, *params = metric.split(";")
+        parsed[name] = float(next(p for p in params if p.startswith("dur="))[4:])
+    return parsed
+
+
+async def test_list_response_splits_app_and_serialize_time(api):
+    await create_workers(api, 20)
+
+    timing = timings(await api.get("/api/workers"))
+
+    assert set(timing) == {"db", "app", "serialize", "total"}
+    assert timing["serialize"] > 0
+    assert timing["app"] <= timing["total"]
+    assert timing["app"] + timing["serialize"] <= timing["total"]
+
+
+async def test_metrics_count_requests_by_route_template(api, monkeypatch):
+    # The registry lives for the process, so start from an empty one.
+    monkeypatch.setattr(server, "registry", MetricsRegistry())
+    [worker_id] = await create_workers(api, 1)
+    await api.get(f"/api/workers/{worker_id}")
+    await api.get("/api/workers/missing")
+
+    text = (await api.get("/api/metrics")).text
+
+    assert 'wageflow_http_requests_total{method="GET",route="/api/workers/{worker_id}",status="200"} 1' in text
+    assert 'wageflow_http_requests_total{method="GET",route="/api/workers/{worker_id}",status="404"} 1' in text
+    assert 'wageflow_http_request_duration_seconds_count{method="GET",route="/api/workers/{worker_id}"} 2' in text
+    assert "# TYPE wageflow_response_serialize_seconds_total counter" in text
@@ -0,0 +1,64 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pagination import keyset_filter
+from tests.helpers import create_workers, walk, work_day
+
+pytestmark = pytest.mark.anyio
+
+
+def test_keyset_filter_compound_sort():
+    assert keyset_filter("a", [("id", 1)]) == {"id": {"$gt": "a"}}
+    assert keyset_filter("2026-01-02|b", [("date", -1), ("id", -1)]) == {"$or": [
+        {"date": {"$lt": "2026-01-02"}},
+        {"date": "2026-01-02", "id": {"$lt": "b"}},
+    ]}
+
+
+async def test_worker_pages_cover_the_list_once(api):
+    await create_workers(api, 7)
+    everything = (await api.get("/api/workers")).json()
+
+    paged = await walk(api, "/api/workers", 3)
+
+    assert [w['id'] for w in paged] == sorted(w['id'] for w in everything)
+    assert paged == sorted(everything, key=lambda w: w['id'])
+
+
+async def test_full_page_carries_next_cursor_and_last_page_does_not(api):
+    await create_workers(api, 4)
+
+    first = await api.get("/api/workers", params={"limit": 2})
+    last = await api.get("/api/workers", params={"limit": 2, "after": first.headers["x-next-cursor"]})
+    beyond = await api.get("/api/workers", params={"limit": 2, "after": last.headers["x-next-cursor"]})
+
+    assert len(first.json()) == len(last.json()) == 2
+    assert beyond.json() == [] and "x-next-cursor" not in beyond.headers
+
+
+async def test_malformed_cursor_is_rejected(api):
+    response = await api.get("/api/attendance/worker/anyone", params={"limit": 2, "after": "no-separator"})
+    assert response.status_code == 400
+
+
+async def test_worker_attendance_pages_newest_first(api):
+    [worker_id] = await create_workers(api, 1)
+    today = datetime.now(timezone.utc).date()
+    for offset in range(5):
+        await work_day(api, worker_id, today - timedelta(days=offset))
+
+    paged = await walk(api, f"/api/attendance/worker/{worker_id}", 2)
+
+    assert [row['date'] for row in paged] == [(today - timedelta(days=o)).isoformat() for o in range(5)]
+
+
+async def test_ndjson_streams_the_same_rows(api):
+    await create_workers(api, 3)
+    rows = (await api.get("/api/workers")).json()
+
+    response = await api.get("/api/workers", headers={"Accept": "application/x-ndjson"})
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == rows
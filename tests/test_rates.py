@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rates import RateSchedule
+from rollups import verify_rollups
+from tests.helpers import create_workers, work_day
+
+pytestmark = pytest.mark.anyio
+
+
+def test_schedule_resolves_rates_and_periods():
+    schedule = RateSchedule([
+        {"effective_from": "2026-01-01", "daily_wage_rate": 10},
+        {"effective_from": "2026-03-01", "daily_wage_rate": 12},
+    ])
+
+    assert [schedule.rate_on(d) for d in ("2025-06-01", "2026-02-28", "2026-03-01", "2027-01-01")] == [10, 10, 12, 12]
+    assert schedule.period("2026-01-01") == (None, "2026-03-01")
+    assert schedule.period("2026-03-01") == ("2026-03-01", None)
+
+
+async def wages(api, worker_id) -> dict:
+    rows = (await api.get(f"/api/attendance/worker/{worker_id}")).json()
+    return {row['date']: row['wage_earned'] for row in rows}
+
+
+async def test_back_dated_rates_reprice_only_the_dates_they_govern(api, db):
+    [worker_id] = await create_workers(api, 1, rate=10.0)
+    today = datetime.now(timezone.utc).date()
+    days = [(today - timedelta(days=offset)).isoformat() for offset in (30, 20, 10, 5)]
+    for day in days:
+        await work_day(api, worker_id, datetime.fromisoformat(day).date(), hours=2)
+
+    # Now the first entry, so it also covers every earlier date.
+    first = (await api.post(f"/api/workers/{worker_id}/rates", json={"effective_from": days[1], "daily_wage_rate": 20})).json()
+    assert first['repriced'] == 4
+    assert await wages(api, worker_id) == dict.fromkeys(days, 40.0)
+
+    # Between two entries: only up to the next one.
+    second = (await api.post(f"/api/workers/{worker_id}/rates", json={
+        "effective_from": (today - timedelta(days=8)).isoformat(), "daily_wage_rate": 30,
+    })).json()
+    assert second['repriced'] == 1
+    assert await wages(api, worker_id) == {**dict.fromkeys(days, 40.0), days[3]: 60.0}
+    assert second['worker']['daily_wage_rate'] == 10.0
+    assert await verify_rollups(db) == []
+
+
+async def test_an_unchanged_rate_in_an_update_is_not_a_rate_change(api):
+    [worker_id] = await create_workers(api, 1, rate=10.0)
+
+    await api.put(f"/api/workers/{worker_id}", json={"name": "Renamed", "daily_wage_rate": 10.0})
+
+    assert len((await api.get(f"/api/workers/{worker_id}/rates")).json()) == 1
+
+
+async def test_malformed_effective_dates_are_rejected(api):
+    [worker_id] = await create_workers(api, 1)
+
+    response = await api.post(f"/api/workers/{worker_id}/rates", json={"effective_from": "soon", "daily_wage_rate": 5})
+
+    assert response.status_code == 400
+
+
+async def test_a_back_dated_rate_rebuilds_the_closed_month_snapshot(api):
+    [worker_id] = await create_workers(api, 1, rate=10.0)
+    first = (datetime.now(timezone.utc).date().replace(day=1) - timedelta(days=1)).replace(day=1)
+    await work_day(api, worker_id, first, hours=2)
+    url = f"/api/attendance/monthly/{first.year}/{first.month}"
+    assert (await api.get(url)).json()[0]['total_wages'] == 20.0
+
+    await api.post(f"/api/workers/{worker_id}/rates", json={"effective_from": first.isoformat(), "daily_wage_rate": 15})
+
+    assert (await api.get(url)).json()[0]['total_wages'] == 30.0
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.helpers import create_workers, work_day
+
+pytestmark = pytest.mark.anyio
+
+
+def past_month():
+    first = datetime.now(timezone.utc).date().replace(day=1) - timedelta(days=1)
+    return first.replace(day=1)
+
+
+async def report(api, first):
+    response = await api.get(f"/api/attendance/monthly/{first.year}/{first.month}")
+    response.raise_for_status()
+    return {row['worker_number']: row for row in response.json()}
+
+
+async def test_monthly_report_totals_each_worker(api):
+    ids = await create_workers(api, 3, rate=20.0)
+    first = past_month()
+    for offset, hours in ((0, 8), (1, 6.5), (2, 4)):
+        await work_day(api, ids[0], first + timedelta(days=offset), hours=hours)
+    await work_day(api, ids[1], first + timedelta(days=3))
+    # Never clocked out: a recorded day, but not a present one.
+    await api.post("/api/attendance/clock-in", json={
+        "worker_id": ids[1], "at": datetime(first.year, first.month, 5, 9, tzinfo=timezone.utc).isoformat(),
+    })
+
+    rows = await report(api, first)
+
+    assert {k: rows["W000"][k] for k in ("total_days", "present_days", "absent_days", "total_hours", "total_wages")} == {
+        "total_days": 3, "present_days": 3, "absent_days": 0, "total_hours": 18.5, "total_wages": 370.0,
+    }
+    assert (rows["W001"]['total_days'], rows["W001"]['present_days'], rows["W001"]['absent_days']) == (2, 1, 1)
+    assert rows["W002"]['total_days'] == rows["W002"]['total_wages'] == 0
+
+
+async def test_rows_outside_the_month_are_left_out(api):
+    [worker_id] = await create_workers(api, 1)
+    first = past_month()
+    await work_day(api, worker_id, first - timedelta(days=1))
+    await work_day(api, worker_id, first)
+
+    assert (await report(api, first))["W000"]['total_days'] == 1
+
+
+async def test_closed_month_is_served_from_its_snapshot_until_a_write_dirties_it(api, db):
+    [worker_id] = await create_workers(api, 1)
+    first = past_month()
+    await work_day(api, worker_id, first)
+    key = first.strftime("%Y-%m")
+
+    assert (await report(api, first))["W000"]['total_days'] == 1
+    snapshot = await db.monthly_reports.find_one({"_id": key})
+    assert snapshot['built_version'] == snapshot.get('version', 0)
+
+    # Not a write through the API, so the snapshot does not notice.
+    await db.attendance.update_many({}, {"$set": {"hours_worked": 99}})
+    assert (await report(api, first))["W000"]['total_hours'] == 8.0
+
+    await work_day(api, worker_id, first + timedelta(days=1))
+    rows = await report(api, first)
+    assert (rows["W000"]['total_days'], rows["W000"]['total_hours']) == (2, 107.0)
+
+
+async def test_open_month_is_never_snapshotted(api, db):
+    [worker_id] = await create_workers(api, 1)
+    today = datetime.now(timezone.utc).date()
+    await api.post("/api/attendance/clock-in", json={"worker_id": worker_id})
+
+    assert (await report(api, today))["W000"]['total_days'] == 1
+    assert await db.monthly_reports.count_documents({}) == 0
+
+
+async def test_report_revalidates_with_its_etag(api):
+    [worker_id] = await create_workers(api, 1)
+    first = past_month()
+    url = f"/api/attendance/monthly/{first.year}/{first.month}"
+    tag = (await api.get(url)).headers["etag"]
+
+    assert (await api.get(url, headers={"If-None-Match": tag})).status_code == 304
+    await work_day(api, worker_id, first)
+    changed = await api.get(url, headers={"If-None-Match": tag})
+    assert changed.status_code == 200 and changed.headers["etag"] != tag
@@ -0,0 +1,23 @@
+import pytest
+
+from rollups import compute_day, verify_rollups
+from tests.helpers import record_history
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_incremental_rollups_match_a_rebuild(api, db):
+    await record_history(api)
+
+    assert await verify_rollups(db) == []
+
+
+async def test_dashboard_matches_recomputed_day(api, db):
+    _, today = await record_history(api)
+
+    stats = (await api.get("/api/dashboard/stats")).json()
+    expected = await compute_day(db, today.isoformat())
+
+    assert stats['present_today'] == expected['present_count'] + expected['clocked_in_count']
+    assert stats['total_hours_today'] == round(expected['total_hours'], 2)
+    assert stats['total_wages_today'] == round(expected['total_wages'], 2)
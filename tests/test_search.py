@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import server
+from cache import InMemoryInvalidationBus
+from tests.helpers import serving
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_worker(api, name: str, number: str) -> str:
+    response = await api.post("/api/workers", json={"name": name, "worker_id": number, "daily_wage_rate": 100})
+    response.raise_for_status()
+    return response.json()['id']
+
+
+async def search(api, q: str, **params) -> list:
+    response = await api.get("/api/workers/search", params={"q": q, **params})
+    response.raise_for_status()
+    return [worker['name'] for worker in response.json()]
+
+
+async def test_results_are_ranked_by_how_they_match(api):
+    for name, number in [("Gabby Hart", "X3"), ("Carl Abbot", "X2"), ("Abe Lincoln", "X1"),
+                         ("Zed Moss", "AB12"), ("Yan Ode", "AB")]:
+        await add_worker(api, name, number)
+
+    # Exact badge, badge prefix, name prefix, later word prefix.
+    assert await search(api, "ab") == ["Yan Ode", "Zed Moss", "Abe Lincoln", "Carl Abbot"]
+    # Three characters or more also match inside a name.
+    assert await search(api, "ABB") == ["Carl Abbot", "Gabby Hart"]
+    assert await search(api, "ab", limit=2) == ["Yan Ode", "Zed Moss"]
+
+
+async def test_writes_update_the_index(api):
+    worker_id = await add_worker(api, "Dana Scully", "D1")
+
+    await api.put(f"/api/workers/{worker_id}", json={"name": "Dana Mulder"})
+    assert await search(api, "mulder") == ["Dana Mulder"]
+    assert await search(api, "scully") == []
+
+    await api.delete(f"/api/workers/{worker_id}")
+    assert await search(api, "dana") == []
+
+
+async def test_only_peer_invalidations_reread_workers(db, monkeypatch):
+    hub = []
+    monkeypatch.setattr(server.worker_cache, "bus", InMemoryInvalidationBus(hub))
+    peer = InMemoryInvalidationBus(hub)
+    await peer.start(lambda keys: None)
+    refreshed = []
+    refresh = server.worker_index.refresh
+
+    async def counting_refresh(db, keys):
+        refreshed.append(keys)
+        await refresh(db, keys)
+    monkeypatch.setattr(server.worker_index, "refresh", counting_refresh)
+
+    async with serving() as api:
+        worker_id = await add_worker(api, "Fox Local", "F1")
+        await api.put(f"/api/workers/{worker_id}", json={"name": "Fox Renamed"})
+        assert refreshed == []
+
+        # What another process's rename looks like from here.
+        await db.workers.update_one({"id": worker_id}, {"$set": {"name": "Fox Elsewhere"}})
+        await peer.publish([worker_id])
+        await asyncio.gather(*server.worker_index._refreshes)
+
+        assert refreshed == [[worker_id]]
+        assert await search(api, "fox") == ["Fox Elsewhere"]
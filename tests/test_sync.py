@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from sync import TOMBSTONES, parse_token, prune_tombstones, seq_at
+from tests.helpers import create_workers
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def settle_immediately(monkeypatch):
+    monkeypatch.setattr(server, "SYNC_SETTLE_SECONDS", 0)
+
+
+async def sync(api, token=None, **params):
+    response = await api.get("/api/sync", params={**params, **({"since": token} if token else {})})
+    response.raise_for_status()
+    return response.json()
+
+
+async def test_first_sync_returns_everything(api):
+    ids = await create_workers(api, 3)
+
+    page = await sync(api)
+
+    assert sorted(w['id'] for w in page['workers']) == sorted(ids)
+    assert page['deleted'] == {"workers": [], "attendance": []}
+
+
+async def test_delta_carries_changes_and_tombstones(api):
+    ids = await create_workers(api, 3)
+    token = (await sync(api))['token']
+
+    await api.put(f"/api/workers/{ids[0]}", json={"name": "Renamed"})
+    await api.post("/api/attendance", json={"worker_id": ids[1], "clock_in": datetime.now(timezone.utc).isoformat()})
+    await api.delete(f"/api/workers/{ids[2]}")
+    page = await sync(api, token)
+
+    assert [w['name'] for w in page['workers']] == ["Renamed"]
+    assert [a['worker_id'] for a in page['attendance']] == [ids[1]]
+    assert page['deleted']['workers'] == [ids[2]]
+    assert int(page['token']) > int(token)
+
+
+async def test_an_idle_token_returns_nothing_new(api):
+    await create_workers(api, 2)
+    token = (await sync(api))['token']
+
+    page = await sync(api, token)
+
+    assert page['workers'] == page['attendance'] == []
+    assert page['deleted']['workers'] == []
+
+
+async def test_re_marking_keeps_the_row_id(api):
+    [worker_id] = await create_workers(api, 1)
+    clock_in = datetime.now(timezone.utc) - timedelta(hours=2)
+    first = (await api.post("/api/attendance", json={"worker_id": worker_id, "clock_in": clock_in.isoformat()})).json()
+    token = (await sync(api))['token']
+
+    again = (await api.post("/api/attendance", json={
+        "worker_id": worker_id, "clock_in": clock_in.isoformat(), "clock_out": datetime.now(timezone.utc).isoformat(),
+    })).json()
+    page = await sync(api, token)
+
+    assert again['id'] == first['id']
+    assert [(a['id'], a['status']) for a in page['attendance']] == [(first['id'], "present")]
+
+
+async def test_paging_visits_every_change_once(api):
+    ids = await create_workers(api, 5)
+    for worker_id in ids[:3]:
+        await api.delete(f"/api/workers/{worker_id}")
+
+    seen, token = [], "0"
+    while True:
+        page = await sync(api, token, limit=2)
+        seen += [w['id'] for w in page['workers']] + page['deleted']['workers']
+        token = page['token']
+        if not page['more']:
+            break
+
+    # Deleted workers only appear as tombstones, the rest as rows.
+    assert sorted(seen) == sorted(ids)
+
+
+async def test_tokens_older_than_retention_are_gone(api, db):
+    await create_workers(api, 1)
+    stale = seq_at(datetime.now(timezone.utc) - server.SYNC_TOMBSTONE_RETENTION - timedelta(days=1))
+
+    assert (await api.get("/api/sync", params={"since": str(stale)})).status_code == 410
+    assert (await api.get("/api/sync", params={"since": "not-a-token"})).status_code == 400
+    assert parse_token(None) == 0
+
+
+async def test_prune_drops_only_expired_tombstones(db):
+    now = datetime.now(timezone.utc)
+    await db[TOMBSTONES].insert_many([
+        {"collection": "workers", "id": "old", "_seq": seq_at(now - timedelta(days=40))},
+        {"collection": "workers", "id": "new", "_seq": seq_at(now - timedelta(days=1))},
+    ])
+
+    assert await prune_tombstones(db, timedelta(days=30)) == 1
+    assert [t['id'] async for t in db[TOMBSTONES].find()] == ["new"]
@@ -0,0 +1,128 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+import server
+from tests.helpers import create_workers, serving
+from writebehind import DEAD_LETTER_FILE, JOURNAL_SUFFIX, WriteBehindQueue, read_journal
+
+pytestmark = pytest.mark.anyio
+
+
+def dead_journal(directory, rows):
+    """What a process that died before committing ``rows`` leaves behind."""
+    path = directory / f"dead{JOURNAL_SUFFIX}"
+    lines = [json.dumps({"n": n, "date": row['date'], "row": row}) for n, row in enumerate(rows, 1)]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_read_journal_skips_committed_and_torn_lines(tmp_path):
+    path = tmp_path / f"x{JOURNAL_SUFFIX}"
+    path.write_text('{"n": 1, "date": "d", "row": {}}\n{"committed": 1}\n{"n": 2, "date": "d", "row": {}}\n{"n": 3, "da')
+
+    assert [n for n, _, _ in read_journal(path)] == [2]
+
+
+async def test_replay_lands_only_rows_newer_than_the_stored_ones(db, tmp_path, monkeypatch):
+    now = datetime.now(timezone.utc)
+    async with serving() as api:
+        ids = await create_workers(api, 3)
+        stored = [(await api.post("/api/attendance", json={
+            "worker_id": worker_id, "clock_in": now.isoformat(),
+        })).json() for worker_id in ids[:2]]
+
+    def journaled(row, created):
+        return {**row, "status": "journaled", "created_at": created.isoformat()}
+    template = {**stored[0], "worker_id": ids[2], "id": "journaled-row"}
+    path = dead_journal(tmp_path, [
+        # Acknowledged before the stored row was last written: superseded.
+        journaled(stored[0], now - timedelta(seconds=30)),
+        journaled(stored[1], datetime.now(timezone.utc) + timedelta(seconds=1)),
+        journaled(template, now),
+    ])
+    writer = WriteBehindQueue(tmp_path, window=0.01)
+    monkeypatch.setattr(server, "attendance_writer", writer)
+
+    async with serving() as api:
+        rows = (await api.get("/api/attendance/today")).json()
+        stats = (await api.get("/api/cache/stats")).json()
+
+    status = {row['worker_id']: row['status'] for row in rows}
+    assert [status[worker_id] for worker_id in ids] == ["clocked_in", "journaled", "journaled"]
+    assert writer.replayed == 3 and stats['write_behind']['replayed'] == 3
+    assert not path.exists()
+
+
+async def test_acknowledged_rows_reach_the_database_by_shutdown(db, tmp_path, monkeypatch):
+    writer = WriteBehindQueue(tmp_path, window=0.01)
+    monkeypatch.setattr(server, "attendance_writer", writer)
+
+    async with serving() as api:
+        ids = await create_workers(api, 4)
+        for worker_id in ids:
+            response = await api.post("/api/attendance", json={
+                "worker_id": worker_id, "clock_in": datetime.now(timezone.utc).isoformat(),
+            })
+            assert response.status_code == 200
+
+    assert sorted([row['worker_id'] async for row in db.attendance.find()]) == sorted(ids)
+    assert writer.rows == 4
+    assert list(tmp_path.glob(f"*{JOURNAL_SUFFIX}")) == []
+
+
+async def test_re_marks_answer_with_the_stored_id(db, tmp_path, monkeypatch):
+    writer = WriteBehindQueue(tmp_path, window=0.01)
+    monkeypatch.setattr(server, "attendance_writer", writer)
+
+    async with serving() as api:
+        [worker_id] = await create_workers(api, 1)
+        mark = {"worker_id": worker_id, "clock_in": datetime.now(timezone.utc).isoformat()}
+        # The second is queued while the first still is, the third after both commit.
+        first, queued = [(await api.post("/api/attendance", json=mark)).json() for _ in range(2)]
+        while writer.rows < 2:
+            await asyncio.sleep(0.01)
+        committed = (await api.post("/api/attendance", json=mark)).json()
+
+    stored = await db.attendance.find_one({"worker_id": worker_id})
+    assert first['id'] == queued['id'] == committed['id'] == stored['id']
+
+
+async def test_rows_that_cannot_be_committed_are_set_aside(tmp_path):
+    committed = []
+
+    async def commit(rows, replayed):
+        if any(row.get('bad') for _, _, row in rows):
+            raise ValueError("cannot store this row")
+        committed.extend(row['worker_id'] for _, _, row in rows)
+    writer = WriteBehindQueue(tmp_path, window=0.01, fsync=False)
+    await writer.start(commit)
+
+    for worker_id in ("a", "b", "c"):
+        await writer.submit("2026-01-01", {"worker_id": worker_id, "bad": worker_id == "b"})
+    await writer.close()
+
+    assert committed == ["a", "c"]
+    [line] = (tmp_path / DEAD_LETTER_FILE).read_text().splitlines()
+    assert json.loads(line)['row']['worker_id'] == "b"
+    assert writer.dead_lettered == 1
+
+
+async def test_transient_failures_are_retried(tmp_path):
+    attempts = []
+
+    async def commit(rows, replayed):
+        attempts.append(len(rows))
+        if len(attempts) < 3:
+            raise AutoReconnect("primary stepped down")
+    writer = WriteBehindQueue(tmp_path, window=0.01, fsync=False)
+    await writer.start(commit)
+
+    await writer.submit("2026-01-01", {"worker_id": "a"})
+    await writer.close()
+
+    assert attempts == [1, 1, 1]
+    assert (writer.retries, writer.rows, writer.dead_lettered) == (2, 1, 0)